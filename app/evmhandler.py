@@ -1,12 +1,19 @@
+import math
 import time
-from typing import Tuple
+from collections import namedtuple
+from itertools import islice
+from typing import Iterator, Optional, Tuple
 
+import rlp
 from eth import constants
 from eth._utils.address import generate_contract_address
-from eth.abc import BlockAPI, ReceiptAPI
+from eth.abc import BlockAPI, ReceiptAPI, SignedTransactionAPI
 from eth.consensus.pow import mine_pow_nonce
 from eth.db.atomic import AtomicDB
-from eth_abi import encode_abi
+from eth.db.backends.memory import MemoryDB
+from eth.db.schema import SchemaV1
+from eth.rlp.headers import BlockHeader
+from eth.vm.message import Message
 from eth_keys import keys
 from eth_typing import Address
 from eth_utils import decode_hex
@@ -15,8 +22,11 @@ from sha3 import keccak_256
 
 from app.subcomponents.mychain import MyChain
 from app.subcomponents.mycomputation import *
+from app.subcomponents.mydb import MyDB
 from app.subcomponents.myvm import MyVm
-from app.util.util import MODE_NONE, json2obj
+from app.util.preimages import PreimageCache
+from app.util.storage_trie import SlotKeys, StorageEntry, get_storage_root, iter_trie
+from app.util.util import MODE_NONE, RAW_DATA_SIGNATURE, get_function_encoder
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +51,16 @@ GENESIS_PARAMS = {
     'nonce': constants.GENESIS_NONCE
 }
 
+# key under which the header of the chain head is stored in persistent databases
+HEAD_HEADER_KEY = b'evm-simulator:head-header'
+
+# number of storage slots returned by EVMHandler.get_storage_page() by default
+STORAGE_PAGE_SIZE = 100
+
+# everything needed to continue a chain in another EVMHandler, possibly in another process, see EVMHandler.fork(). kv
+# holds the whole database of the chain, header is the rlp encoded header of the chain head
+ForkedState = namedtuple("ForkedState", ["kv", "header", "used_addresses", "seed"])
+
 GENESIS_STATE = {
     MASTER_ADDRESS: {
         "balance": DEFAULT_MASTER_BALANCE,
@@ -53,17 +73,53 @@ GENESIS_STATE = {
 
 class EVMHandler:
 
-    def __init__(self):
+    def __init__(self, instant_seal: bool = False, transactions_per_block: int = 1, db_path: str = None,
+                 fork: ForkedState = None):
+        """
+        :param instant_seal: If set, blocks are sealed right away instead of searching for a proof of work nonce. Block
+        header validation is omitted just like it is done for dirty blocks (see _mine_block_dirty()).
+        :param transactions_per_block: The number of transactions that are collected before a block is mined.
+        :param db_path: Path of a database file in which the chain is persisted. If the file holds a chain from a
+        previous session, that chain is continued. If omitted, the chain is only kept in memory.
+        :param fork: The state of another EVMHandler as returned by its fork(). If given, the chain of that handler is
+        continued in memory, independent of the original. db_path is ignored in this case.
+        """
+        # every handler has classes of its own, so that the context of its executions is not shared with other
+        # handlers (see ExecutionContext)
+        self.computation_class = MyComputation.configure(__name__='MyComputation')
+        state_class = MyVm.get_state_class().configure(__name__='MyState', computation_class=self.computation_class)
         klass = MyChain.configure(
             __name__='EVMSimulatorChain',
-            vm_configuration=((constants.GENESIS_BLOCK_NUMBER, MyVm),)
+            vm_configuration=((constants.GENESIS_BLOCK_NUMBER, MyVm.configure(_state_class=state_class)),)
         )
+        self.context = self.computation_class.context
         self.used_addresses = {MASTER_ADDRESS}
-        self.chain = klass.from_genesis(AtomicDB(), GENESIS_PARAMS, GENESIS_STATE)
-        self.vm = self.chain.get_vm()
-        self.vm.state.computation_class = MyComputation
-        self.vm.get_state_class().computation_class = MyComputation
-        self.seed = keccak_256(time.time().hex().encode("utf-8")).hexdigest()
+        self.db = None if db_path is None or fork is not None else MyDB(db_path)
+        if fork is not None:
+            self.base_db = AtomicDB(MemoryDB(dict(fork.kv)))
+            self.chain = klass(self.base_db, rlp.decode(fork.header, sedes=BlockHeader))
+            self.used_addresses = set(fork.used_addresses)
+        else:
+            self.base_db = AtomicDB() if self.db is None else AtomicDB(self.db)
+            if self.base_db.exists(HEAD_HEADER_KEY):
+                header = rlp.decode(self.base_db[HEAD_HEADER_KEY], sedes=BlockHeader)
+                logger.info("Continuing chain at block {n}".format(n=header.block_number))
+                self.chain = klass(self.base_db, header)
+            else:
+                self.chain = klass.from_genesis(self.base_db, GENESIS_PARAMS, GENESIS_STATE)
+        self._refresh_vm()
+        self.seed = keccak_256(time.time().hex().encode("utf-8")).hexdigest() if fork is None else fork.seed
+        self.instant_seal = instant_seal
+        self.transactions_per_block = transactions_per_block
+        # non zero if a persisted chain is continued whose last session ended with pending transactions
+        self.pending_transactions = len(self.vm.get_block().transactions)
+        self.snapshots = {}
+        self.snapshot_counter = 0
+        # preimages of the keys of the storage tries, see iter_storage()
+        self.slot_keys = SlotKeys()
+        # preimages of the hashes computed by debugged executions (see _set_context()), used to decode the slots of
+        # mappings and arrays
+        self.preimages = PreimageCache(slot_keys=self.slot_keys)
 
     def send_wei(self, addr: bytes, value: int) -> Address:
         """
@@ -73,8 +129,7 @@ class EVMHandler:
         :return: The receiver address.
         """
         logger.info("Sending {v} wei to {a} ".format(v=value, a=addr.hex()))
-        dbg = MyComputation.debug_mode
-        MyComputation.debug_mode = MODE_NONE
+        self._set_context(MODE_NONE)
         receiver = Address(addr)
         self.used_addresses.add(receiver)
         nonce = self.vm.state.get_nonce(MASTER_ADDRESS)
@@ -82,8 +137,7 @@ class EVMHandler:
                                                              receiver, value, b'')
         logger.info("Mined {b} with receipt {r}, and computation {c}".format(b=block, r=receipt,
                                                                              c=computation))
-        self._mine_block()
-        MyComputation.debug_mode = dbg
+        self._transaction_applied()
         return receiver
 
     def create_contract(self, data: str, value: int = 0, debug: int = 0, **kwargs) -> Address:
@@ -95,14 +149,12 @@ class EVMHandler:
         :return: The address under which the newly created contract is located.
         """
         nonce = self.vm.state.get_nonce(MASTER_ADDRESS)
-        MyComputation.debug_mode = debug
-        MyComputation.kwargs = kwargs
-        MyComputation.call_depth = 0
+        self._set_context(debug, **kwargs)
         block, receipt, computation = self._make_transaction(nonce, DEFAULT_GAS_PRICE, DEFAULT_TRANSACTION_GAS_AMOUNT,
                                                              constants.CREATE_CONTRACT_ADDRESS, value, decode_hex(data))
         logger.info("Created contract with {b}, receipt {r}, and computation {c}".format(b=block, r=receipt,
                                                                                          c=computation))
-        self._mine_block()
+        self._transaction_applied()
         if computation.is_error:
             return Address(b'')
         else:
@@ -119,56 +171,210 @@ class EVMHandler:
         :param value: Value of the transaction.
         :return:
         """
-        MyComputation.debug_mode = debug
-        MyComputation.kwargs = kwargs
-        MyComputation.call_depth = 0
+        self._set_context(debug, **kwargs)
         logger.info(
             "Calling function {f} at addr {a} with params {p} and debugmode set to {d}".format(f=function_signature,
                                                                                                a=addr,
                                                                                                p=function_params,
                                                                                                d=debug))
-        if function_signature == "rawdata(any)":
-            data = function_params[0].get("value")
-        else:
-            types = []
-            args = []
-            for elem in function_params:
-                type2: str = elem.get("type")
-                if type2 == "address":
-                    parsed = elem.get("value")
-                elif type2 == "bool":
-                    val = elem.get("value")
-                    parsed = False if val in ["", "0", "false", "False", "F"] else True
-                else:
-                    parsed = json2obj(elem.get("value"))
-                if type2.__contains__("byte"):
-                    size = ''.join(list(filter(str.isdigit, type2)))
-                    size = '32' if size == '' else size
-                    bytesize = int(size)
-                    if type(parsed) == int:
-                        parsed = parsed.to_bytes(bytesize, "little")
-                    elif type(parsed) == list:
-                        parsed = b''.join(i.to_bytes(bytesize, "little") for i in parsed)
-                types.append(type2)
-                args.append(parsed)
-
-            res = encode_abi(types, args)
-            # decode_abi
-            ketchup = keccak_256(function_signature.encode("utf-8")).hexdigest()
-            method_id = ketchup[:8]
-            logger.info("Hash of signature {s} is: {d}".format(s=function_signature, d=ketchup))
-
-            data = method_id + res.hex()
-            logger.info("Data string: {d}".format(d=data))
-
-        #        MyComputation.debug = debug
+        data = self._encode_function_call(function_signature, function_params)
         nonce = self.vm.state.get_nonce(MASTER_ADDRESS)
         new_block, receipt, computation = self._make_transaction(nonce, DEFAULT_GAS_PRICE,
                                                                  DEFAULT_TRANSACTION_GAS_AMOUNT,
-                                                                 Address(addr), value, decode_hex(data))
-        self._mine_block()
+                                                                 Address(addr), value, data)
+        self._transaction_applied()
         return new_block, receipt, computation
 
+    def call_static(self, addr: bytes, function_signature: str, function_params: [], value: int = 0,
+                    **kwargs) -> ComputationAPI:
+        """
+        Executes a call against a throwaway copy of the current state, like eth_call does. No transaction is signed, the
+        nonce of the master address stays the same and no block is mined. Any change the call makes to the state is
+        discarded afterwards. The call is never debugged, the context of the handler is restored afterwards, so that a
+        debug session that has been set up is not affected.
+        :param addr: The address of the contract.
+        :param function_signature: The signature of the function that is to be called. Example: getValue()
+        :param function_params: Function params as parsed by json.
+        :param value: Value that is sent along with the call.
+        :return: The computation, whose output holds the return value.
+        """
+        previous_context = self.context
+        self._set_context(MODE_NONE, **kwargs)
+        try:
+            data = self._encode_function_call(function_signature, function_params)
+            # a fresh vm builds its own state from the state root of the chain head, which is never persisted
+            state = self.chain.get_vm().state
+            message = Message(
+                gas=DEFAULT_TRANSACTION_GAS_AMOUNT,
+                to=Address(addr),
+                sender=MASTER_ADDRESS,
+                value=value,
+                data=data,
+                code=state.get_code(Address(addr)),
+            )
+            transaction_context = state.get_transaction_context_class()(
+                gas_price=DEFAULT_GAS_PRICE,
+                origin=MASTER_ADDRESS,
+            )
+            return state.get_computation(message, transaction_context).apply_message()
+        finally:
+            self.context = previous_context
+            self.computation_class.context = previous_context
+
+    def execute_raw(self, addr: bytes, data: bytes, value: int = 0, gas: int = None, **kwargs) -> ComputationAPI:
+        """
+        Executes a call with raw data against the current state and discards its changes right away. Unlike
+        call_static(), the state of the current vm and its caches are reused, which makes this the cheapest way to
+        execute many calls (e.g. when fuzzing). The call is never debugged, the context of the handler is restored
+        afterwards like in call_static().
+        :param addr: The address of the contract.
+        :param data: The data of the call, i.e. the function selector followed by the abi encoded params.
+        :param value: Value that is sent along with the call.
+        :param gas: Gas that is available to the call, DEFAULT_TRANSACTION_GAS_AMOUNT by default.
+        :return: The computation, whose output holds the return value.
+        """
+        previous_context = self.context
+        self._set_context(MODE_NONE, **kwargs)
+        state = self.vm.state
+        message = Message(
+            gas=DEFAULT_TRANSACTION_GAS_AMOUNT if gas is None else gas,
+            to=Address(addr),
+            sender=MASTER_ADDRESS,
+            value=value,
+            data=data,
+            code=state.get_code(Address(addr)),
+        )
+        transaction_context = state.get_transaction_context_class()(
+            gas_price=DEFAULT_GAS_PRICE,
+            origin=MASTER_ADDRESS,
+        )
+        snapshot = state.snapshot()
+        try:
+            return state.get_computation(message, transaction_context).apply_message()
+        finally:
+            state.revert(snapshot)
+            self.context = previous_context
+            self.computation_class.context = previous_context
+
+    def execute_batch(self, calls: [(bytes, str, [], int)], blocks: int = 1, **kwargs) \
+            -> [(BlockAPI, ReceiptAPI, ComputationAPI)]:
+        """
+        Calls many contract functions at once. All calls are encoded and signed up front, applied against the current
+        state and mined into one or more blocks. Batched transactions are never debugged.
+        :param calls: The calls to make, given as (address, function signature, function params, value) tuples. The
+        function params follow the format of call_contract_function().
+        :param blocks: The number of blocks the transactions are spread across.
+        :return: A (block, receipt, computation) tuple for every call, in the order of the given calls.
+        """
+        self._set_context(MODE_NONE, **kwargs)
+        logger.info("Executing batch of {n} calls in {b} blocks".format(n=len(calls), b=blocks))
+        nonce = self.vm.state.get_nonce(MASTER_ADDRESS)
+        transactions = []
+        for i, (addr, function_signature, function_params, value) in enumerate(calls):
+            data = self._encode_function_call(function_signature, function_params)
+            transactions.append(self._sign_transaction(nonce + i, DEFAULT_GAS_PRICE, DEFAULT_TRANSACTION_GAS_AMOUNT,
+                                                       Address(addr), value, data))
+
+        results = []
+        chunk_size = max(1, math.ceil(len(transactions) / max(1, blocks)))
+        for start in range(0, len(transactions), chunk_size):
+            new_block, receipts, computations = self.chain.apply_transactions(
+                transactions[start:start + chunk_size]
+            )
+            results.extend((new_block, receipt, computation) for receipt, computation in zip(receipts, computations))
+            self._mine_block()
+        return results
+
+    def seal_pending_transactions(self):
+        """
+        Mines a block containing every transaction that has been applied since the last block was mined, regardless of
+        whether transactions_per_block has been reached yet.
+        :return:
+        """
+        if self.pending_transactions > 0:
+            self._mine_block()
+
+    def snapshot(self) -> int:
+        """
+        Takes a snapshot of the current state which can be returned to via revert(). Every change of the state is
+        persisted into the state trie when a transaction is applied or a block is mined, and trie nodes are never
+        overwritten. Thus the head of the chain (which holds the state root) is all that needs to be remembered, taking
+        a snapshot does not copy any state.
+        :return: The id of the snapshot.
+        """
+        self.snapshot_counter += 1
+        self.snapshots[self.snapshot_counter] = (self.chain.header, set(self.used_addresses), self.seed,
+                                                 self.pending_transactions)
+        return self.snapshot_counter
+
+    def revert(self, snapshot_id: int):
+        """
+        Reverts the state, the chain head and the used addresses to a snapshot. The blocks mined since the snapshot are
+        removed from the canonical chain. The snapshot stays valid, so it is possible to revert to the same snapshot
+        several times (e.g. once per test case), until it is released via release().
+        :param snapshot_id: The id of the snapshot as returned by snapshot().
+        :return:
+        """
+        snapshot = self.snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise ValueError("Unknown snapshot id {i}".format(i=snapshot_id))
+        header, used_addresses, self.seed, self.pending_transactions = snapshot
+        self.used_addresses = set(used_addresses)
+        self._set_canonical_head(self.chain.chaindb.get_block_header_by_hash(header.parent_hash))
+        self.chain.header = header
+        self._refresh_vm()
+
+    def release(self, snapshot_id: int):
+        """
+        Forgets a snapshot that is no longer needed. Reverting to it afterwards is not possible anymore.
+        :param snapshot_id: The id of the snapshot as returned by snapshot().
+        :return:
+        """
+        if self.snapshots.pop(snapshot_id, None) is None:
+            raise ValueError("Unknown snapshot id {i}".format(i=snapshot_id))
+
+    def _set_canonical_head(self, head: BlockHeader):
+        """
+        Makes a mined block the head of the canonical chain, e.g. when reverting to a snapshot. The blocks after it are
+        no longer canonical: they stay in the database, but neither they nor their transactions can be looked up by
+        number anymore, so that the blocks mined next take their place. If the block is on a branch that has been
+        abandoned before, that branch becomes canonical again.
+        :param head: The header of the block.
+        :return:
+        """
+        chaindb = self.chain.chaindb
+        with chaindb.db.atomic_batch() as db:
+            old_head = chaindb.get_canonical_head()
+            for number in range(head.block_number + 1, old_head.block_number + 1):
+                old_header = chaindb._get_block_header_by_hash(db, chaindb._get_canonical_block_hash(db, number))
+                for transaction_hash in chaindb._get_block_transaction_hashes(db, old_header):
+                    chaindb._remove_transaction_from_canonical_chain(db, transaction_hash)
+                db.delete(SchemaV1.make_block_number_to_hash_lookup_key(number))
+            new_headers, _ = chaindb._set_as_canonical_chain_head(db, head.hash, constants.GENESIS_PARENT_HASH)
+            for header in new_headers:
+                for index, transaction_hash in enumerate(chaindb._get_block_transaction_hashes(db, header)):
+                    chaindb._add_transaction_to_canonical_chain(db, transaction_hash, header, index)
+
+    def fork(self) -> ForkedState:
+        """
+        Copies the database and the head of the chain, so that the chain can be continued by another EVMHandler (see the
+        fork parameter of the constructor), e.g. in another process. Unlike snapshot(), the copy is independent of this
+        handler and can be pickled.
+        :return: The state of this handler.
+        """
+        kv = dict(self.db.items()) if self.db is not None else dict(self.base_db.wrapped_db.kv_store)
+        return ForkedState(kv, rlp.encode(self.chain.header), set(self.used_addresses), self.seed)
+
+    def close(self):
+        """
+        Closes the database of the chain if it is persisted. Pending transactions are kept and will be part of the
+        next block that is mined once the chain is opened again.
+        :return:
+        """
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
     def get_balance(self, addr: bytes) -> int:
         """
         Gets the balance of an address.
@@ -234,8 +440,68 @@ class EVMHandler:
         :return:
         """
         self.vm.state.set_storage(addr, slot, value)
+        self.slot_keys.add(slot)
         self._mine_block_dirty()
 
+    def iter_storage(self, addr: bytes, start: bytes = b'') -> Iterator[StorageEntry]:
+        """
+        Enumerates every non-zero storage slot of an address by walking its storage trie, as of the last applied
+        transaction. Since the trie is keyed by the hashes of the slots, the entries come in the order of their keys,
+        and the slot of an entry is only known if its key is in the preimage cache slot_keys. Slots that are known
+        otherwise, e.g. because they have been accessed while debugging, can be added to it beforehand.
+        :param addr: The address to enumerate the storage of.
+        :param start: The key of the entry to start at.
+        :return: The entries in ascending order of their keys.
+        """
+        root = get_storage_root(self.base_db, self.chain.header.state_root, Address(addr))
+        for key, value in iter_trie(self.base_db, root, start):
+            yield StorageEntry(key, self.slot_keys.get(key), rlp.decode(value, sedes=rlp.sedes.big_endian_int))
+
+    def get_storage_page(self, addr: bytes, start: bytes = b'', count: int = STORAGE_PAGE_SIZE) \
+            -> ([StorageEntry], Optional[bytes]):
+        """
+        Fetches the next count entries of iter_storage(), so that the storage of a contract can be shown page by page.
+        :return: The entries and the key at which the next page starts, None if this is the last page.
+        """
+        entries = list(islice(self.iter_storage(addr, start), count + 1))
+        if len(entries) > count:
+            return entries[:count], entries[count].key
+        return entries, None
+
+    def _encode_function_call(self, function_signature: str, function_params: []) -> bytes:
+        """
+        Helper function that encodes a function call into the data field of a transaction.
+        :param function_signature: The signature of the function that is to be called. Example: setValue(uint256)
+        :param function_params: Function params as parsed by json.
+        :return: The method id followed by the abi encoded params.
+        """
+        if function_signature == RAW_DATA_SIGNATURE:
+            return decode_hex(function_params[0].get("value"))
+        return get_function_encoder(function_signature).encode(function_params)
+
+    def _set_context(self, debug_mode: int, **kwargs) -> ExecutionContext:
+        """
+        Creates the context of the next execution of this handler, which is picked up by every computation of it.
+        :param debug_mode: Signalizes whether the execution is debugged.
+        :param kwargs: The signals and locks of the debug session and the tracer, see ExecutionContext. The preimages
+        of SHA3 are recorded into the cache of this handler while debugging, otherwise only into the cache passed as
+        preimages (e.g. the one of this handler), so that plain executions do not pay for hooking SHA3.
+        :return: The new context.
+        """
+        if debug_mode:
+            kwargs.setdefault("preimages", self.preimages)
+        self.context = ExecutionContext(debug_mode, **kwargs)
+        self.computation_class.context = self.context
+        return self.context
+
+    def abort(self):
+        """
+        Aborts the execution that is currently running, e.g. a transaction that is being debugged. This is safe to call
+        from another thread.
+        :return:
+        """
+        self.context.abort_callback()
+
     def _make_transaction(self, nonce: int, gas_price: int, gas: int, to: Address, value: int, data: bytes) \
             -> Tuple[BlockAPI, ReceiptAPI, ComputationAPI]:
         """
@@ -248,6 +514,21 @@ class EVMHandler:
         :param data: Data field.
         :return: The Transaction receipt tuple as it is returned by the apply_transaction() function.
         """
+        signed_tx = self._sign_transaction(nonce, gas_price, gas, to, value, data)
+        return self.chain.apply_transaction(signed_tx)
+
+    def _sign_transaction(self, nonce: int, gas_price: int, gas: int, to: Address, value: int, data: bytes) \
+            -> SignedTransactionAPI:
+        """
+        Helper function that creates a transaction sent from the MASTER_ADDRESS.
+        :param nonce: Current nonce of master address.
+        :param gas_price: Gas price to set.
+        :param gas: Gas to use.
+        :param to: Recipient address.
+        :param value: Value in wei.
+        :param data: Data field.
+        :return: The signed transaction.
+        """
         tx = self.vm.create_unsigned_transaction(
             nonce=nonce,
             gas_price=gas_price,
@@ -256,8 +537,20 @@ class EVMHandler:
             value=value,
             data=data
         )
-        signed_tx = tx.as_signed_transaction(MASTER_PRIVATE_KEY)
-        return self.chain.apply_transaction(signed_tx)
+        return tx.as_signed_transaction(MASTER_PRIVATE_KEY)
+
+    def _transaction_applied(self):
+        """
+        Counts a freshly applied transaction towards the current block. The block is mined once it holds
+        transactions_per_block transactions, otherwise the vm is refreshed so that following reads (e.g. the nonce of
+        the master address) see the state of the pending block.
+        :return:
+        """
+        self.pending_transactions += 1
+        if self.pending_transactions >= self.transactions_per_block:
+            self._mine_block()
+        else:
+            self._refresh_vm()
 
     def _mine_block_dirty(self):
         """
@@ -268,29 +561,43 @@ class EVMHandler:
         :return:
         """
         self.chain.mine_block(mix_hash=b'', nonce=b'', current_vm=self.vm)
-        self.vm = self.chain.get_vm()
-        self.vm.state.computation_class = MyComputation
-        self.vm.get_state_class().computation_class = MyComputation
+        self.pending_transactions = 0
+        self._refresh_vm()
 
     def _mine_block(self):
         """
-        Mines a new block with everything that needs to be done. The computation classes reset with every
-        block that is mined, so they are set again within this function.
+        Mines a new block with everything that needs to be done. If instant sealing is enabled, the proof of work search
+        (and the finalization of the block it requires) is skipped.
+        :return:
+        """
+        if self.instant_seal:
+            block = self.chain.mine_block(mix_hash=constants.ZERO_HASH32, nonce=constants.GENESIS_NONCE)
+            logger.info("Sealed block {no}".format(no=block.number))
+        else:
+            block = self.chain.get_vm().finalize_block(self.chain.get_block())
+            nonce, mix_hash = mine_pow_nonce(
+                block.number,
+                block.header.mining_hash,
+                block.header.difficulty
+            )
+            self.chain.mine_block(mix_hash=mix_hash, nonce=nonce)
+            logger.info("Mined block {no} with nonce {n} and hash {h}".format(no=block.number,
+                                                                              n=int.from_bytes(nonce, "big",
+                                                                                               signed=False),
+                                                                              h=mix_hash.hex()))
+        self.pending_transactions = 0
+        self._refresh_vm()
+
+    def _refresh_vm(self):
+        """
+        Fetches the vm of the current chain head. If the chain is persisted, the
+        header of the chain head is stored as well, so that the next session continues from here.
         :return:
         """
-        block = self.chain.get_vm().finalize_block(self.chain.get_block())
-        nonce, mix_hash = mine_pow_nonce(
-            block.number,
-            block.header.mining_hash,
-            block.header.difficulty
-        )
-        self.chain.mine_block(mix_hash=mix_hash, nonce=nonce)
-        logger.info("Mined block {no} with nonce {n} and hash {h}".format(no=block.number,
-                                                                          n=int.from_bytes(nonce, "big", signed=False),
-                                                                          h=mix_hash.hex()))
         self.vm = self.chain.get_vm()
-        self.vm.state.computation_class = MyComputation
-        self.vm.get_state_class().computation_class = MyComputation
+        if self.db is not None:
+            self.chain.chaindb.db[HEAD_HEADER_KEY] = rlp.encode(self.chain.header)
+            self.db.commit()
 
     def get_random_address(self) -> Address:
         """
@@ -5,29 +5,32 @@ import signal
 import sys
 from threading import Lock
 from types import FunctionType
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 
 from PyQt5.QtCore import *
-from PyQt5.QtGui import QDesktopServices, QFont, QBrush, QColor, QIcon
+from PyQt5.QtGui import QDesktopServices, QFont, QIcon
 from PyQt5.QtWidgets import *
-from eth.abc import CodeStreamAPI, OpcodeAPI, MessageAPI
+from eth.abc import OpcodeAPI, MessageAPI
 from eth.validation import validate_canonical_address
-from eth.vm.logic.invalid import InvalidOpcode
 from eth_typing import Address
 from eth_utils import ValidationError, decode_hex, encode_hex
 from eth_utils.units import units
 
 from app import evmhandler
 from app.evmhandler import EVMHandler, MASTER_ADDRESS
-from app.subcomponents.mycomputation import MyComputation
 from app.ui.ui_add_addresses import Ui_AddAdressesDialog
 from app.ui.ui_add_contract import Ui_AddContractDialog
 from app.ui.ui_main import Ui_MainWindow
 from app.ui.ui_set_gas_limit import Ui_SetGasLimitDialog
 from app.ui.ui_set_gas_price import Ui_SetGasPriceDialog
 from app.ui.ui_set_storage import Ui_set_storage_dialog
-from app.util.changes import ChangeChainLink, TableWidgetEnum, ChangeChain, History
-from app.util.util import MyContract, MyTransaction, hex2, MyAddress
+from app.util.changes import ChangeChainLink, TableWidgetEnum, ChangeChain, History, STEP_PRE, STEP_POST
+from app.util.disassembly import Disassembly
+from app.util.table_models import HighlightTableModel, OpcodeTableModel, StackTableModel, MemoryTableModel, \
+    StorageTableModel, PRE_COMPUTATION_COLOR, POST_COMPUTATION_COLOR
+from app.util.storage_mirror import StorageMirror
+from app.util.tracefile import TraceFileReader
+from app.util.util import MyContract, MyTransaction, MyAddress
 from app.util.workers import TransactionWorker, ContractWorker, BaseWorker
 
 logger = logging.getLogger(__name__)
@@ -47,6 +50,15 @@ class ApplicationWindow(QMainWindow):
         self.ui.actionSet_Gas_Limit.triggered.connect(self.show_set_gas_limit_dialog)
         self.ui.actionSet_Gas_Price.triggered.connect(self.show_set_gas_price_dialog)
         self.ui.actionStorage.triggered.connect(self.show_set_storage_dialog)
+        self.ui.actionOpen_Trace.triggered.connect(self.show_open_trace_dialog)
+        self.opcode_model = OpcodeTableModel(self)
+        self.stack_model = StackTableModel(self)
+        self.memory_model = MemoryTableModel(self)
+        self.storage_model = StorageTableModel(self)
+        self.ui.opcodes_table_view.setModel(self.opcode_model)
+        self.ui.stack_table_view.setModel(self.stack_model)
+        self.ui.memory_table_view.setModel(self.memory_model)
+        self.ui.storage_table_view.setModel(self.storage_model)
         self.relevant_addresses = {}
         self.blockLabel = QLabel()
         self.statusLabel = QLabel()
@@ -60,49 +72,51 @@ class ApplicationWindow(QMainWindow):
         self.ui.used_addresses_table_widget.setColumnWidth(0, 200)
         self.ui.used_addresses_table_widget.setColumnWidth(1, 100)
         self.ui.used_addresses_table_widget.setColumnWidth(2, 69)
-        self.ui.storage_table_widget.hide()
+        self.ui.storage_table_view.hide()
         self.ui.execution_groupbox.hide()
         self.ui.message_groupbox.hide()
-        self.ui.opcodes_table_widget.hide()
-        self.ui.stack_table_widget.hide()
-        self.ui.memory_table_widget.hide()
+        self.ui.opcodes_table_view.hide()
+        self.ui.stack_table_view.hide()
+        self.ui.memory_table_view.hide()
         self.ui.abort_automode_button.hide()
         self.ui.step_duration_label.hide()
         self.ui.step_duration_le.hide()
         self.ui.automode_checkbox.hide()
+        self.ui.history_label.hide()
+        self.ui.history_slider.hide()
+        self.ui.history_slider.setDisabled(True)
 
         logger.info("Connecting buttons to callbacks.")
         self.ui.abort_automode_button.clicked.connect(self.abort_clicked)
         self.ui.debug_checkbox.stateChanged.connect(self.debug_mode_changed)
         self.ui.automode_checkbox.stateChanged.connect(self.auto_mode_changed)
         self.ui.steps_button.clicked.connect(self.steps_clicked)
+        self.ui.history_slider.valueChanged.connect(self.history_slider_moved)
 
         logger.info("Initializing objects needed for debugging")
-        # contains mappings from addresses to mappings of storage slots to indices of table widgets
-        # address -> {
-        #   slot -> index
-        #   slot -> index
-        # }
-        self.storage_lookup: {{}} = {}
-        self.table_lookup = {TableWidgetEnum.OPCODES: self.ui.opcodes_table_widget,
-            TableWidgetEnum.STACK: self.ui.stack_table_widget, TableWidgetEnum.MEMORY: self.ui.memory_table_widget,
-            TableWidgetEnum.STORAGE: self.ui.storage_table_widget,
-            TableWidgetEnum.ADDRESSES: self.ui.used_addresses_table_widget}
+        # the storage slots that have been seen per address and their rows in the storage table
+        self.storage_mirror = StorageMirror()
+        self.table_lookup = {TableWidgetEnum.OPCODES: self.opcode_model, TableWidgetEnum.STACK: self.stack_model,
+            TableWidgetEnum.MEMORY: self.memory_model, TableWidgetEnum.STORAGE: self.storage_model}
         self.change_chains: [ChangeChain] = []
+        # the change chain whose changes are currently highlighted
+        self.shown_chain: ChangeChain = None
+        # the message of the call frame and the address whose storage are currently shown
+        self.shown_message: MessageAPI = None
+        self.shown_storage_address: Address = None
+        # key of the storage trie at which the next page of the shown storage starts, see _fetch_storage_page()
+        self.storage_page: bytes = None
         self.history = History()
         self.current_contract: MyContract = None
-        self.setting_storage = False
 
         logger.info("Initialize threading objects. ThreadPool size: 1")
         self.thread_pool = QThreadPool()
         self.thread_pool.setMaxThreadCount(1)
         self.init_lock = Lock()
         self.step_lock = Lock()
-        self.storage_lock = Lock()
         self.step_semaphore = QSemaphore(1)
         self.init_lock.acquire(True)
         self.step_lock.acquire(True)
-        self.storage_lock.acquire(True)
 
         logger.info("Put master Account into observed Accounts")
         self.relevant_addresses["0x" + MASTER_ADDRESS.hex()] = MyAddress(MASTER_ADDRESS.hex())
@@ -123,7 +137,7 @@ class ApplicationWindow(QMainWindow):
 
     def abort_clicked(self):
         logger.info("Abort has been clicked!")
-        MyComputation.abort = True
+        self.evm_handler.abort()
         self._refresh_statusbar("Aborting Transaction")
 
     def auto_mode_changed(self, i: int):
@@ -144,24 +158,28 @@ class ApplicationWindow(QMainWindow):
             if self.ui.automode_checkbox.checkState():
                 self.ui.step_duration_label.show()
                 self.ui.step_duration_le.show()
-            self.ui.storage_table_widget.show()
+            self.ui.storage_table_view.show()
             self.ui.execution_groupbox.show()
             self.ui.message_groupbox.show()
-            self.ui.opcodes_table_widget.show()
-            self.ui.stack_table_widget.show()
-            self.ui.memory_table_widget.show()
+            self.ui.opcodes_table_view.show()
+            self.ui.stack_table_view.show()
+            self.ui.memory_table_view.show()
             self.ui.storage_address_label.show()
+            self.ui.history_label.show()
+            self.ui.history_slider.show()
         else:
             self.ui.automode_checkbox.hide()
             self.ui.step_duration_label.hide()
             self.ui.step_duration_le.hide()
-            self.ui.storage_table_widget.hide()
+            self.ui.storage_table_view.hide()
             self.ui.execution_groupbox.hide()
             self.ui.message_groupbox.hide()
-            self.ui.opcodes_table_widget.hide()
-            self.ui.stack_table_widget.hide()
-            self.ui.memory_table_widget.hide()
+            self.ui.opcodes_table_view.hide()
+            self.ui.stack_table_view.hide()
+            self.ui.memory_table_view.hide()
             self.ui.storage_address_label.hide()
+            self.ui.history_label.hide()
+            self.ui.history_slider.hide()
         pass
 
     def show_set_storage_dialog(self):
@@ -217,7 +235,6 @@ class ApplicationWindow(QMainWindow):
         cb.currentIndexChanged.connect(cb_callback)
         set_storage_dialog.show()
         if set_storage_dialog.exec_() == QDialog.Accepted:
-            self.setting_storage = True
             if cb.currentIndex() != 0 or len(le.text()) != 0:
                 if cb.isEnabled():
                     addr = Address(decode_hex(cb.currentText()[2:]))
@@ -246,9 +263,44 @@ class ApplicationWindow(QMainWindow):
                                 st = "Could not set at least one slot"
                                 continue
                             self.evm_handler.set_storage(addr, slot, val)
-                            self.set_storage_signal_cb(addr, hex2(slot), hex2(val))
+                            self.storage_mirror.set(addr, slot, val)
+                self._sync_storage()
                 self._refresh_statusbar(st)
-            self.setting_storage = False
+
+    def show_open_trace_dialog(self):
+        """
+        Opens a trace file written by TraceFileWriter and shows it like a debugged transaction, without executing it.
+        """
+        if not self.ui.send_transaction_button.isEnabled():
+            self._refresh_statusbar("A trace can be opened once the transaction is finished")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Open Trace", "", "Traces (*.evmtrace);;All Files (*)")
+        if not path:
+            return
+        try:
+            trace = TraceFileReader(path, self.evm_handler.vm.state.computation_class.opcodes)
+        except (OSError, ValueError) as e:
+            self._refresh_statusbar("Could not open trace: " + str(e))
+            return
+        self.open_trace(trace)
+
+    def open_trace(self, trace: TraceFileReader):
+        """
+        Shows the steps of a trace with the history slider, starting at its last step.
+        """
+        self._set_history(trace)
+        self.shown_chain = None
+        self.shown_message = None
+        for addr, slot in trace.get_storage(0):
+            self.storage_mirror.add(addr, int(slot, 16))
+        # the slots of the trace are decoded with the preimages it has been recorded with
+        self.evm_handler.preimages.update(trace.preimages)
+        self.ui.debug_checkbox.setCheckState(Qt.Checked)
+        self._refresh_history_slider()
+        self.ui.history_slider.setDisabled(len(trace) == 0)
+        if len(trace) > 0:
+            self._show_history_step(len(trace) - 1)
+        self._refresh_statusbar("Opened trace with {n} steps".format(n=len(trace)))
 
     def show_set_gas_limit_dialog(self):
         self._set_gas_price_or_limit(set_price=False)
@@ -356,16 +408,16 @@ class ApplicationWindow(QMainWindow):
                         wei = 0
                         self._refresh_statusbar("Invalid amount. Continue with " + str(wei))
                     worker = ContractWorker(self.evm_handler.create_contract, self.current_contract.bytecode.object,
-                                            wei, self._current_debug_mode(), storage_lookup=self.storage_lookup,
-                                            init_lock=self.init_lock, step_lock=self.step_lock,
-                                            storage_lock=self.storage_lock, step_semaphore=self.step_semaphore,
+                                            wei, self._current_debug_mode(), storage_mirror=self._debug_mirror(),
+                                            preimages=self.evm_handler.preimages, init_lock=self.init_lock,
+                                            step_lock=self.step_lock, step_semaphore=self.step_semaphore,
                                             step_duration=step_duration)
                     self._connect_signals_and_start_worker(worker)
                 else:
                     self.current_contract = MyContract("[]", ui.bytecode_te.toPlainText())
                     addr = Address(decode_hex(ui.contract_le.text()))
                     addr = self.evm_handler.set_code(addr=addr, code=decode_hex(self.current_contract.bytecode.object))
-                    self.storage_lookup[addr] = {}
+                    self.storage_mirror.remove(addr)
                     self.contract_created_signal_cb(addr)
             except (TypeError, json.JSONDecodeError, ValueError) as e:
                 self._refresh_statusbar(str(e))
@@ -390,9 +442,10 @@ class ApplicationWindow(QMainWindow):
         worker: TransactionWorker = TransactionWorker(self.evm_handler.call_contract_function, con.get_typed_address(),
                                                       self.ui.select_function_combobox.currentText(), args,
                                                       self._current_debug_mode(), wei,
-                                                      storage_lookup=self.storage_lookup, init_lock=self.init_lock,
-                                                      step_lock=self.step_lock, storage_lock=self.storage_lock,
-                                                      step_semaphore=self.step_semaphore, step_duration=step_duration)
+                                                      storage_mirror=self._debug_mirror(),
+                                                      preimages=self.evm_handler.preimages, init_lock=self.init_lock,
+                                                      step_lock=self.step_lock, step_semaphore=self.step_semaphore,
+                                                      step_duration=step_duration)
         self._connect_signals_and_start_worker(worker)
 
     def contract_function_selected(self):
@@ -418,6 +471,9 @@ class ApplicationWindow(QMainWindow):
         Post transaction processes.
         """
         self._refresh_relevant_addresses()
+        # the table is filled from the state, the changes made during the transaction (which might have been reverted)
+        # are not needed anymore
+        self.storage_mirror.take_deltas()
         addr = self.ui.select_address_combobox.currentText()
         if addr != "Load a contract first!":
             self._refresh_storage(Address(decode_hex(addr[2:])))
@@ -428,6 +484,7 @@ class ApplicationWindow(QMainWindow):
         self.ui.step_duration_le.setDisabled(False)
         self.ui.select_address_combobox.setDisabled(False)
         self.ui.select_function_combobox.setDisabled(False)
+        self.ui.history_slider.setDisabled(len(self.history) == 0)
         self.ui.abort_automode_button.hide()
 
     def pre_transaction_handling(self):
@@ -441,9 +498,13 @@ class ApplicationWindow(QMainWindow):
         self.ui.step_duration_label.setDisabled(True)
         self.ui.select_address_combobox.setDisabled(True)
         self.ui.select_function_combobox.setDisabled(True)
+        self.ui.history_slider.setDisabled(True)
         if self.ui.automode_checkbox.checkState():
             self.ui.abort_automode_button.show()
         self.change_chains: [ChangeChain] = []
+        self.shown_chain = None
+        self._set_history(History(self._get_storage_value))
+        self._refresh_history_slider()
         self.step_semaphore = QSemaphore(1)
 
     def transaction_sent_signal_cb(self):
@@ -475,128 +536,179 @@ class ApplicationWindow(QMainWindow):
         self._clear_table_widget(TableWidgetEnum.MEMORY)
         self._clear_table_widget(TableWidgetEnum.STACK)
         self._refresh_statusbar("Transaction aborted")
-        MyComputation.abort = False
 
     def add_change_chain_signal_cb(self, chain: ChangeChain):
         self.change_chains.append(chain)
 
     def pre_computation_signal_cb(self, remaining_gas: int, pc: int):
+        self._sync_storage()
+        self.history.add_pre_computation(self.change_chains[-1], remaining_gas, pc)
+        self._show_pre_computation(remaining_gas, pc)
+        self.step_lock.release()
+
+    def steps_signal_cb(self, steps: [tuple]):
+        """
+        Callback for the batches of steps sent in MODE_DEBUG_AUTO. Every step is recorded, but only the last pre
+        computation and the post computation following it are drawn, since the steps in between would not be visible
+        for more than a frame anyway.
+        """
+        self._sync_storage()
+        last_pre = last_post = None
+        for i, step in enumerate(steps):
+            if step[0] == STEP_PRE:
+                self.change_chains.append(step[1])
+                self.history.add_pre_computation(step[1], step[2], step[3])
+                last_pre = i
+            elif step[0] == STEP_POST:
+                self.history.add_post_computation(step[1], step[2], step[3], step[4])
+                # the gas costs of all steps are filled in, see _show_post_computation()
+                self.opcode_model.set_gas(step[3] - 1, step[4])
+                last_post = i
+            else:
+                _, addr, slot, value = step
+                self.history.add_storage(addr, hex(slot), hex(value))
+
+        if last_pre is not None:
+            _, _, remaining_gas, pc = steps[last_pre]
+            self._show_pre_computation(remaining_gas, pc)
+        if last_post is not None and (last_pre is None or last_pre < last_post):
+            _, stack, memory, pc, last_gas = steps[last_post]
+            self._show_post_computation(stack, memory, pc, last_gas)
+        self.step_lock.release()
+
+    def _show_pre_computation(self, remaining_gas: int, pc: int):
         # pc and gasleft
         self.ui.gas_label.setText("Gas: " + str(remaining_gas))
         self.ui.pc_label.setText("PC: " + str(pc))
 
-        last_elem = len(self.change_chains) - 1
-        if last_elem > 0:
+        if self.shown_chain is not None:
             # remove previous post highlighting
-            self._highlight_from_chain(self.change_chains[last_elem - 1], False, False)
-        if last_elem >= 0:
-            self._highlight_from_chain(self.change_chains[last_elem], True, True)
-        self.step_lock.release()
+            self._highlight_from_chain(self.shown_chain, False, False)
+        if len(self.change_chains) > 0:
+            self.shown_chain = self.change_chains[-1]
+            self._highlight_from_chain(self.shown_chain, True, True)
+        self._refresh_history_slider()
 
     def post_computation_signal_cb(self, stack: [tuple], memory: bytearray, pc: int, last_gas: int):
+        self.history.add_post_computation(stack, memory, pc, last_gas)
+        self._show_post_computation(stack, memory, pc, last_gas)
+        self.step_lock.release()
+
+    def _show_post_computation(self, stack: [tuple], memory: bytearray, pc: int, last_gas: int):
         logger.info("Entering post compute in main")
         # remove current pre highlighting
-        last_elem = len(self.change_chains) - 1
-        if last_elem >= 0:
-            self._highlight_from_chain(self.change_chains[last_elem], True, False)
+        if self.shown_chain is not None:
+            self._highlight_from_chain(self.shown_chain, True, False)
 
         # for some opcodes it would be very hard to calculate the gas usage in advance (e.g. SSTORE, might be write
         # for 20k or just for 15k or you might even get a refund) so we fill in those gas prices once the information
         # is available
-        v = self.ui.opcodes_table_widget.item(pc - 1, 2)
-        if v is not None:
-            v.setText(str(last_gas))
-
-        # handling changes in stack stack
-        self._clear_table_widget(TableWidgetEnum.STACK)
+        self.opcode_model.set_gas(pc - 1, last_gas)
 
-        size = len(stack) - 1
-        if size >= 0:
-            for i in range(size, -1, -1):
-                if stack[i][0] is int:
-                    val = hex(stack[i][1])
-                else:
-                    val = "0x" + stack[i][1].hex()
-                v = QTableWidgetItem()
-                v.setText(val)
-                self.ui.stack_table_widget.insertRow(size - i)
-                self.ui.stack_table_widget.setItem(size - i, 0, v)
-
-        # handling changes in memory
-        self._clear_table_widget(TableWidgetEnum.MEMORY)
-
-        size = len(memory)
-        new_font = QFont("Courier", 12)
-        if sys.platform.__contains__("linux"):
-            new_font = QFont("Courier", 9)
-        if size >= 32:
-            for i in range(0, size, 32):
-                val = "0x" + memory[i:i + 32].hex()
-                v = QTableWidgetItem()
-                v.setText(val)
-                v.setFont(new_font)
-                self.ui.memory_table_widget.insertRow(i / 32)
-                self.ui.memory_table_widget.setItem(i / 32, 0, v)
+        self.stack_model.set_stack(stack)
+        self.memory_model.set_memory(memory)
 
         # highlighting
-        if last_elem >= 0:
-            self._highlight_from_chain(self.change_chains[last_elem], False, True)
+        if self.shown_chain is not None:
+            self._highlight_from_chain(self.shown_chain, False, True)
 
         # scroll to correct place
-        v2 = self.ui.opcodes_table_widget.item(pc, 2)
-        self.ui.opcodes_table_widget.scrollToItem(v2)
-        self.step_lock.release()
+        self.ui.opcodes_table_view.scrollTo(self.opcode_model.index(self.opcode_model.row_of(pc), 0))
+        self._refresh_history_slider()
+
+    def history_slider_moved(self, step: int):
+        """
+        Shows the recorded state after the given step of the last debugged transaction.
+        """
+        if self.ui.history_slider.isEnabled() and 0 <= step < len(self.history):
+            self._show_history_step(step)
+
+    def _show_history_step(self, step: int):
+        state = self.history.seek(step)
+        if state.message is not None:
+            if state.message is not self.shown_message:
+                self.opcode_model.set_code(state.disassembly, state.opcodes)
+                self._show_message(state.message)
+            if state.message.storage_address != self.shown_storage_address:
+                self._refresh_storage(state.message.storage_address)
+
+        if self.shown_chain is not None:
+            self._highlight_from_chain(self.shown_chain, True, False)
+            self._highlight_from_chain(self.shown_chain, False, False)
+        self.ui.gas_label.setText("Gas: " + str(state.gas_remaining))
+        self.ui.pc_label.setText("PC: " + str(state.pc))
+        self.stack_model.set_stack(state.stack)
+        self.memory_model.set_memory(state.memory)
+        for (addr, slot), value in state.storage.items():
+            slot = int(slot, 16)
+            row = self.storage_mirror.row(addr, slot)
+            if addr == self.shown_storage_address and row is not None and value is not None:
+                self.storage_model.set_slot(row, self._slot_text(slot), value)
+
+        # the instruction of the step and what it read are shown in red, what it wrote in green
+        self.shown_chain = state.change_chain
+        self._highlight_from_chain(self.shown_chain, True, True)
+        self._highlight_from_chain(self.shown_chain, False, True)
+        self.ui.opcodes_table_view.scrollTo(self.opcode_model.index(self.opcode_model.row_of(state.pc), 0))
+        self.ui.history_label.setText("Step: {s}/{n}".format(s=step + 1, n=len(self.history)))
+
+    def _set_history(self, history):
+        """
+        Replaces the history that is shown by the history slider, a previously opened trace file is closed.
+        """
+        if isinstance(self.history, TraceFileReader):
+            self.history.close()
+        self.history = history
 
-    def init_debug_session_signal_cb(self, code: CodeStreamAPI, opcode_lookup: Dict[int, OpcodeAPI],
+    def _refresh_history_slider(self):
+        """
+        Moves the history slider to the last recorded step, without showing that step.
+        """
+        self.ui.history_slider.blockSignals(True)
+        self.ui.history_slider.setMaximum(max(len(self.history) - 1, 0))
+        self.ui.history_slider.setValue(max(len(self.history) - 1, 0))
+        self.ui.history_slider.blockSignals(False)
+        self.ui.history_label.setText("Step: {s}/{n}".format(s=len(self.history), n=len(self.history)))
+
+    def init_debug_session_signal_cb(self, disassembly: Disassembly, opcode_lookup: Dict[int, OpcodeAPI],
                                      message: MessageAPI):
         """
-        :param code: Must be a deepcopy() version of the real code object.
+        :param disassembly: The disassembly of the code that is executed.
         :param opcode_lookup:
         :param message:
         :return:
         """
         logger.info("Init_debug signal received")
 
-        # self.history.init = (code, opcode_lookup, message)
-        # self.change_chains: [ChangeChain] = []
-
-        self._clear_table_widget(TableWidgetEnum.OPCODES)
+        self.history.add_init(disassembly, opcode_lookup, message)
         self._clear_table_widget(TableWidgetEnum.STACK)
         self._clear_table_widget(TableWidgetEnum.MEMORY)
+        self.opcode_model.set_code(disassembly, opcode_lookup)
 
-        # reset the program counter, it might not be 0 and we need the whole thing.
-        code.pc = 0
+        self._show_message(message)
 
-        # this variable will be used to skip rounds of the iteration.
-        # e.g. we read in the opcode push1 -> we will skip the next round (of drawing mnemonic)
-        # e.g. we read push10 -> we skip 10 rounds
-        skip = 0
-        for opcode in code:
-            c = self.ui.opcodes_table_widget.rowCount()
-            self.ui.opcodes_table_widget.insertRow(c)
-            try:
-                opcode_fn = opcode_lookup[opcode]
-            except KeyError:
-                opcode_fn = InvalidOpcode(opcode)
-
-            o = QTableWidgetItem()
-            o.setText(hex2(opcode))
-            self.ui.opcodes_table_widget.setItem(c, 0, o)
-
-            if skip > 0:
-                skip = skip - 1
-                continue
-
-            m = QTableWidgetItem()
-            g = QTableWidgetItem()
-            m.setText(opcode_fn.mnemonic)
-            g.setText(str(opcode_fn.gas_cost))
-            g.setTextAlignment(130)
-            self.ui.opcodes_table_widget.setItem(c, 1, m)
-            self.ui.opcodes_table_widget.setItem(c, 2, g)
-            if 0x60 <= opcode <= 0x7f:
-                skip = opcode - 0x5f
+        self._refresh_storage(message.storage_address)
+        self._sync_storage()
+
+        # I think the processEvents function does also process signals in the background. This isn't really documented
+        # anywhere besides at some places in the docs where signals are also called events. The reason why I am
+        # thinking that is that when this line is reached, the pre_computation_cb callback is called immediately
+        # afterwards, which should not be and is only the case if there already is a signal in the queue waiting to be
+        # handled and the processEvents function handles all the signals before updating the gui (which
+        # is what we actually want).
+        # To circumvent this, we need to put a lock in the worker thread that locks immediately after
+        # firing the init_debug signal and will only release after processEvents has been called. That way the worker
+        # thread will not add another signal to the queue before the current events (namely updating the gui which
+        # is happening in this function) are processed.
 
+        qApp.processEvents()
+        self.init_lock.release()
+
+    def _show_message(self, message: MessageAPI):
+        """
+        Shows the details of the message of a call frame.
+        """
+        self.shown_message = message
         self.ui.origin_label.setText("origin: 0x" + MASTER_ADDRESS.hex())
         self.ui.origin_label.setToolTip("origin: 0x" + MASTER_ADDRESS.hex())
         self.ui.from_label.setText("from: 0x" + message.sender.hex())
@@ -616,22 +728,6 @@ class ApplicationWindow(QMainWindow):
         self.ui.call_depth_label.setText("call depth: " + str(message.depth))
         self.ui.call_depth_label.setToolTip("call depth: " + str(message.depth))
 
-        self._refresh_storage(message.storage_address)
-
-        # I think the processEvents function does also process signals in the background. This isn't really documented
-        # anywhere besides at some places in the docs where signals are also called events. The reason why I am
-        # thinking that is that when this line is reached, the pre_computation_cb callback is called immediately
-        # afterwards, which should not be and is only the case if there already is a signal in the queue waiting to be
-        # handled and the processEvents function handles all the signals before updating the gui (which
-        # is what we actually want).
-        # To circumvent this, we need to put a lock in the worker thread that locks immediately after
-        # firing the init_debug signal and will only release after processEvents has been called. That way the worker
-        # thread will not add another signal to the queue before the current events (namely updating the gui which
-        # is happening in this function) are processed.
-
-        qApp.processEvents()
-        self.init_lock.release()
-
     def error_signal_cb(self, reason: str):
         """
         Callback function for the error signal.
@@ -639,67 +735,27 @@ class ApplicationWindow(QMainWindow):
         self._refresh_statusbar(reason)
         self.post_transaction_handling()
 
-    def set_storage_signal_cb(self, addr: Address, slot: str = "", value: str = ""):
-        lkp = self.storage_lookup.get(addr)
-        if lkp is None:
-            self.storage_lookup[addr] = {}
-
-        c = self.storage_lookup.get(addr).get(slot)
-        if c is None:
-            self.storage_lookup[addr][slot] = len(self.storage_lookup.get(addr))
-
-        # if we are handling a contract address that is currently being displayed OR if we are in the process of
-        # creating a new contract
-        if self.ui.debug_checkbox.checkState() or self.current_contract.get_typed_address() == b'':
-            if c is None:
-                c = self.storage_lookup.get(addr).get(slot)
-                self.ui.storage_table_widget.insertRow(c)
-                s = QTableWidgetItem()
-                v = QTableWidgetItem()
-                s.setText(slot)
-                v.setText(value)
-                v.setTextAlignment(130)
-                self.ui.storage_table_widget.setItem(c, 0, s)
-                self.ui.storage_table_widget.setItem(c, 1, v)
-            else:
-                v = self.ui.storage_table_widget.item(c, 1)
-                v.setText(value)
-
-            self.ui.storage_table_widget.scrollToItem(v)
-            if self.ui.debug_checkbox.checkState() and not self.setting_storage:
-                self.storage_lock.release()
+    def _sync_storage(self):
+        """
+        Takes the changes of the storage mirror since the last call and shows the slots of the shown address.
+        """
+        for addr, slot, row, value in self.storage_mirror.take_deltas():
+            if addr == self.shown_storage_address and value is not None:
+                self.storage_model.set_slot(row, self._slot_text(slot), hex(value))
 
     def _highlight_from_chain(self, c: ChangeChain, pre_computation: bool, set_properties: bool):
         # highlighting
+        if not set_properties:
+            color = None
+        elif pre_computation:
+            color = PRE_COMPUTATION_COLOR
+        else:
+            color = POST_COMPUTATION_COLOR
         for link in c:
             logger.info("Now doing widget {w}".format(w=link.widget))
             link: ChangeChainLink = link
-            widget: QTableWidget = self.table_lookup[link.widget]
-            if pre_computation:
-                comp = link.pre_computation
-            else:
-                comp = link.post_computation
-            for index in comp:
-                for i in range(0, widget.columnCount()):
-                    item: QTableWidgetItem = widget.item(index, i)
-                    if item is None:
-                        logger.info("Skipping item {ind}, {i} because it is None".format(ind=index, i=i))
-                        continue
-                    if set_properties:
-                        font: QFont = QFont()
-                        font.setBold(True)
-                        if pre_computation:
-                            col = QColor(255, 0, 0)
-                        else:
-                            col = QColor(0, 255, 0)
-                        item.setFont(font)
-                        item.setForeground(QBrush(col))
-                    else:  # reset
-                        it: QTableWidgetItem = QTableWidgetItem()
-                        it.setText(item.text())
-                        if link.widget == TableWidgetEnum.OPCODES and i == 2 or link.widget == TableWidgetEnum.STORAGE and i == 1:
-                            it.setTextAlignment(130)
-                        widget.setItem(index, i, it)
+            model: HighlightTableModel = self.table_lookup[link.widget]
+            model.highlight(link.pre_computation if pre_computation else link.post_computation, color)
 
         #  Put a lock around this and process only one step at a time. MyComputation must wait until the
         #  produced is consumed
@@ -710,24 +766,47 @@ class ApplicationWindow(QMainWindow):
         Helper function that refreshes the displayed storage table widget with values for the specified address.
         """
         self._clear_table_widget(TableWidgetEnum.STORAGE)
+        self.shown_storage_address = addr
         if addr is None:
             return
         self.ui.storage_address_label.setText("Address: 0x" + addr.hex())
         self.ui.storage_address_label.setToolTip("Showing storage for address: 0x" + addr.hex())
-        lkp = self.storage_lookup.get(addr)
-        if lkp is not None:
-            for i in range(0, len(lkp.keys())):
-                self.ui.storage_table_widget.insertRow(i)
-
-            for slot in lkp.keys():
-                value = hex(self.evm_handler.get_storage_at(addr, int(slot, 0)))
-                k = QTableWidgetItem()
-                v = QTableWidgetItem()
-                k.setText(slot)
-                v.setText(value)
-                v.setTextAlignment(130)
-                self.ui.storage_table_widget.setItem(lkp.get(slot), 0, k)
-                self.ui.storage_table_widget.setItem(lkp.get(slot), 1, v)
+        slots = self.storage_mirror.slots(addr)
+        for row, slot in enumerate(slots):
+            self.storage_model.set_slot(row, self._slot_text(slot), hex(self.evm_handler.get_storage_at(addr, slot)))
+        # every other non-zero slot is fetched from the storage trie, page by page as the table is scrolled down
+        self.evm_handler.slot_keys.add_all(slots)
+        self.storage_page = b''
+        self.storage_model.set_fetcher(self._fetch_storage_page)
+        self.storage_model.fetchMore()
+
+    def _fetch_storage_page(self) -> bool:
+        """
+        Shows the next page of the non-zero slots of the shown address that are not in the storage mirror yet. Slots
+        whose preimage is known are added to the mirror, so that they keep their rows while debugging.
+        :return: Whether there are more pages.
+        """
+        addr = self.shown_storage_address
+        entries, self.storage_page = self.evm_handler.get_storage_page(addr, self.storage_page)
+        for entry in entries:
+            if entry.slot is None:
+                self.storage_model.add_hashed_slot("0x" + entry.key.hex(), hex(entry.value))
+            elif self.storage_mirror.row(addr, entry.slot) is None:
+                self.storage_model.set_slot(self.storage_mirror.add(addr, entry.slot), self._slot_text(entry.slot),
+                                            hex(entry.value))
+        return self.storage_page is not None
+
+    def _slot_text(self, slot: int) -> str:
+        """
+        :return: The slot as it is shown in the storage table, decoded into mapping key or array offset if possible.
+        """
+        return self.evm_handler.preimages.format_slot(slot)
+
+    def _get_storage_value(self, addr: Address, slot: str) -> str:
+        """
+        :return: The value of the storage slot at the given address, as of the last mined transaction.
+        """
+        return hex(self.evm_handler.get_storage_at(addr, int(slot, 0)))
 
     def _refresh_statusbar(self, status: str = ""):
         self.blockLabel.setText("Current Block: " + str(self.evm_handler.get_block_number()) + " | Gas Price: " + str(
@@ -745,8 +824,8 @@ class ApplicationWindow(QMainWindow):
                     if cb.itemText(i) == addr.get_readable_address():
                         cb.removeItem(i)
                         break
-                if self.storage_lookup.get(addr.get_readable_address()) is not None:
-                    self.storage_lookup.pop(addr.get_readable_address())
+                if addr.get_typed_address() in self.storage_mirror:
+                    self.storage_mirror.remove(addr.get_typed_address())
                     self._refresh_storage()
             c = self.ui.used_addresses_table_widget.rowCount()
             self.ui.used_addresses_table_widget.insertRow(c)
@@ -766,9 +845,10 @@ class ApplicationWindow(QMainWindow):
         """
         Helper function that clears a table widget.
         """
-        widget = self.table_lookup.get(enum)
-        while widget.rowCount() > 0:
-            widget.removeRow(0)
+        if enum == TableWidgetEnum.ADDRESSES:
+            self.ui.used_addresses_table_widget.setRowCount(0)
+        else:
+            self.table_lookup.get(enum).clear()
 
     def _connect_signals_and_start_worker(self, worker: BaseWorker):
         """
@@ -777,7 +857,7 @@ class ApplicationWindow(QMainWindow):
         worker.signals.init_debug_session.connect(self.init_debug_session_signal_cb)
         worker.signals.post_computation.connect(self.post_computation_signal_cb)
         worker.signals.pre_computation.connect(self.pre_computation_signal_cb)
-        worker.signals.set_storage.connect(self.set_storage_signal_cb)
+        worker.signals.steps.connect(self.steps_signal_cb)
         worker.signals.add_chain.connect(self.add_change_chain_signal_cb)
         worker.signals.contract_created.connect(self.contract_created_signal_cb)
         worker.signals.transaction_sent.connect(self.transaction_sent_signal_cb)
@@ -832,6 +912,13 @@ class ApplicationWindow(QMainWindow):
             return None
         return res
 
+    def _debug_mirror(self) -> Optional[StorageMirror]:
+        """
+        :return: The storage mirror if the next transaction is debugged. Otherwise the storage is not tracked during the
+        transaction at all, the storage table is enumerated from the state afterwards.
+        """
+        return self.storage_mirror if self._current_debug_mode() else None
+
     def _current_debug_mode(self) -> int:
         """
         :return: The current debug mode that is internally used. The values correspond to the ones defined in the
@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Any, Sequence, Tuple
 
-from eth.abc import BlockAPI
+from eth.abc import BlockAPI, ComputationAPI, ReceiptAPI, SignedTransactionAPI
 from eth.chains.base import MiningChain
 
 
@@ -21,3 +21,26 @@ class MyChain(MiningChain):
         self.chaindb.persist_block(mined_block)
         self.header = self.create_header_from_parent(mined_block.header)
         return mined_block
+
+    def apply_transactions(self, transactions: Sequence[SignedTransactionAPI]) \
+            -> Tuple[BlockAPI, Tuple[ReceiptAPI, ...], Tuple[ComputationAPI, ...]]:
+        """
+        Applies several transactions to the current tip block at once. This works like apply_transaction() in
+        MiningChain, but the state is only persisted and the transaction and receipt tries are only built once for all
+        of the given transactions instead of once per transaction.
+        """
+        vm = self.get_vm(self.header)
+        base_block = vm.get_block()
+
+        header, receipts, computations = vm.apply_all_transactions(transactions, base_block.header)
+
+        vm.state.persist()
+        new_header = header.copy(state_root=vm.state.state_root)
+
+        all_transactions = base_block.transactions + tuple(transactions)
+        all_receipts = base_block.get_receipts(self.chaindb) + receipts
+
+        new_block = vm.set_block_transactions(base_block, new_header, all_transactions, all_receipts)
+
+        self.header = new_block.header
+        return new_block, receipts, computations
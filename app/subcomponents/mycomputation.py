@@ -1,10 +1,8 @@
 import logging
-from copy import deepcopy
 from threading import Lock
-from time import sleep
-from typing import Any
+from time import sleep, monotonic
+from typing import Any, Dict
 
-from PyQt5.QtCore import QSemaphore
 from eth.abc import (
     MessageAPI,
     ComputationAPI,
@@ -17,13 +15,117 @@ from eth.vm.forks.istanbul.computation import IstanbulComputation
 from eth.vm.logic.invalid import InvalidOpcode
 from eth.vm.opcode_values import *
 
-from app.util.changes import ChangeChain, ChangeChainLink, TableWidgetEnum
+from app.util.changes import ChangeChain, ChangeChainLink, TableWidgetEnum, STEP_PRE, STEP_POST, STEP_STORAGE
+from app.util.disassembly import Disassembly, get_disassembly
+from app.util.preimages import MAX_PREIMAGE_LENGTH, MIN_PREIMAGE_LENGTH, PreimageCache
 # prevents circular dependency
 from app.util.stack_effects import stack_effects
-from app.util.util import MODE_DEBUG, MODE_DEBUG_AUTO, get_stack_content
+from app.util.storage_mirror import StorageMirror
+from app.util.tracer import Tracer
+from app.util.util import MODE_NONE, MODE_DEBUG, MODE_DEBUG_AUTO, StackItem, get_stack_ints, format_stack_item, \
+    stack_item_to_int
 
 logger = logging.getLogger(__name__)
 
+# minimal time in seconds between two batches of steps sent to the GUI in MODE_DEBUG_AUTO (about one frame)
+STEP_FLUSH_INTERVAL = 1 / 30
+
+
+def _memory_rows(offset: int, length: int) -> [int]:
+    """
+    :return: The rows of the memory table that are highlighted for an access at the given offset and length.
+    """
+    return list(range(offset // 32, length // 32 + 1))
+
+
+class ExecutionContext:
+    """
+    Everything an execution needs to know besides the state: the debug mode, the signals and locks that connect it to
+    the GUI, the tracer and the steps that have not been sent to the GUI yet. The EVMHandler creates a new context for
+    every execution, and every call frame of the execution shares it. Since nothing is kept at class level, several
+    EVMHandlers can execute on parallel threads without interfering with each other.
+    """
+
+    def __init__(self, debug_mode: int = MODE_NONE, **kwargs):
+        """
+        :param debug_mode: One of MODE_NONE, MODE_DEBUG and MODE_DEBUG_AUTO.
+        :param kwargs: The signals, locks and settings of the debug session (see TransactionWorker) and the tracer.
+        """
+        self.debug_mode = debug_mode
+        self.abort = False
+        self.returned = False
+        self.last_consumed_gas_amount = 0
+        self.step_buffer = []
+        self.last_flush = 0
+        self.set_storage = kwargs.get("set_storage")
+        self.init_debug_session = kwargs.get("init_debug_session")
+        self.init_lock: Lock = kwargs.get("init_lock")
+        self.abort_transaction = kwargs.get("abort")
+        self.step_duration = kwargs.get("step_duration")
+        self.step_semaphore = kwargs.get("step_semaphore")
+        # cache the preimages of the hashes computed by SHA3 are recorded into, see sha3_executed()
+        self.preimages: PreimageCache = kwargs.get("preimages")
+        self.storage_mirror: StorageMirror = kwargs.get("storage_mirror")
+        if self.storage_mirror is None and debug_mode:
+            self.storage_mirror = StorageMirror()
+        # only if someone listens, storage writes are reported outside of debugging (see storage_changed())
+        self.track_storage = self.set_storage is not None or self.storage_mirror is not None
+        self.pre_computation = kwargs.get("pre_computation")
+        self.post_computation = kwargs.get("post_computation")
+        self.add_chain = kwargs.get("add_chain")
+        self.step_lock: Lock = kwargs.get("step_lock")
+        self.steps = kwargs.get("steps")
+        self.tracer: Tracer = kwargs.get("tracer")
+
+    def flush_steps(self):
+        """
+        In MODE_DEBUG_AUTO the steps are not sent to the GUI one by one, instead they are buffered and sent in batches
+        at most once per STEP_FLUSH_INTERVAL. This way there is only one hand off between the worker and the GUI thread
+        per frame instead of two per step. The buffer must also be flushed before any signal that changes what the
+        buffered steps refer to (e.g. init_debug_session) is sent.
+        """
+        if self.step_buffer:
+            steps = self.step_buffer
+            self.step_buffer = []
+            self.steps.emit(steps)
+            self.step_lock.acquire(True)
+        self.last_flush = monotonic()
+
+    def abort_callback(self):
+        self.abort = True
+
+    def sha3_executed(self, computation: ComputationAPI, start: int, size: int):
+        """
+        Records the input of a SHA3 that has just been executed along with its hash, which is on top of the stack.
+
+        :param start: The offset of the input in memory.
+        :param size: The length of the input.
+        """
+        if MIN_PREIMAGE_LENGTH <= size <= MAX_PREIMAGE_LENGTH:
+            digest, = get_stack_ints(computation._stack.values, 1)
+            self.preimages.add(digest, computation.memory_read_bytes(start, size))
+
+    def storage_changed(self, address: bytes, slot: StackItem, value: StackItem):
+        """
+        Reports that a storage slot has been written. The slot is registered in the storage mirror, the set_storage
+        signal is emitted if there is one and while debugging, the change becomes part of the steps that are sent to the
+        GUI, so that it is recorded for the correct step.
+
+        :param slot: The slot as element of the py-evm stack.
+        :param value: The written value as element of the py-evm stack.
+        """
+        if self.set_storage is not None:
+            self.set_storage.emit(address, format_stack_item(slot), format_stack_item(value))
+        if self.storage_mirror is None and not self.debug_mode:
+            return
+        slot, value = stack_item_to_int(slot), stack_item_to_int(value)
+        if self.storage_mirror is not None:
+            self.storage_mirror.set(address, slot, value)
+        if self.debug_mode:
+            self.step_buffer.append((STEP_STORAGE, address, slot, value))
+            if self.debug_mode == MODE_DEBUG:
+                self.flush_steps()
+
 
 class MyComputation(IstanbulComputation):
     """
@@ -32,41 +134,21 @@ class MyComputation(IstanbulComputation):
 
     A class for all execution computations in the ``Byzantium`` fork.
     Inherits from :class:`~eth.vm.forks.spurious_dragon.computation.SpuriousDragonComputation`
+
+    Every EVMHandler configures its own subclass and sets its context before each execution. The computations of an
+    execution keep a reference to that context, so they do not depend on class level state while they run.
     """
 
-    debug_mode: int = 0
-    abort: bool = False
-    last_consumed_gas_amount = 0
-    kwargs = {}
-    init_debug_session = None
-    init_lock: Lock = None
-    abort_transaction = None
-    step_duration = None
-    storage_lock: Lock = None
-    step_semaphore: QSemaphore = None
-    storage_lookup = None
-    pre_computation = None
-    add_chain = None
-    step_lock = None
-    post_computation = None
-    set_storage = None
-    returned = False
+    # context of the next execution, see ExecutionContext
+    context: ExecutionContext = ExecutionContext()
+    # opcode lookup used by the non-debug fast path, see _get_fast_opcodes()
+    fast_opcodes = None
+    # disassembly of the code executed by a computation, set in apply_computation() if it is traced or debugged
+    disassembly: Disassembly = None
 
-    @classmethod
-    def parse_kwargs(cls):
-        cls.returned = False
-        cls.set_storage = cls.kwargs.get("set_storage")
-        cls.init_debug_session = cls.kwargs.get("init_debug_session")
-        cls.init_lock: Lock = cls.kwargs.get("init_lock")
-        cls.abort_transaction = cls.kwargs.get("abort")
-        cls.step_duration = cls.kwargs.get("step_duration")
-        cls.storage_lock: Lock = cls.kwargs.get("storage_lock")
-        cls.step_semaphore: QSemaphore = cls.kwargs.get("step_semaphore")
-        cls.storage_lookup = cls.kwargs.get("storage_lookup")
-        cls.pre_computation = cls.kwargs.get("pre_computation")
-        cls.post_computation = cls.kwargs.get("post_computation")
-        cls.add_chain = cls.kwargs.get("add_chain")
-        cls.step_lock: Lock = cls.kwargs.get("step_lock")
+    def __init__(self, state: StateAPI, message: MessageAPI, transaction_context: TransactionContextAPI) -> None:
+        super().__init__(state, message, transaction_context)
+        self.context = type(self).context
 
     @classmethod
     def apply_computation(cls,
@@ -76,21 +158,35 @@ class MyComputation(IstanbulComputation):
         """
         Perform the computation that would be triggered by the VM message.
         """
-        cls.parse_kwargs()
         with cls(state, message, transaction_context) as computation:
+            ctx = computation.context
+            ctx.returned = False
             # Early exit on pre-compiles
             precompile = computation.precompiles.get(message.code_address, NO_RESULT)
             if precompile is not NO_RESULT:
                 precompile(computation)
                 return computation
 
+            if not ctx.debug_mode and ctx.tracer is None:
+                # the code stream validates jump destinations lazily by itself, so the disassembly is not needed
+                cls.apply_fast(computation)
+                return computation
+
+            # the disassembly is shared by every computation executing the same code. It already knows which
+            # positions are push data, so the code stream does not have to find out when validating jumps
+            computation.disassembly = get_disassembly(message.code)
+            computation.code.valid_positions = computation.disassembly.valid_positions
+            computation.code.invalid_positions = computation.disassembly.invalid_positions
+
+            if not ctx.debug_mode:
+                cls.apply_traced(computation, ctx.tracer)
+                return computation
+
             opcode_lookup = computation.opcodes
 
-            if cls.debug_mode:
-                cls.init_debug_session.emit(
-                    deepcopy(computation.code), computation.opcodes, message
-                )
-                cls.init_lock.acquire(True)
+            ctx.flush_steps()
+            ctx.init_debug_session.emit(computation.disassembly, computation.opcodes, message)
+            ctx.init_lock.acquire(True)
 
             for opcode in computation.code:
                 try:
@@ -99,173 +195,231 @@ class MyComputation(IstanbulComputation):
                     opcode_fn = InvalidOpcode(opcode)
 
                 try:
-                    if cls.abort:
+                    if ctx.abort:
                         logger.warning("Abort has been received")
                         raise Halt
 
-                    if cls.debug_mode == MODE_DEBUG:
-                        cls.step_semaphore.acquire(1)
+                    if ctx.debug_mode == MODE_DEBUG:
+                        ctx.step_semaphore.acquire(1)
                         cls.before_computation(computation, opcode, opcode_fn)
-                    elif cls.debug_mode == MODE_DEBUG_AUTO:
-                        sleep(cls.step_duration)
+                    elif ctx.debug_mode == MODE_DEBUG_AUTO:
+                        sleep(ctx.step_duration)
                         cls.before_computation(computation, opcode, opcode_fn)
-                    # Since we cannot really read out every storage position that has been filled, we need
-                    # to keep track of every storage slot that gets filled from the beginning of a contracts
-                    # creation. This has to be done regardless of whether the user has activated debug mode or not,
-                    # since else we might never get to see a storage variable ever again.
-                    slot = ""
-                    value = ""
+                    # the written slot is reported along with the steps, so that the GUI can record it for the
+                    # correct step. Outside of debugging the storage is enumerated from the trie instead
+                    # (see EVMHandler.iter_storage()), so nothing has to be tracked there
+                    slot = value = start = size = None
                     if opcode == SSTORE:
-                        # first param is key second param is value
-                        arr = get_stack_content(computation._stack.values, 2)
-                        slot = arr[0]
-                        value = arr[1]
+                        # first param is key second param is value, they are only formatted when they are emitted
+                        slot, value = computation._stack.values[-1], computation._stack.values[-2]
+                    elif opcode == SHA3 and ctx.preimages is not None:
+                        # offset and length of the input
+                        start, size = get_stack_ints(computation._stack.values, 2)
                     opcode_fn(computation=computation)
-                    if cls.returned:
-                        cls.init_debug_session.emit(deepcopy(computation.code), computation.opcodes, message)
-                        cls.init_lock.acquire(True)
-                        cls.returned = False
+                    if ctx.returned:
+                        ctx.flush_steps()
+                        ctx.init_debug_session.emit(computation.disassembly, computation.opcodes, message)
+                        ctx.init_lock.acquire(True)
+                        ctx.returned = False
                     if opcode == REVERT:
                         logger.info("Revert has been processed")
-                        cls.abort = True
+                        ctx.abort = True
                         raise Halt
                     elif opcode == SSTORE:
-                        cls.set_storage.emit(message.storage_address, slot, value)
-                        if cls.debug_mode:
-                            cls.storage_lock.acquire(True)
-                    if cls.debug_mode == MODE_DEBUG:
-                        cls.step_semaphore.acquire(1)
-                        cls.after_computation(computation, cls.last_consumed_gas_amount)
-                    elif cls.debug_mode == MODE_DEBUG_AUTO:
-                        sleep(cls.step_duration)
-                        cls.after_computation(computation, cls.last_consumed_gas_amount)
+                        ctx.storage_changed(message.storage_address, slot, value)
+                    elif opcode == SHA3 and ctx.preimages is not None:
+                        ctx.sha3_executed(computation, start, size)
+                    if ctx.debug_mode == MODE_DEBUG:
+                        ctx.step_semaphore.acquire(1)
+                        cls.after_computation(computation, ctx.last_consumed_gas_amount)
+                    elif ctx.debug_mode == MODE_DEBUG_AUTO:
+                        sleep(ctx.step_duration)
+                        cls.after_computation(computation, ctx.last_consumed_gas_amount)
                 except Halt:
                     # if current opcode is RETURN, opcode_fn() will throw exception before next line is reached
                     # this is to ensure that the UI gets updated in the last iteration as well
-                    if cls.debug_mode and not cls.abort:
-                        cls.returned = True
-                        cls.after_computation(computation, cls.last_consumed_gas_amount)
-                    elif cls.abort:
-                        cls.abort_transaction.emit()
+                    if ctx.debug_mode and not ctx.abort:
+                        ctx.returned = True
+                        cls.after_computation(computation, ctx.last_consumed_gas_amount)
+                    elif ctx.abort:
+                        ctx.flush_steps()
+                        ctx.abort_transaction.emit()
                     break
+        ctx.flush_steps()
         return computation
 
+    @classmethod
+    def apply_fast(cls, computation: ComputationAPI):
+        """
+        Tight interpreter loop used in MODE_NONE. It mirrors the loop of the stock IstanbulComputation, none of the
+        debugging hooks are evaluated per opcode. Storage writes and the preimages of SHA3 are only tracked if the
+        context asks for it, in which case SSTORE and SHA3 are hooked into the opcode lookup itself (see
+        _get_fast_opcodes()).
+        """
+        opcode_lookup = cls._get_fast_opcodes(computation)
+        for opcode in computation.code:
+            try:
+                opcode_fn = opcode_lookup[opcode]
+            except KeyError:
+                opcode_fn = InvalidOpcode(opcode)
+
+            try:
+                opcode_fn(computation=computation)
+            except Halt:
+                break
+
+    @classmethod
+    def apply_traced(cls, computation: ComputationAPI, tracer: Tracer):
+        """
+        Interpreter loop used in MODE_NONE if a tracer has been passed. Like apply_fast(), but the tracer is called for
+        every executed instruction.
+        """
+        opcode_lookup = cls._get_fast_opcodes(computation)
+        code = computation.code
+        tracer.start_frame(computation, computation.disassembly)
+        try:
+            for opcode in code:
+                try:
+                    opcode_fn = opcode_lookup[opcode]
+                except KeyError:
+                    opcode_fn = InvalidOpcode(opcode)
+
+                pc = code.pc - 1
+                gas = computation.get_gas_remaining()
+                try:
+                    opcode_fn(computation=computation)
+                except Halt:
+                    break
+                finally:
+                    tracer.step(computation, pc, opcode, opcode_fn, gas)
+        finally:
+            tracer.end_frame(computation)
+
+    @classmethod
+    def _get_fast_opcodes(cls, computation: ComputationAPI) -> Dict[int, Any]:
+        """
+        Returns the opcode lookup of the computation. If its context tracks storage writes or preimages, a copy of the
+        lookup is returned instead, in which SSTORE and SHA3 are replaced by wrappers that report the written slot and
+        the hashed input to the context (see ExecutionContext.storage_changed() and sha3_executed()). The copy is
+        created once and reused for every following computation.
+        """
+        opcodes = computation.opcodes
+        context = computation.context
+        if not context.track_storage and context.preimages is None:
+            return opcodes
+        if cls.fast_opcodes is None or cls.fast_opcodes[0] is not opcodes:
+            sstore_fn = opcodes[SSTORE]
+            sha3_fn = opcodes[SHA3]
+
+            def tracked_sstore(computation: ComputationAPI):
+                context = computation.context
+                if not context.track_storage:
+                    sstore_fn(computation=computation)
+                    return
+                # first param is key second param is value
+                stack = computation._stack.values
+                slot, value = stack[-1], stack[-2]
+                sstore_fn(computation=computation)
+                context.storage_changed(computation.msg.storage_address, slot, value)
+
+            def tracked_sha3(computation: ComputationAPI):
+                context = computation.context
+                if context.preimages is None:
+                    sha3_fn(computation=computation)
+                    return
+                start, size = get_stack_ints(computation._stack.values, 2)
+                sha3_fn(computation=computation)
+                context.sha3_executed(computation, start, size)
+
+            lookup = dict(opcodes)
+            for opcode, wrapper, opcode_fn in ((SSTORE, tracked_sstore, sstore_fn), (SHA3, tracked_sha3, sha3_fn)):
+                # tracers look at the mnemonic of the executed opcodes
+                wrapper.mnemonic = opcode_fn.mnemonic
+                wrapper.gas_cost = opcode_fn.gas_cost
+                lookup[opcode] = wrapper
+            cls.fast_opcodes = (opcodes, lookup)
+        return cls.fast_opcodes[1]
+
     @classmethod
     def before_computation(cls, computation: ComputationAPI, next_opcode: int, next_opcode_fn: Any):
         logger.info("Entering pre_computation with opcode {o}".format(o=next_opcode_fn.mnemonic))
-        head = ChangeChainLink(TableWidgetEnum.OPCODES, pre_computation=[computation.code.pc - 1], post_computation=[])
+        ctx = computation.context
+        row = computation.disassembly.row_of(computation.code.pc - 1)
+        head = ChangeChainLink(TableWidgetEnum.OPCODES, pre_computation=[row], post_computation=[])
         chain = ChangeChain(head)
 
         chain.add_link(stack_effects.get(next_opcode))
         stack = computation._stack.values
-        lkp = cls.storage_lookup.get(computation.msg.storage_address)
 
         # Big if construct that determines which opcode has which causer and has which effect. This could be
         # simplified a bit, however it was not possible to determine the effects statically like in stack effects,
         # since the changes in memory and storage are dependent on the varying contents of memory, stack and storage,
         # instead of the only the opcode as it is the case with the stack.
-        if next_opcode == SSTORE:
-            slot = get_stack_content(stack, 1)[0]
-            if lkp is None:
-                index = 0
+        if next_opcode == SSTORE or next_opcode == SLOAD:
+            # the slot is registered right here, the GUI learns about new slots from the deltas of the storage mirror
+            address = computation.msg.storage_address
+            slot, = get_stack_ints(stack, 1)
+            row = ctx.storage_mirror.add(address, slot, computation.state.get_storage(address, slot))
+            if next_opcode == SSTORE:
+                chain.add_link(ChangeChainLink(TableWidgetEnum.STORAGE, [], [row]))
             else:
-                index = lkp.get(slot)
-                if index is None:
-                    index = len(lkp)
-            chain.add_link(ChangeChainLink(TableWidgetEnum.STORAGE, [], [index]))
-        elif next_opcode == SLOAD:
-            slot = get_stack_content(stack, 1)[0]
-            if lkp is None or lkp.get(slot) is None:
-                cls.set_storage.emit(computation.msg.storage_address, slot, "0x00")
-                cls.storage_lock.acquire(True)
-                # refresh because the main storage should have set this in the meantime
-                lkp = cls.storage_lookup.get(computation.msg.storage_address)
-            logger.info("Trying to SLOAD storage key -> index: {k} -> {i}".format(k=slot, i=lkp.get(slot)))
-            chain.add_link(ChangeChainLink(TableWidgetEnum.STORAGE, [lkp.get(slot)], []))
+                chain.add_link(ChangeChainLink(TableWidgetEnum.STORAGE, [row], []))
         elif next_opcode == MSTORE or next_opcode == MSTORE8:
-            offset = get_stack_content(stack, 1)[0]
-            chain.add_link(
-                ChangeChainLink(TableWidgetEnum.MEMORY, [], [int(offset, 16) / 32])
-            )
+            offset, = get_stack_ints(stack, 1)
+            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, [], [offset // 32]))
         elif next_opcode == MLOAD:
-            offset = get_stack_content(stack, 1)[0]
-            chain.add_link(
-                ChangeChainLink(TableWidgetEnum.MEMORY, [int(offset, 16) / 32], [])
-            )
+            offset, = get_stack_ints(stack, 1)
+            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, [offset // 32], []))
         elif next_opcode == SHA3 or (LOG0 <= next_opcode <= LOG4) \
                 or next_opcode == RETURN or next_opcode == REVERT:
-            arr = get_stack_content(stack, 2)
-            offset = arr[0]
-            length = arr[1]
-            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY,
-                                           list(range(int(int(offset, 16) / 32), int(int(length, 16) / 32) + 1)), [])
-                           )
+            offset, length = get_stack_ints(stack, 2)
+            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, _memory_rows(offset, length), []))
         elif next_opcode == CALLDATACOPY or next_opcode == CODECOPY \
                 or next_opcode == RETURNDATACOPY:
-            arr = get_stack_content(stack, 3)
-            offset = arr[0]
-            length = arr[2]
-            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, [],
-                                           [] if "0x" == length or "0x" == offset else list(
-                                               range(int(int(offset, 16) / 32), int(int(length, 16) / 32) + 1)))
-                           )
+            offset, _, length = get_stack_ints(stack, 3)
+            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, [], _memory_rows(offset, length)))
         elif next_opcode == EXTCODECOPY:
-            arr = get_stack_content(stack, 4)
-            offset = arr[1]
-            length = arr[3]
-            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, [],
-                                           list(range(int(int(offset, 16) / 32), int(int(length, 16) / 32) + 1)))
-                           )
+            _, offset, _, length = get_stack_ints(stack, 4)
+            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, [], _memory_rows(offset, length)))
         elif next_opcode == CREATE or next_opcode == CREATE2:
-            arr = get_stack_content(stack, 3)
-            offset = arr[1]
-            length = arr[2]
-            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY,
-                                           list(range(int(int(offset, 16) / 32), int(int(length, 16) / 32) + 1)), [])
-                           )
+            _, offset, length = get_stack_ints(stack, 3)
+            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, _memory_rows(offset, length), []))
         elif next_opcode == CALL or next_opcode == CALLCODE:
-            arr = get_stack_content(stack, 7)
-            argoffset = arr[3]
-            arglength = arr[4]
-            retOffset = arr[5]
-            retLength = arr[6]
-            chain.add_link(
-                ChangeChainLink(TableWidgetEnum.MEMORY,
-                                list(range(int(int(argoffset, 16) / 32), int(int(arglength, 16) / 32) + 1)),
-                                list(range(int(int(retOffset, 16) / 32), int(int(retLength, 16) / 32) + 1)))
-            )
+            _, _, _, arg_offset, arg_length, ret_offset, ret_length = get_stack_ints(stack, 7)
+            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, _memory_rows(arg_offset, arg_length),
+                                           _memory_rows(ret_offset, ret_length)))
         elif next_opcode == DELEGATECALL or next_opcode == STATICCALL:
-            arr = get_stack_content(stack, 6)
-            argoffset = arr[2]
-            arglength = arr[3]
-            retOffset = arr[4]
-            retLength = arr[5]
-            chain.add_link(
-                ChangeChainLink(TableWidgetEnum.MEMORY,
-                                list(range(int(int(argoffset, 16) / 32), int(int(arglength, 16) / 32) + 1)),
-                                list(range(int(int(retOffset, 16) / 32), int(int(retLength, 16) / 32) + 1)))
-            )
-
-        cls.add_chain.emit(chain)
-        cls.pre_computation.emit(computation.get_gas_remaining(), computation.code.pc - 1)
-        if cls.debug_mode:
-            cls.step_lock.acquire(True)
+            _, _, arg_offset, arg_length, ret_offset, ret_length = get_stack_ints(stack, 6)
+            chain.add_link(ChangeChainLink(TableWidgetEnum.MEMORY, _memory_rows(arg_offset, arg_length),
+                                           _memory_rows(ret_offset, ret_length)))
 
-    @classmethod
-    def after_computation(cls, computation: ComputationAPI, last_gas: int):
-        cls.post_computation.emit(computation._stack.values, computation._memory._bytes, computation.code.pc, last_gas)
-        if cls.debug_mode:
-            cls.step_lock.acquire(True)
+        if ctx.debug_mode == MODE_DEBUG_AUTO:
+            ctx.step_buffer.append((STEP_PRE, chain, computation.get_gas_remaining(), computation.code.pc - 1))
+            return
+        ctx.add_chain.emit(chain)
+        ctx.pre_computation.emit(computation.get_gas_remaining(), computation.code.pc - 1)
+        if ctx.debug_mode:
+            ctx.step_lock.acquire(True)
 
     @classmethod
-    def abort_callback(cls):
-        cls.abort = True
+    def after_computation(cls, computation: ComputationAPI, last_gas: int):
+        ctx = computation.context
+        if ctx.debug_mode == MODE_DEBUG_AUTO:
+            # the buffered steps outlive the current step, so stack and memory need to be copied
+            ctx.step_buffer.append((STEP_POST, list(computation._stack.values), bytearray(computation._memory._bytes),
+                                    computation.code.pc, last_gas))
+            if monotonic() - ctx.last_flush >= STEP_FLUSH_INTERVAL:
+                ctx.flush_steps()
+            return
+        ctx.post_computation.emit(computation._stack.values, computation._memory._bytes, computation.code.pc, last_gas)
+        if ctx.debug_mode:
+            ctx.step_lock.acquire(True)
 
     def consume_gas(self, amount: int, reason: str) -> None:
         """
-        Overrides consume_gas. The only purpose is to set a static variable to the amount of gas that has been used
-        during the processing of the previous last opcode, so that we can update the GUI to represent the correct amount
-        of gas used.
+        Overrides consume_gas. The only purpose is to remember the amount of gas that has been used during the
+        processing of the previous last opcode in the context, so that we can update the GUI to represent the correct
+        amount of gas used.
         """
-        MyComputation.last_consumed_gas_amount = amount
+        self.context.last_consumed_gas_amount = amount
         return self._gas_meter.consume_gas(amount, reason)
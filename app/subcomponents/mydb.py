@@ -0,0 +1,53 @@
+import sqlite3
+from typing import Iterator, Tuple
+
+from eth.db.backends.base import BaseDB
+
+
+class MyDB(BaseDB):
+    """
+    Key value store which keeps the chain database in a local sqlite file, so that the chain survives the end of a
+    session. It is meant to be wrapped by an AtomicDB, just like the in-memory database that is used by default.
+    Writes are collected in an sqlite transaction until commit() is called.
+    """
+
+    def __init__(self, path: str):
+        # the database is created in the main thread but used by the worker threads as well
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS kv (key BLOB PRIMARY KEY, value BLOB NOT NULL) "
+                                 "WITHOUT ROWID")
+        self._connection.commit()
+
+    def __getitem__(self, key: bytes) -> bytes:
+        row = self._connection.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def __setitem__(self, key: bytes, value: bytes) -> None:
+        self._connection.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, value))
+
+    def __delitem__(self, key: bytes) -> None:
+        if self._connection.execute("DELETE FROM kv WHERE key = ?", (key,)).rowcount == 0:
+            raise KeyError(key)
+
+    def _exists(self, key: bytes) -> bool:
+        return self._connection.execute("SELECT 1 FROM kv WHERE key = ?", (key,)).fetchone() is not None
+
+    def items(self) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        :return: Every key and value of the database, including the changes that have not been committed yet.
+        """
+        return iter(self._connection.execute("SELECT key, value FROM kv").fetchall())
+
+    def commit(self):
+        """
+        Writes every change since the last commit to the file.
+        """
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
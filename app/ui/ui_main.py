@@ -100,31 +100,19 @@ class Ui_MainWindow(object):
         self.used_addresses_table_widget.verticalHeader().setVisible(False)
         self.used_addresses_table_widget.verticalHeader().setDefaultSectionSize(18)
         self.used_addresses_table_widget.verticalHeader().setSortIndicatorShown(False)
-        self.stack_table_widget = QtWidgets.QTableWidget(self.centralwidget)
-        self.stack_table_widget.setGeometry(QtCore.QRect(910, 30, 491, 361))
-        self.stack_table_widget.setGridStyle(QtCore.Qt.DotLine)
-        self.stack_table_widget.setObjectName("stack_table_widget")
-        self.stack_table_widget.setColumnCount(1)
-        self.stack_table_widget.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.stack_table_widget.setHorizontalHeaderItem(0, item)
-        self.stack_table_widget.horizontalHeader().setDefaultSectionSize(112)
-        self.stack_table_widget.horizontalHeader().setStretchLastSection(True)
-        self.stack_table_widget.verticalHeader().setVisible(False)
-        self.opcodes_table_widget = QtWidgets.QTableWidget(self.centralwidget)
-        self.opcodes_table_widget.setGeometry(QtCore.QRect(490, 260, 391, 551))
-        self.opcodes_table_widget.setGridStyle(QtCore.Qt.DotLine)
-        self.opcodes_table_widget.setObjectName("opcodes_table_widget")
-        self.opcodes_table_widget.setColumnCount(3)
-        self.opcodes_table_widget.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.opcodes_table_widget.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.opcodes_table_widget.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.opcodes_table_widget.setHorizontalHeaderItem(2, item)
-        self.opcodes_table_widget.horizontalHeader().setStretchLastSection(True)
-        self.opcodes_table_widget.verticalHeader().setVisible(False)
+        self.stack_table_view = QtWidgets.QTableView(self.centralwidget)
+        self.stack_table_view.setGeometry(QtCore.QRect(910, 30, 491, 361))
+        self.stack_table_view.setGridStyle(QtCore.Qt.DotLine)
+        self.stack_table_view.setObjectName("stack_table_view")
+        self.stack_table_view.horizontalHeader().setDefaultSectionSize(112)
+        self.stack_table_view.horizontalHeader().setStretchLastSection(True)
+        self.stack_table_view.verticalHeader().setVisible(False)
+        self.opcodes_table_view = QtWidgets.QTableView(self.centralwidget)
+        self.opcodes_table_view.setGeometry(QtCore.QRect(490, 260, 391, 521))
+        self.opcodes_table_view.setGridStyle(QtCore.Qt.DotLine)
+        self.opcodes_table_view.setObjectName("opcodes_table_view")
+        self.opcodes_table_view.horizontalHeader().setStretchLastSection(True)
+        self.opcodes_table_view.verticalHeader().setVisible(False)
         self.horizontal_line = QtWidgets.QFrame(self.centralwidget)
         self.horizontal_line.setGeometry(QtCore.QRect(20, 600, 401, 20))
         self.horizontal_line.setFrameShape(QtWidgets.QFrame.HLine)
@@ -135,30 +123,20 @@ class Ui_MainWindow(object):
         self.vertical_line.setFrameShape(QtWidgets.QFrame.VLine)
         self.vertical_line.setFrameShadow(QtWidgets.QFrame.Sunken)
         self.vertical_line.setObjectName("vertical_line")
-        self.storage_table_widget = QtWidgets.QTableWidget(self.centralwidget)
-        self.storage_table_widget.setGeometry(QtCore.QRect(40, 640, 371, 171))
-        self.storage_table_widget.setGridStyle(QtCore.Qt.DotLine)
-        self.storage_table_widget.setObjectName("storage_table_widget")
-        self.storage_table_widget.setColumnCount(2)
-        self.storage_table_widget.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.storage_table_widget.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.storage_table_widget.setHorizontalHeaderItem(1, item)
-        self.storage_table_widget.horizontalHeader().setDefaultSectionSize(112)
-        self.storage_table_widget.horizontalHeader().setStretchLastSection(True)
-        self.storage_table_widget.verticalHeader().setVisible(False)
-        self.memory_table_widget = QtWidgets.QTableWidget(self.centralwidget)
-        self.memory_table_widget.setGeometry(QtCore.QRect(910, 410, 491, 401))
-        self.memory_table_widget.setGridStyle(QtCore.Qt.DotLine)
-        self.memory_table_widget.setObjectName("memory_table_widget")
-        self.memory_table_widget.setColumnCount(1)
-        self.memory_table_widget.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.memory_table_widget.setHorizontalHeaderItem(0, item)
-        self.memory_table_widget.horizontalHeader().setDefaultSectionSize(112)
-        self.memory_table_widget.horizontalHeader().setStretchLastSection(True)
-        self.memory_table_widget.verticalHeader().setVisible(False)
+        self.storage_table_view = QtWidgets.QTableView(self.centralwidget)
+        self.storage_table_view.setGeometry(QtCore.QRect(40, 640, 371, 171))
+        self.storage_table_view.setGridStyle(QtCore.Qt.DotLine)
+        self.storage_table_view.setObjectName("storage_table_view")
+        self.storage_table_view.horizontalHeader().setDefaultSectionSize(112)
+        self.storage_table_view.horizontalHeader().setStretchLastSection(True)
+        self.storage_table_view.verticalHeader().setVisible(False)
+        self.memory_table_view = QtWidgets.QTableView(self.centralwidget)
+        self.memory_table_view.setGeometry(QtCore.QRect(910, 410, 491, 401))
+        self.memory_table_view.setGridStyle(QtCore.Qt.DotLine)
+        self.memory_table_view.setObjectName("memory_table_view")
+        self.memory_table_view.horizontalHeader().setDefaultSectionSize(112)
+        self.memory_table_view.horizontalHeader().setStretchLastSection(True)
+        self.memory_table_view.verticalHeader().setVisible(False)
         self.message_groupbox = QtWidgets.QGroupBox(self.centralwidget)
         self.message_groupbox.setGeometry(QtCore.QRect(490, 10, 391, 161))
         self.message_groupbox.setObjectName("message_groupbox")
@@ -250,6 +228,14 @@ class Ui_MainWindow(object):
         self.storage_address_label.setGeometry(QtCore.QRect(40, 620, 371, 16))
         self.storage_address_label.setText("")
         self.storage_address_label.setObjectName("storage_address_label")
+        self.history_label = QtWidgets.QLabel(self.centralwidget)
+        self.history_label.setGeometry(QtCore.QRect(490, 790, 111, 16))
+        self.history_label.setObjectName("history_label")
+        self.history_slider = QtWidgets.QSlider(self.centralwidget)
+        self.history_slider.setGeometry(QtCore.QRect(600, 787, 281, 22))
+        self.history_slider.setMaximum(0)
+        self.history_slider.setOrientation(QtCore.Qt.Horizontal)
+        self.history_slider.setObjectName("history_slider")
         MainWindow.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(MainWindow)
         self.menubar.setGeometry(QtCore.QRect(0, 0, 1440, 22))
@@ -258,6 +244,8 @@ class Ui_MainWindow(object):
         self.menuImport.setObjectName("menuImport")
         self.menuNew = QtWidgets.QMenu(self.menubar)
         self.menuNew.setObjectName("menuNew")
+        self.menuTrace = QtWidgets.QMenu(self.menubar)
+        self.menuTrace.setObjectName("menuTrace")
         MainWindow.setMenuBar(self.menubar)
         self.statusBar = QtWidgets.QStatusBar(MainWindow)
         self.statusBar.setObjectName("statusBar")
@@ -272,6 +260,8 @@ class Ui_MainWindow(object):
         self.actionAddress_Balance.setObjectName("actionAddress_Balance")
         self.actionStorage = QtWidgets.QAction(MainWindow)
         self.actionStorage.setObjectName("actionStorage")
+        self.actionOpen_Trace = QtWidgets.QAction(MainWindow)
+        self.actionOpen_Trace.setObjectName("actionOpen_Trace")
         self.actionEVM_Simulator_Help = QtWidgets.QAction(MainWindow)
         self.actionEVM_Simulator_Help.setObjectName("actionEVM_Simulator_Help")
         self.menuImport.addAction(self.actionSet_Gas_Price)
@@ -279,8 +269,10 @@ class Ui_MainWindow(object):
         self.menuImport.addAction(self.actionAddress_Balance)
         self.menuImport.addAction(self.actionStorage)
         self.menuNew.addAction(self.actionContract)
+        self.menuTrace.addAction(self.actionOpen_Trace)
         self.menubar.addAction(self.menuNew.menuAction())
         self.menubar.addAction(self.menuImport.menuAction())
+        self.menubar.addAction(self.menuTrace.menuAction())
 
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
@@ -304,20 +296,6 @@ class Ui_MainWindow(object):
         item.setText(_translate("MainWindow", "Balance"))
         item = self.used_addresses_table_widget.horizontalHeaderItem(2)
         item.setText(_translate("MainWindow", "Type"))
-        item = self.stack_table_widget.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Stack (256 Bit-Length Words)"))
-        item = self.opcodes_table_widget.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Opcodes"))
-        item = self.opcodes_table_widget.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Mnemonic"))
-        item = self.opcodes_table_widget.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Gas Cost"))
-        item = self.storage_table_widget.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Storage Slot"))
-        item = self.storage_table_widget.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Storage Value"))
-        item = self.memory_table_widget.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Memory"))
         self.message_groupbox.setTitle(_translate("MainWindow", "Message"))
         self.origin_label.setText(_translate("MainWindow", "origin: "))
         self.from_label.setText(_translate("MainWindow", "from: "))
@@ -332,8 +310,11 @@ class Ui_MainWindow(object):
         self.steps_line_edit.setText(_translate("MainWindow", "1"))
         self.steps_line_edit.setPlaceholderText(_translate("MainWindow", "1"))
         self.steps_button.setText(_translate("MainWindow", "Step(s)"))
+        self.history_label.setText(_translate("MainWindow", "Step: 0/0"))
+        self.history_slider.setToolTip(_translate("MainWindow", "Scrub through the steps of the last debugged transaction"))
         self.menuImport.setTitle(_translate("MainWindow", "Set"))
         self.menuNew.setTitle(_translate("MainWindow", "New"))
+        self.menuTrace.setTitle(_translate("MainWindow", "Trace"))
         self.actionSet_Gas_Price.setText(_translate("MainWindow", "Gas Price"))
         self.actionSet_Gas_Price.setShortcut(_translate("MainWindow", "Ctrl+P"))
         self.actionSet_Gas_Limit.setText(_translate("MainWindow", "Gas Limit"))
@@ -344,6 +325,8 @@ class Ui_MainWindow(object):
         self.actionAddress_Balance.setShortcut(_translate("MainWindow", "Ctrl+A"))
         self.actionStorage.setText(_translate("MainWindow", "Storage"))
         self.actionStorage.setShortcut(_translate("MainWindow", "Ctrl+S"))
+        self.actionOpen_Trace.setText(_translate("MainWindow", "Open Trace"))
+        self.actionOpen_Trace.setShortcut(_translate("MainWindow", "Ctrl+O"))
         self.actionEVM_Simulator_Help.setText(_translate("MainWindow", "EVM Simulator Help"))
         self.actionEVM_Simulator_Help.setShortcut(_translate("MainWindow", "Ctrl+H"))
 
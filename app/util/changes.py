@@ -1,12 +1,28 @@
 import logging
+from array import array
+from bisect import bisect_right
 from enum import Enum
-from typing import Dict
+from collections import namedtuple
+from typing import Callable, Dict
 
-from eth.abc import CodeStreamAPI, OpcodeAPI, MessageAPI
+from eth.abc import OpcodeAPI, MessageAPI
+
+from app.util.disassembly import Disassembly
 
 logger = logging.getLogger(__name__)
 
 
+# kinds of the step records that are sent to the GUI in batches, see ExecutionContext.flush_steps()
+STEP_PRE = 0  # (STEP_PRE, change chain, remaining gas, pc)
+STEP_POST = 1  # (STEP_POST, stack, memory, pc, last used gas)
+STEP_STORAGE = 2  # (STEP_STORAGE, address, slot, value), a storage slot has been written during the current step
+
+# the History stores a copy of the stack before every n-th step
+STACK_CHECKPOINT_INTERVAL = 1024
+# minimal number of bytes written to memory between two copies of the memory stored by the History
+MIN_MEMORY_CHECKPOINT_DISTANCE = 64 * 1024
+
+
 class TableWidgetEnum(Enum):
     OPCODES = 0
     STACK = 1
@@ -59,55 +75,267 @@ class ChangeChain:
             return a
 
 
+# everything the History knows about a step, see History.seek()
+HistoryStep = namedtuple("HistoryStep", ["step", "disassembly", "opcodes", "message", "change_chain", "gas_remaining",
+                                         "pc", "used_gas", "stack", "memory", "storage"])
+
+
 class History:
     """
         History class used to keep track of every change that happens in each step of a transaction. This is necessary
         to provide means to "scroll back" a transaction.
+
+        Instead of a copy of the stack and memory per step, only the changes are kept: pc and gas in typed arrays, the
+        number of popped and the pushed values of the stack, and the changed region of the memory. Full copies of the
+        memory are only stored as checkpoints once about as many bytes have been written as the memory is large, so
+        that get_memory() never has to replay more than that. Storage changes are kept per step.
     """
-    def __init__(self):
+
+    def __init__(self, initial_storage: Callable[[bytes, str], str] = None):
+        """
+        :param initial_storage: Returns the value a storage slot had before the transaction, given the address and the
+        slot. It is used for the first change of every slot, without it the previous value of those changes is None.
+        """
+        self.initial_storage = initial_storage
+        # (disassembly, opcodes, message) of every call frame that was entered and the step at which it was entered
+        self.inits: [(Disassembly, Dict[int, OpcodeAPI], MessageAPI)] = []
+        self.init_steps = array("I")
         self.change_chains: [ChangeChain] = []
-        self.init: (CodeStreamAPI, Dict[int, OpcodeAPI], MessageAPI) = ()
-        self.pre_computations: [(int, int)] = []
-        self.post_computations: [()] = []
-        self.storage: [(str, str)] = []
-        self.history_pointer: int = 0
+        self.gas_remaining = array("Q")
+        self.pcs = array("I")
+        self.post_pcs = array("I")
+        self.used_gas = array("Q")
+        # per step the number of values popped from the stack and the index of its first value in stack_pushed
+        self.stack_pops = array("I")
+        self.stack_push_starts = array("I")
+        self.stack_pushed: [tuple] = []
+        # the stack before every STACK_CHECKPOINT_INTERVAL-th step
+        self.stack_checkpoints: [tuple] = []
+        # steps that changed the memory, start and data of the changed region and the size of the memory afterwards
+        self.memory_steps = array("I")
+        self.memory_starts = array("I")
+        self.memory_sizes = array("I")
+        self.memory_data: [bytes] = []
+        # steps after which a copy of the memory was stored in memory_checkpoints
+        self.memory_checkpoint_steps = array("I")
+        self.memory_checkpoints: [bytes] = []
+        # step -> [(address, slot, previous value, value)], the previous value is None if the slot was not known before
+        self.storage: Dict[int, list] = {}
 
-    def get_init(self) -> (CodeStreamAPI, Dict[int, OpcodeAPI], MessageAPI):
-        return self.init
+        # steps whose post computation has not been received yet
+        self._open_steps: [int] = []
+        # state after the last recorded step
+        self._stack: [tuple] = []
+        self._memory = b''
+        self._memory_written = 0
+        # (address, slot) -> (steps that changed the slot, values after these steps, value before the first step)
+        self._storage: Dict[tuple, (array, [str], str)] = {}
+        # step, stack and memory of the last seek(), see seek()
+        self._cursor: (int, [tuple], bytes) = None
 
-    def set_init(self, code: CodeStreamAPI, opcodes: Dict[int, OpcodeAPI], msg: MessageAPI):
-        if self.init != ():
-            logger.warning("Setting init value that has already been set", code, opcodes, msg)
-        self.init = (code, opcodes, msg)
+    def __len__(self) -> int:
+        return len(self.pcs)
 
-    def add_link(self, chain: ChangeChain):
+    def add_init(self, disassembly: Disassembly, opcodes: Dict[int, OpcodeAPI], msg: MessageAPI):
+        """
+        Records that a call frame has been entered (or re-entered) before the next step.
+        """
+        self.inits.append((disassembly, opcodes, msg))
+        self.init_steps.append(len(self.pcs))
+
+    def add_pre_computation(self, chain: ChangeChain, gas_remaining: int, pc: int):
+        """
+        Starts a new step.
+        """
+        if len(self.pcs) % STACK_CHECKPOINT_INTERVAL == 0:
+            self.stack_checkpoints.append(tuple(self._stack))
         self.change_chains.append(chain)
+        self.gas_remaining.append(gas_remaining)
+        self.pcs.append(pc)
+        self.post_pcs.append(pc)
+        self.used_gas.append(0)
+        self.stack_pops.append(0)
+        self.stack_push_starts.append(len(self.stack_pushed))
+        self._open_steps.append(len(self.pcs) - 1)
 
-    def add_pre_computation(self, gas_left: int, pc: int):
-        self.pre_computations.append((gas_left, pc))
+    def add_post_computation(self, stack: [tuple], memory: bytearray, pc: int, used_gas: int):
+        """
+        Completes the current step with the state after its computation. Only the differences to the state after the
+        previous step are stored.
 
-    def add_post_computation(self, stack, memory, pc, used_gas):
-        self.post_computations.append((stack, memory, pc))
-        self.history_pointer = self.history_pointer + 1
-        pass
+        The post computation of a CALL (or CREATE) is only received after all the steps of the called frame. In this
+        case it is recorded as a new step that repeats the pre computation of the CALL.
+        """
+        step = len(self.pcs) - 1
+        if self._open_steps and self._open_steps[-1] == step:
+            self._open_steps.pop()
+        else:
+            caller = step
+            while self._open_steps:
+                # steps of frames that ended with an error never receive their post computation
+                s = self._open_steps.pop()
+                if self.pcs[s] + 1 == pc:
+                    caller = s
+                    break
+            self.add_pre_computation(self.change_chains[caller], self.gas_remaining[caller], self.pcs[caller])
+            self._open_steps.pop()
+            step += 1
+        self.post_pcs[step] = pc
+        self.used_gas[step] = used_gas
 
-    def add_storage(self, slot: str, value: str):
-        """ Since there may be steps in which the storage does not change, we are adding None values to keep the indices
-        lined up with the other arrays. This might cause some overhead."""
-        while len(self.storage) <= self.history_pointer:
-            self.storage.append(None)
-        self.storage.append((slot, value))
+        old = self._stack
+        common = min(len(old), len(stack))
+        # instructions only touch the top of the stack, so the common part is found after a few tries
+        while old[:common] != stack[:common]:
+            common -= 1
+        self.stack_pops[step] = len(old) - common
+        self.stack_pushed.extend(stack[common:])
+        self._stack = list(stack)
 
-    def __iter__(self):
-        self.history_pointer = 0
-        return self
+        if len(memory) != len(self._memory) or memory != self._memory:
+            memory = bytes(memory)
+            start, data = memory_delta(self._memory, memory)
+            self.memory_steps.append(step)
+            self.memory_starts.append(start)
+            self.memory_sizes.append(len(memory))
+            self.memory_data.append(data)
+            self._memory = memory
+            self._memory_written += len(data)
+            if self._memory_written >= max(len(memory), MIN_MEMORY_CHECKPOINT_DISTANCE):
+                self.memory_checkpoint_steps.append(step)
+                self.memory_checkpoints.append(memory)
+                self._memory_written = 0
 
-    def __next__(self):
-        if self.history_pointer == len(self.pre_computations):
-            raise StopIteration
+    def add_storage(self, addr: bytes, slot: str, value: str):
+        """
+        Records that a storage slot has been set during the current step.
+        """
+        step = max(len(self.pcs) - 1, 0)
+        changes = self._storage.get((addr, slot))
+        if changes is None:
+            changes = (array("I"), [], None if self.initial_storage is None else self.initial_storage(addr, slot))
+            self._storage[(addr, slot)] = changes
+        steps, values, previous = changes
+        if values:
+            previous = values[-1]
+        self.storage.setdefault(step, []).append((addr, slot, previous, value))
+        steps.append(step)
+        values.append(value)
+
+    def get_init(self, step: int) -> (Disassembly, Dict[int, OpcodeAPI], MessageAPI):
+        """
+        :return: Disassembly, opcodes and message of the call frame that executes the given step.
+        """
+        i = bisect_right(self.init_steps, step) - 1
+        return self.inits[i] if i >= 0 else None
+
+    def get_stack(self, step: int) -> [tuple]:
+        """
+        :return: The stack after the given step.
+        """
+        checkpoint = step // STACK_CHECKPOINT_INTERVAL
+        stack = list(self.stack_checkpoints[checkpoint])
+        self._replay_stack(stack, checkpoint * STACK_CHECKPOINT_INTERVAL, step)
+        return stack
+
+    def get_memory(self, step: int) -> bytes:
+        """
+        :return: The memory after the given step.
+        """
+        i = bisect_right(self.memory_checkpoint_steps, step) - 1
+        if i >= 0:
+            return self._replay_memory(self.memory_checkpoints[i], self.memory_checkpoint_steps[i], step)
+        return self._replay_memory(b'', -1, step)
+
+    def get_storage(self, step: int) -> Dict[tuple, str]:
+        """
+        :return: (address, slot) -> value after the given step, for every slot that is changed during the transaction.
+        """
+        storage = {}
+        for key, (steps, values, previous) in self._storage.items():
+            i = bisect_right(steps, step) - 1
+            storage[key] = values[i] if i >= 0 else previous
+        return storage
+
+    def seek(self, step: int) -> HistoryStep:
+        """
+        Restores everything that is known about the given step. Seeking forward from the previously sought step only
+        replays the deltas in between, seeking backwards or far ahead starts over from the closest checkpoints. Thus
+        moving through the steps one by one takes amortized constant time.
+
+        :return: The step and the state after its computation.
+        """
+        if not 0 <= step < len(self.pcs):
+            raise IndexError("step {s} has not been recorded".format(s=step))
+        if self._cursor is not None and self._cursor[0] <= step < self._cursor[0] + STACK_CHECKPOINT_INTERVAL:
+            last, stack, memory = self._cursor
+            stack = list(stack)
+            self._replay_stack(stack, last + 1, step)
+            memory = self._replay_memory(memory, last, step)
         else:
-            ptr = self.history_pointer
-            res = (self.init, self.change_chains[ptr], self.pre_computations[ptr], self.post_computations[ptr],
-                   self.storage[ptr])
-            self.history_pointer = self.history_pointer + 1
-            return res
+            stack = self.get_stack(step)
+            memory = self.get_memory(step)
+        self._cursor = (step, stack, memory)
+        disassembly, opcodes, message = self.get_init(step) or (None, None, None)
+        return HistoryStep(step, disassembly, opcodes, message, self.change_chains[step], self.gas_remaining[step],
+                           self.pcs[step], self.used_gas[step], list(stack), memory, self.get_storage(step))
+
+    def _replay_stack(self, stack: [tuple], first: int, last: int):
+        """
+        Applies the stack changes of the steps first to last (inclusive) to the given stack.
+        """
+        for s in range(first, last + 1):
+            pops = self.stack_pops[s]
+            if pops:
+                del stack[-pops:]
+            end = self.stack_push_starts[s + 1] if s + 1 < len(self.pcs) else len(self.stack_pushed)
+            stack.extend(self.stack_pushed[self.stack_push_starts[s]:end])
+
+    def _replay_memory(self, memory: bytes, after: int, last: int) -> bytes:
+        """
+        :return: The given memory after step `after` with the memory changes up to step `last` applied.
+        """
+        for d in range(bisect_right(self.memory_steps, after), bisect_right(self.memory_steps, last)):
+            memory = apply_memory_delta(memory, self.memory_starts[d], self.memory_data[d], self.memory_sizes[d])
+        return memory
+
+    def get_storage_changes(self, step: int) -> [(bytes, str, str, str)]:
+        """
+        :return: The storage changes of the given step as (address, slot, previous value, value).
+        """
+        return self.storage.get(step, [])
+
+
+def memory_delta(old: bytes, new: bytes) -> (int, bytes):
+    """
+    :return: Start and data of the region that has to be replaced in old to get new, see apply_memory_delta(). If the
+    size of the memory changed, the region reaches to the end of the new memory.
+    """
+    n = min(len(old), len(new))
+    start = n
+    if old[:n] != new[:n]:
+        # old[:lo] == new[:lo] and old[:hi] != new[:hi], only the not yet compared part is compared in every iteration
+        lo, hi = 0, n
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if old[lo:mid] == new[lo:mid]:
+                lo = mid
+            else:
+                hi = mid
+        start = lo
+    end = len(new)
+    if len(old) == len(new) and start < end:
+        # old[hi:] == new[hi:] and old[lo:] != new[lo:]
+        lo, hi = start, end
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if old[mid:hi] == new[mid:hi]:
+                hi = mid
+            else:
+                lo = mid
+        end = hi
+    return start, new[start:end]
+
+
+def apply_memory_delta(memory: bytes, start: int, data: bytes, size: int) -> bytes:
+    return memory[:start] + data + memory[start + len(data):size]
@@ -0,0 +1,147 @@
+import json
+import logging
+from array import array
+from collections import namedtuple
+from typing import Any, Dict, IO
+
+from eth.abc import ComputationAPI
+from eth.vm.opcode_values import JUMPI
+
+from app.util.disassembly import Disassembly
+from app.util.tracer import Tracer
+
+logger = logging.getLogger(__name__)
+
+# counters of a basic block of a contract. start and end are the pcs of its first and last instruction, gas is exclusive
+# (see Profiler), taken and fallthrough count how often the JUMPI that ends the block jumped or did not jump
+BlockEntry = namedtuple("BlockEntry", ["address", "start", "end", "hits", "gas", "taken", "fallthrough"])
+
+
+class ContractCoverage:
+    """
+    Counters of the basic blocks (see Disassembly.block_starts) of one contract.
+    """
+
+    def __init__(self, address: str, disassembly: Disassembly):
+        """
+        :param address: The address of the contract, as hex string.
+        :param disassembly: The disassembly of the code of the contract.
+        """
+        self.address = address
+        self.disassembly = disassembly
+        n = len(disassembly.block_starts)
+        self.hits = array("Q", bytes(8 * n))
+        self.gas = array("Q", bytes(8 * n))
+        self.taken = array("Q", bytes(8 * n))
+        self.fallthrough = array("Q", bytes(8 * n))
+
+    def merge(self, other: "ContractCoverage"):
+        """
+        Adds the counters of the same contract from another run.
+        """
+        for mine, theirs in ((self.hits, other.hits), (self.gas, other.gas), (self.taken, other.taken),
+                             (self.fallthrough, other.fallthrough)):
+            for i, v in enumerate(theirs):
+                mine[i] += v
+
+    def coverage(self) -> float:
+        """
+        :return: The share of the blocks that have been executed at least once.
+        """
+        return sum(1 for h in self.hits if h) / len(self.hits)
+
+    def blocks(self) -> [BlockEntry]:
+        """
+        :return: The counters of every block, in the order of the code.
+        """
+        starts = self.disassembly.block_starts
+        instructions = self.disassembly.instructions
+        entries = []
+        for b, start in enumerate(starts):
+            # the last instruction of the block is the one before the first instruction of the next block
+            end = instructions[self.disassembly.rows[starts[b + 1]] - 1][0] if b + 1 < len(starts) else \
+                instructions[-1][0]
+            entries.append(BlockEntry(self.address, start, end, self.hits[b], self.gas[b], self.taken[b],
+                                      self.fallthrough[b]))
+        return entries
+
+
+class BlockCoverage(Tracer):
+    """
+    Tracer that counts hits, gas and taken branches per basic block, for every contract whose code is executed. A single
+    instance can be used for many transactions (e.g. a batch run, see EVMHandler.execute_batch()) to aggregate them,
+    instances of separate runs can be combined with merge().
+    """
+
+    def __init__(self):
+        # address of the executed code -> counters
+        self.contracts: Dict[str, ContractCoverage] = {}
+        # [counters, gas of the frames called since the last step] per call frame that is currently executed
+        self._frames: [list] = []
+
+    def start_frame(self, computation: ComputationAPI, disassembly: Disassembly):
+        address = "0x" + computation.msg.code_address.hex()
+        contract = self.contracts.get(address)
+        if contract is None or contract.disassembly.code != disassembly.code:
+            if contract is not None:
+                logger.warning("The code at {a} changed, its block counters start over".format(a=address))
+            contract = ContractCoverage(address, disassembly)
+            self.contracts[address] = contract
+        self._frames.append([contract, 0])
+
+    def step(self, computation: ComputationAPI, pc: int, opcode: int, opcode_fn: Any, gas: int):
+        frame = self._frames[-1]
+        contract = frame[0]
+        block = contract.disassembly.blocks[pc]
+        if pc == contract.disassembly.block_starts[block]:
+            contract.hits[block] += 1
+        contract.gas[block] += gas - computation.get_gas_remaining() - frame[1]
+        frame[1] = 0
+        if opcode == JUMPI:
+            if computation.code.pc != pc + 1:
+                contract.taken[block] += 1
+            else:
+                contract.fallthrough[block] += 1
+
+    def end_frame(self, computation: ComputationAPI):
+        self._frames.pop()
+        if self._frames:
+            self._frames[-1][1] += computation.msg.gas - computation.get_gas_remaining()
+
+    def merge(self, other: "BlockCoverage"):
+        """
+        Adds the counters of another run.
+        """
+        for address, theirs in other.contracts.items():
+            mine = self.contracts.get(address)
+            if mine is None or mine.disassembly.code != theirs.disassembly.code:
+                self.contracts[address] = theirs
+            else:
+                mine.merge(theirs)
+
+    def report(self, limit: int = 10) -> str:
+        """
+        :param limit: The maximal number of blocks per contract.
+        :return: Per contract its coverage and a table of its most expensive (by gas) blocks.
+        """
+        lines = []
+        for address, contract in sorted(self.contracts.items()):
+            blocks = contract.blocks()
+            total = sum(b.gas for b in blocks) or 1
+            lines.append("{a}: {c:.1%} of {n} blocks covered".format(a=address, c=contract.coverage(), n=len(blocks)))
+            lines.append("{:>12} {:>10} {:>12} {:>7} {:>9}".format("Block", "Hits", "Gas", "Gas %", "Taken %"))
+            for b in sorted(blocks, key=lambda b: -b.gas)[:limit]:
+                branches = b.taken + b.fallthrough
+                lines.append("{:>12} {:>10} {:>12} {:>7.1%} {:>9}".format(
+                    "{s}-{e}".format(s=b.start, e=b.end), b.hits, b.gas, b.gas / total,
+                    "{:.1%}".format(b.taken / branches) if branches else "-"))
+            lines.append("")
+        return "\n".join(lines)
+
+    def write_json(self, file: IO[str]):
+        """
+        Writes the counters of every block of every contract as JSON object, keyed by the address of the contract.
+        """
+        json.dump({address: {"coverage": contract.coverage(),
+                             "blocks": [b._asdict() for b in contract.blocks()]}
+                   for address, contract in self.contracts.items()}, file, indent=1)
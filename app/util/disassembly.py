@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict
+
+from eth.vm.opcode_values import PUSH1, PUSH32, JUMPDEST, STOP, JUMP, JUMPI, RETURN, REVERT, SELFDESTRUCT
+from sha3 import keccak_256
+
+# the designated invalid instruction, py-evm has no name for it
+INVALID = 0xfe
+# instructions after which a basic block ends
+BLOCK_ENDS = {JUMP, JUMPI, STOP, RETURN, REVERT, INVALID, SELFDESTRUCT}
+# maximum number of disassemblies that are kept by get_disassembly(), the least recently used are dropped first
+DISASSEMBLY_CACHE_SIZE = 256
+
+
+class Disassembly:
+    """
+    Disassembly of the code of a contract. It is computed once per code hash (see get_disassembly()) and shared by
+    every call frame that executes the code, as well as by the GUI which shows it.
+    """
+
+    def __init__(self, code: bytes):
+        """
+        :param code: The bytecode to disassemble.
+        """
+        self.code = code
+        # (pc, opcode, push data) per instruction, followed by the implicit STOP that is executed when the pc runs past
+        # the end of the code
+        self.instructions: [(int, int, bytes)] = []
+        # row of the instruction in self.instructions per byte of the code, push data belongs to the row of its PUSH
+        self.rows: [int] = []
+        # positions of the instructions and of the push data, in the form of CodeStream.valid_positions and
+        # CodeStream.invalid_positions
+        self.valid_positions = set()
+        self.invalid_positions = set()
+        # positions of the JUMPDESTs that are no push data, i.e. the valid destinations of JUMP and JUMPI
+        self.jumpdests = set()
+        # basic blocks, which start at a JUMPDEST or after an instruction in BLOCK_ENDS: the pc of the first instruction
+        # per block and the block per byte of the code, in the form of self.rows
+        self.block_starts: [int] = []
+        self.blocks: [int] = []
+
+        pc = 0
+        length = len(code)
+        while pc < length:
+            opcode = code[pc]
+            size = opcode - PUSH1 + 1 if PUSH1 <= opcode <= PUSH32 else 0
+            row = len(self.instructions)
+            self.instructions.append((pc, opcode, code[pc + 1:pc + 1 + size]))
+            self.valid_positions.add(pc)
+            if opcode == JUMPDEST:
+                self.jumpdests.add(pc)
+            self.rows.append(row)
+            for data_pc in range(pc + 1, min(pc + 1 + size, length)):
+                self.invalid_positions.add(data_pc)
+                self.rows.append(row)
+            pc += 1 + size
+        self.rows.append(len(self.instructions))
+        self.instructions.append((length, STOP, b''))
+
+        block_of_row = []
+        ended = True
+        for pc, opcode, _ in self.instructions:
+            if ended or opcode == JUMPDEST:
+                self.block_starts.append(pc)
+            block_of_row.append(len(self.block_starts) - 1)
+            ended = opcode in BLOCK_ENDS
+        self.blocks = [block_of_row[row] for row in self.rows]
+
+    def row_of(self, pc: int) -> int:
+        """
+        :return: The row of the instruction at the given pc. Positions past the end of the code belong to the implicit
+        STOP.
+        """
+        return self.rows[pc] if 0 <= pc < len(self.rows) else len(self.instructions) - 1
+
+
+_disassemblies_lock = Lock()
+# code hash -> disassembly, in the order of their last use
+_disassemblies: Dict[bytes, Disassembly] = OrderedDict()
+
+
+def get_disassembly(code: bytes) -> Disassembly:
+    """
+    :param code: The bytecode of a contract.
+    :return: The cached Disassembly of the code. It is computed if the code has not been requested recently, at most
+    DISASSEMBLY_CACHE_SIZE disassemblies are kept.
+    """
+    code_hash = keccak_256(code).digest()
+    with _disassemblies_lock:
+        disassembly = _disassemblies.get(code_hash)
+        if disassembly is not None:
+            _disassemblies.move_to_end(code_hash)
+            return disassembly
+    disassembly = Disassembly(code)
+    with _disassemblies_lock:
+        _disassemblies[code_hash] = disassembly
+        while len(_disassemblies) > DISASSEMBLY_CACHE_SIZE:
+            _disassemblies.popitem(last=False)
+    return disassembly
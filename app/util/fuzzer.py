@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import zlib
+from collections import namedtuple
+from random import Random
+from time import monotonic
+from typing import Any, Dict
+
+from eth.abc import ComputationAPI
+from eth_typing import Address
+
+from app.evmhandler import EVMHandler, MASTER_ADDRESS
+from app.util.disassembly import Disassembly, BLOCK_ENDS
+from app.util.tracer import Tracer
+from app.util.util import MyContract, RAW_DATA_SIGNATURE, get_function_encoder
+
+logger = logging.getLogger(__name__)
+
+# size of the edge map, a power of two
+MAP_SIZE = 1 << 16
+# gas available to a single execution, so that inputs which loop (nearly) forever are cut short
+FUZZ_GAS = 10000000
+
+# hit counts are put into buckets like AFL does, so that a loop that runs more often only counts as new coverage once
+# its count reaches a new power of two
+_BUCKETS = bytes([0, 1, 2, 4] + [8] * 4 + [16] * 8 + [32] * 16 + [64] * 96 + [128] * 128)
+
+# an input that has been saved, error is None if it did not fail
+FuzzInput = namedtuple("FuzzInput", ["data", "value", "error"])
+FuzzStats = namedtuple("FuzzStats", ["executions", "seconds", "corpus", "reverts", "edges"])
+
+
+class EdgeCoverage(Tracer):
+    """
+    Tracer that counts the edges of the control flow of an execution in a hash map of MAP_SIZE entries: every jump,
+    every branch that is not taken, every halt and every call frame that is entered. An edge is identified by the code
+    it belongs to and by the pcs it connects.
+    """
+
+    def __init__(self):
+        # index in the map -> number of hits during the current execution
+        self.counts: Dict[int, int] = {}
+        # code -> salt of its edges
+        self._salts: Dict[bytes, int] = {}
+        self._frames: [int] = []
+
+    def reset(self):
+        self.counts = {}
+
+    def start_frame(self, computation: ComputationAPI, disassembly: Disassembly):
+        salt = self._salts.get(disassembly.code)
+        if salt is None:
+            salt = zlib.crc32(disassembly.code)
+            self._salts[disassembly.code] = salt
+        self._frames.append(salt)
+        self._hit(salt, 0, 0)
+
+    def step(self, computation: ComputationAPI, pc: int, opcode: int, opcode_fn: Any, gas: int):
+        if opcode in BLOCK_ENDS:
+            self._hit(self._frames[-1], pc, computation.code.pc)
+
+    def end_frame(self, computation: ComputationAPI):
+        self._frames.pop()
+
+    def _hit(self, salt: int, pc: int, destination: int):
+        index = ((salt ^ (pc << 16) ^ destination) * 2654435761 >> 16) & (MAP_SIZE - 1)
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+
+class Fuzzer:
+    """
+    Coverage guided fuzzer for the functions of a contract. Inputs are generated from the types of the ABI or mutated
+    from inputs that found new edges before (the corpus). Every input is executed with EVMHandler.execute_raw() against
+    the current state, so the state never changes while fuzzing. Inputs that find new edges are added to the corpus,
+    inputs that fail are saved in reverts, once per distinct path.
+    """
+
+    def __init__(self, evm_handler: EVMHandler, contract: MyContract, seed: int = None, gas: int = FUZZ_GAS,
+                 addresses: [Address] = None):
+        """
+        :param evm_handler: The handler whose state the inputs are executed against.
+        :param contract: The contract to fuzz, it has to be deployed already.
+        :param seed: Seed of the random inputs, random by default.
+        :param gas: Gas available to each execution.
+        :param addresses: Addresses that are used as values of address params, in addition to the master address, the
+        address of the contract and the zero address.
+        """
+        self.evm_handler = evm_handler
+        self.address = contract.get_typed_address()
+        self.gas = gas
+        self.rng = Random(seed)
+        self.addresses = [MASTER_ADDRESS, self.address, Address(bytes(20))] + list(addresses or [])
+        # (encoder, payable) per function that can be fuzzed
+        self.functions = []
+        for func, signature in zip(contract.functions, contract.signatures):
+            if signature == RAW_DATA_SIGNATURE:
+                continue
+            try:
+                encoder = get_function_encoder(signature)
+                encoder.encode_values([self.random_param(t) for t in encoder.types])
+            except (ValueError, TypeError) as e:
+                logger.info("Cannot fuzz {s}: {e}".format(s=signature, e=e))
+                continue
+            payable = getattr(func, "stateMutability", None) == "payable" or getattr(func, "payable", False)
+            self.functions.append((encoder, payable))
+
+        self.corpus: [FuzzInput] = []
+        self.reverts: [FuzzInput] = []
+        self.executions = 0
+        # per entry of the edge map the buckets of the hit counts that have been seen
+        self.virgin = bytearray(MAP_SIZE)
+        self.edges = EdgeCoverage()
+        # paths of the saved reverts
+        self._revert_paths = set()
+
+    def run(self, executions: int = None, duration: float = None) -> FuzzStats:
+        """
+        Fuzzes until the given number of executions or the given time in seconds is reached, whichever comes first.
+        """
+        if executions is None and duration is None:
+            raise ValueError("Either executions or duration has to be given")
+        start = monotonic()
+        n = 0
+        while (executions is None or n < executions) and (duration is None or monotonic() - start < duration):
+            data, value = self.next_input()
+            self.execute(data, value)
+            n += 1
+        return FuzzStats(n, monotonic() - start, len(self.corpus), len(self.reverts),
+                         sum(1 for b in self.virgin if b))
+
+    def execute(self, data: bytes, value: int = 0) -> (ComputationAPI, bool):
+        """
+        Executes an input and saves it if it finds new edges or fails on a new path.
+
+        :return: The computation and whether the input found new edges.
+        """
+        self.edges.reset()
+        computation = self.evm_handler.execute_raw(self.address, data, value, self.gas, tracer=self.edges)
+        self.executions += 1
+        new = False
+        virgin = self.virgin
+        for index, count in self.edges.counts.items():
+            bucket = _BUCKETS[min(count, 255)]
+            if not virgin[index] & bucket:
+                virgin[index] |= bucket
+                new = True
+        error = repr(computation.error) if computation.is_error else None
+        if new:
+            self.corpus.append(FuzzInput(data, value, error))
+        if error is not None:
+            path = frozenset(self.edges.counts)
+            if path not in self._revert_paths:
+                self._revert_paths.add(path)
+                self.reverts.append(FuzzInput(data, value, error))
+        return computation, new
+
+    def next_input(self) -> (bytes, int):
+        """
+        :return: Data and value of the next input, either a mutated input of the corpus or a newly generated one.
+        """
+        if self.corpus and self.rng.random() < 0.75:
+            entry = self.rng.choice(self.corpus)
+            return self.mutate(entry.data), entry.value if self.rng.random() < 0.9 else self.random_value()
+        if not self.functions:
+            return self.random_bytes(4 + 32 * self.rng.randrange(4)), 0
+        encoder, payable = self.rng.choice(self.functions)
+        value = self.random_value() if payable or self.rng.random() < 0.05 else 0
+        return encoder.encode_values([self.random_param(t) for t in encoder.types]), value
+
+    def random_value(self) -> int:
+        """
+        :return: A random amount of wei to send, at most about 18 ether so that the master account can always afford it.
+        """
+        return self.rng.choice([0, 1, self.random_int(64)])
+
+    def mutate(self, data: bytes) -> bytes:
+        """
+        :return: The data with one to four random mutations of the params, the function selector is kept.
+        """
+        data = bytearray(data)
+        for _ in range(self.rng.randrange(1, 5)):
+            kind = self.rng.randrange(6)
+            if len(data) <= 4 or kind == 0:
+                # append a word
+                data += self.random_int(256).to_bytes(32, "big")
+            elif kind == 1:
+                i = self.rng.randrange(4, len(data))
+                data[i] ^= 1 << self.rng.randrange(8)
+            elif kind == 2:
+                data[self.rng.randrange(4, len(data))] = self.rng.randrange(256)
+            elif kind == 3:
+                # replace a word of the abi encoding with an interesting value
+                i = 4 + 32 * self.rng.randrange(max(1, (len(data) - 4) // 32))
+                data[i:i + 32] = self.random_int(256).to_bytes(32, "big")
+            elif kind == 4:
+                del data[self.rng.randrange(4, len(data)):]
+            else:
+                # splice with another input of the corpus
+                other = self.rng.choice(self.corpus).data if self.corpus else b''
+                i = self.rng.randrange(4, len(data))
+                data[i:] = other[i:]
+        return bytes(data)
+
+    def random_param(self, abi_type: str) -> Any:
+        """
+        :return: A random value of the given abi type, in the form the encoders of eth_abi expect.
+        :raise ValueError: If the type is not supported.
+        """
+        if abi_type.endswith("]"):
+            base, _, size = abi_type[:-1].rpartition("[")
+            n = int(size) if size else self.rng.choice([0, 1, 2, self.rng.randrange(8)])
+            return [self.random_param(base) for _ in range(n)]
+        if abi_type.startswith("uint"):
+            return self.random_int(int(abi_type[4:] or 256))
+        if abi_type.startswith("int"):
+            bits = int(abi_type[3:] or 256)
+            value = self.random_int(bits)
+            return value - (1 << bits) if value >= 1 << (bits - 1) else value
+        if abi_type == "address":
+            return self.rng.choice(self.addresses) if self.rng.random() < 0.9 else self.random_bytes(20)
+        if abi_type == "bool":
+            return self.rng.random() < 0.5
+        if abi_type.startswith("bytes") and abi_type != "bytes":
+            return self.random_bytes(int(abi_type[5:]))
+        if abi_type == "bytes":
+            return self.random_bytes(self.rng.choice([0, 1, 31, 32, 33, self.rng.randrange(256)]))
+        if abi_type == "string":
+            return "".join(chr(self.rng.randrange(32, 127)) for _ in range(self.rng.choice([0, 1, 32, 33, 64])))
+        raise ValueError("Unsupported type {t}".format(t=abi_type))
+
+    def random_int(self, bits: int) -> int:
+        """
+        :return: A random unsigned integer of the given size, biased towards boundaries.
+        """
+        kind = self.rng.randrange(6)
+        if kind == 0:
+            return self.rng.choice([0, 1, 2, (1 << bits) - 1, (1 << bits) - 2, 1 << (bits - 1), (1 << (bits - 1)) - 1])
+        if kind == 1:
+            return self.rng.randrange(min(256, 1 << bits))
+        if kind == 2:
+            return 1 << self.rng.randrange(bits)
+        return self.rng.getrandbits(bits)
+
+    def random_bytes(self, n: int) -> bytes:
+        return bytes(self.rng.getrandbits(8) for _ in range(n))
+
+    def save(self, directory: str):
+        """
+        Writes the corpus and the reverts into the files corpus.jsonl and reverts.jsonl in the given directory, one
+        input per line with its data as hex string.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, inputs in (("corpus.jsonl", self.corpus), ("reverts.jsonl", self.reverts)):
+            with open(os.path.join(directory, name), "w") as f:
+                for i in inputs:
+                    f.write(json.dumps({"data": i.data.hex(), "value": i.value, "error": i.error}) + "\n")
@@ -0,0 +1,154 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.util.storage_trie import SMALL_SLOTS, SlotKeys, slot_key
+
+# maximum number of preimages that are kept, the least recently used ones are dropped first
+PREIMAGE_CACHE_SIZE = 1 << 14
+# only hashes of inputs of this length are recorded: a slot (the data of a dynamic array) or a key followed by a slot
+# (an entry of a mapping). Keys of mappings that are longer strings or byte arrays cannot be decoded
+MIN_PREIMAGE_LENGTH = 32
+MAX_PREIMAGE_LENGTH = 128
+# an array slot is only decoded if it lies within this distance of the start of the data of an array
+MAX_ARRAY_OFFSET = 1 << 32
+# nested mappings and arrays are decoded up to this depth
+MAX_DECODE_DEPTH = 8
+
+# a slot that belongs to a mapping or dynamic array at the slot base. key is the key of the mapping entry, as it has
+# been hashed, and None for an array. offset is the distance of the slot to the start of the data of the array, which
+# is the index of the element if every element takes one slot
+DecodedSlot = namedtuple("DecodedSlot", ["base", "key", "offset"])
+
+
+class PreimageCache:
+    """
+    Keeps the inputs of the keccak hashes computed by SHA3, so that the slots solidity derives from hashes can be traced
+    back to the mapping or dynamic array they belong to. The value of a mapping entry with key k of the mapping at slot
+    p is stored at keccak(k . p), the elements of a dynamic array at slot p start at keccak(p).
+
+    The cache is written while executing and read by the GUI, decoding only looks hashes up and never computes one. It
+    holds at most max_size preimages, the least recently used are evicted. Since the optimizer of solc computes the
+    hashes of constant slots at compile time, the starts of the arrays at the first small_slots slots are known from
+    the start instead.
+    """
+
+    def __init__(self, max_size: int = PREIMAGE_CACHE_SIZE, slot_keys: SlotKeys = None, small_slots: int = SMALL_SLOTS):
+        """
+        :param slot_keys: If given, every hash that is recorded is added to it as slot, so that slots of mappings and
+        the first slots of arrays are known when the storage trie is enumerated.
+        """
+        self.max_size = max_size
+        self.slot_keys = slot_keys
+        self._lock = Lock()
+        # hash -> preimage, in the order of their last use
+        self._preimages: Dict[int, bytes] = OrderedDict()
+        # hash -> preimage of the starts of the arrays at small slots, which are never evicted
+        self._small_slots: Dict[int, bytes] = {}
+        for slot in range(small_slots):
+            digest = int.from_bytes(slot_key(slot), "big")
+            self._small_slots[digest] = slot.to_bytes(32, "big")
+            if slot_keys is not None:
+                slot_keys.add(digest)
+        # sorted hashes of the slots the data of arrays start at, i.e. the hashes of a single slot
+        self._array_starts: List[int] = sorted(self._small_slots)
+
+    def __len__(self) -> int:
+        return len(self._preimages)
+
+    def add(self, digest: int, preimage: bytes):
+        """
+        Records the preimage of a hash, unless its length is out of MIN_PREIMAGE_LENGTH and MAX_PREIMAGE_LENGTH.
+        """
+        if not MIN_PREIMAGE_LENGTH <= len(preimage) <= MAX_PREIMAGE_LENGTH:
+            return
+        if digest in self._small_slots:
+            return
+        with self._lock:
+            if digest in self._preimages:
+                self._preimages.move_to_end(digest)
+                return
+            self._preimages[digest] = bytes(preimage)
+            if len(preimage) == 32:
+                self._array_starts.insert(bisect_left(self._array_starts, digest), digest)
+            while len(self._preimages) > self.max_size:
+                evicted, evicted_preimage = self._preimages.popitem(last=False)
+                if len(evicted_preimage) == 32:
+                    del self._array_starts[bisect_left(self._array_starts, evicted)]
+        if self.slot_keys is not None:
+            self.slot_keys.add(digest)
+
+    def update(self, preimages: Iterable[Tuple[int, bytes]]):
+        for digest, preimage in preimages:
+            self.add(digest, preimage)
+
+    def get(self, digest: int) -> Optional[bytes]:
+        """
+        :return: The preimage of the hash, None if it is unknown.
+        """
+        preimage = self._small_slots.get(digest)
+        if preimage is not None:
+            return preimage
+        with self._lock:
+            preimage = self._preimages.get(digest)
+            if preimage is not None:
+                self._preimages.move_to_end(digest)
+            return preimage
+
+    def decode(self, slot: int) -> Optional[DecodedSlot]:
+        """
+        :return: The mapping entry or array element the slot belongs to, None if it cannot be decoded.
+        """
+        with self._lock:
+            start = slot
+            preimage = self._preimages.get(slot) or self._small_slots.get(slot)
+            if preimage is None:
+                i = bisect_right(self._array_starts, slot) - 1
+                if i < 0 or slot - self._array_starts[i] >= MAX_ARRAY_OFFSET:
+                    return None
+                start = self._array_starts[i]
+                preimage = self._preimages.get(start) or self._small_slots[start]
+            if start in self._preimages:
+                self._preimages.move_to_end(start)
+        base = int.from_bytes(preimage[-32:], "big")
+        if len(preimage) == 32:
+            return DecodedSlot(base, None, slot - start)
+        return DecodedSlot(base, preimage[:-32], 0)
+
+    def used_preimages(self, slot: int) -> [(int, bytes)]:
+        """
+        :return: The (hash, preimage) pairs that decode() and format_slot() need to decode the slot, including those of
+        the slots of nested mappings and arrays.
+        """
+        used = []
+        for _ in range(MAX_DECODE_DEPTH):
+            decoded = self.decode(slot)
+            if decoded is None:
+                break
+            start = slot - decoded.offset
+            preimage = self.get(start)
+            if preimage is not None:
+                used.append((start, preimage))
+            slot = decoded.base
+        return used
+
+    def format_slot(self, slot: int) -> str:
+        """
+        :return: The slot as hex string, or the way it has been derived if it belongs to a mapping or an array, e.g.
+        0x1[0xaa][0xbb] for an entry of a nested mapping at slot 1 and 0x2[]+0x3 for the fourth slot of the data of the
+        array at slot 2.
+        """
+        suffixes = []
+        for _ in range(MAX_DECODE_DEPTH):
+            decoded = self.decode(slot)
+            if decoded is None:
+                break
+            if decoded.key is None:
+                suffixes.append("[]+" + hex(decoded.offset))
+            elif len(decoded.key) == 32:
+                suffixes.append("[" + hex(int.from_bytes(decoded.key, "big")) + "]")
+            else:
+                suffixes.append("[0x" + decoded.key.hex() + "]")
+            slot = decoded.base
+        return hex(slot) + "".join(reversed(suffixes))
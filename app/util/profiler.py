@@ -0,0 +1,136 @@
+from collections import namedtuple
+from time import perf_counter
+from typing import Any, Dict, IO
+
+from eth.abc import ComputationAPI
+
+from app.util.disassembly import Disassembly
+from app.util.tracer import Tracer
+
+# aggregated costs of an opcode (address and pc are None) or of the instruction at a pc of a contract. gas and time
+# (in seconds) are exclusive, i.e. the costs of the frames called by a CALL or CREATE are not part of its costs
+ProfileEntry = namedtuple("ProfileEntry", ["address", "pc", "mnemonic", "count", "gas", "time"])
+
+
+class _Frame:
+    """
+    A call frame that is currently profiled.
+    """
+
+    def __init__(self, computation: ComputationAPI, path: str):
+        self.computation = computation
+        # the frames that lead to this one, in the format of Profiler.write_collapsed()
+        self.path = path
+        self.start = perf_counter()
+        # end of the last step of the frame
+        self.last = self.start
+        # gas and time of the frames that have been called since the last step of this frame
+        self.child_gas = 0
+        self.child_time = 0.0
+
+
+class Profiler(Tracer):
+    """
+    Tracer that aggregates execution count, gas and wall time per instruction. Pass it to the EVMHandler with the tracer
+    keyword argument and read the results with by_opcode(), by_pc(), report() or write_collapsed() afterwards.
+
+    The time of an instruction is measured from the end of the previous instruction of its frame, the time the profiler
+    itself needs is left out. Gas that is burned because a called frame fails is counted for the CALL.
+    """
+
+    def __init__(self):
+        # (path of the frame, pc) -> [mnemonic, count, gas, time]
+        self.samples: Dict[tuple, list] = {}
+        self._frames: [_Frame] = []
+
+    def start_frame(self, computation: ComputationAPI, disassembly: Disassembly):
+        name = "0x" + computation.msg.code_address.hex()
+        if self._frames:
+            caller = self._frames[-1]
+            # the pc of the caller already points behind the CALL (or CREATE)
+            call_pc = caller.computation.code.pc - 1
+            call = caller.computation.opcodes.get(caller.computation.disassembly.code[call_pc])
+            path = "{p};{m}@{pc};{n}".format(p=caller.path, m=call.mnemonic if call is not None else "CALL",
+                                             pc=call_pc, n=name)
+        else:
+            path = name
+        self._frames.append(_Frame(computation, path))
+
+    def step(self, computation: ComputationAPI, pc: int, opcode: int, opcode_fn: Any, gas: int):
+        now = perf_counter()
+        frame = self._frames[-1]
+        sample = self.samples.get((frame.path, pc))
+        if sample is None:
+            sample = [opcode_fn.mnemonic, 0, 0, 0.0]
+            self.samples[(frame.path, pc)] = sample
+        sample[1] += 1
+        sample[2] += gas - computation.get_gas_remaining() - frame.child_gas
+        sample[3] += now - frame.last - frame.child_time
+        frame.child_gas = 0
+        frame.child_time = 0.0
+        frame.last = perf_counter()
+
+    def end_frame(self, computation: ComputationAPI):
+        frame = self._frames.pop()
+        if self._frames:
+            caller = self._frames[-1]
+            caller.child_gas += computation.msg.gas - computation.get_gas_remaining()
+            caller.child_time += perf_counter() - frame.start
+
+    def by_opcode(self) -> [ProfileEntry]:
+        """
+        :return: The costs per opcode, the most expensive (by gas) first.
+        """
+        opcodes = {}
+        for mnemonic, count, gas, time in self.samples.values():
+            entry = opcodes.setdefault(mnemonic, [0, 0, 0.0])
+            entry[0] += count
+            entry[1] += gas
+            entry[2] += time
+        entries = [ProfileEntry(None, None, m, *e) for m, e in opcodes.items()]
+        return sorted(entries, key=lambda e: (-e.gas, -e.time))
+
+    def by_pc(self) -> [ProfileEntry]:
+        """
+        :return: The costs per instruction of every contract, the most expensive (by gas) first.
+        """
+        instructions = {}
+        for (path, pc), (mnemonic, count, gas, time) in self.samples.items():
+            address = path[path.rfind(";") + 1:]
+            entry = instructions.setdefault((address, pc), [mnemonic, 0, 0, 0.0])
+            entry[1] += count
+            entry[2] += gas
+            entry[3] += time
+        entries = [ProfileEntry(address, pc, *e) for (address, pc), e in instructions.items()]
+        return sorted(entries, key=lambda e: (-e.gas, -e.time))
+
+    def report(self, limit: int = 20) -> str:
+        """
+        :param limit: The maximal number of rows per table.
+        :return: A table of the most expensive opcodes and one of the most expensive instructions.
+        """
+        lines = ["{:<14} {:>10} {:>12} {:>12}".format("Opcode", "Count", "Gas", "Time (us)")]
+        for e in self.by_opcode()[:limit]:
+            lines.append("{:<14} {:>10} {:>12} {:>12.1f}".format(e.mnemonic, e.count, e.gas, e.time * 1e6))
+        lines.append("")
+        lines.append("{:<42} {:>6} {:<14} {:>10} {:>12} {:>12}".format("Address", "PC", "Opcode", "Count", "Gas",
+                                                                       "Time (us)"))
+        for e in self.by_pc()[:limit]:
+            lines.append("{:<42} {:>6} {:<14} {:>10} {:>12} {:>12.1f}".format(e.address, e.pc, e.mnemonic, e.count,
+                                                                             e.gas, e.time * 1e6))
+        return "\n".join(lines)
+
+    def write_collapsed(self, file: IO[str], metric: str = "gas"):
+        """
+        Writes the profile in the collapsed stack format of flamegraph.pl (and speedscope), one line per instruction
+        and call path, e.g. "0x6295...;CALL@62;0x6295...;SSTORE@40 20000".
+
+        :param file: A file object opened for writing text.
+        :param metric: "gas" or "time" (in microseconds).
+        """
+        if metric not in ("gas", "time"):
+            raise ValueError("Unknown metric {m}, use gas or time".format(m=metric))
+        for (path, pc), (mnemonic, count, gas, time) in sorted(self.samples.items()):
+            value = gas if metric == "gas" else int(round(time * 1e6))
+            if value > 0:
+                file.write("{p};{m}@{pc} {v}\n".format(p=path, m=mnemonic, pc=pc, v=value))
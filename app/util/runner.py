@@ -0,0 +1,86 @@
+import logging
+import os
+from collections import namedtuple
+from multiprocessing import Pool
+from typing import Callable
+
+from app.evmhandler import EVMHandler, ForkedState
+from app.util.tracer import Tracer
+from app.util.util import MODE_NONE
+
+logger = logging.getLogger(__name__)
+
+# outcome of a scenario: per call the receipt, the output and the error (None if the call succeeded), as well as the
+# tracer that observed the scenario (None if no tracer factory was given)
+ScenarioResult = namedtuple("ScenarioResult", ["receipts", "outputs", "errors", "tracer"])
+
+# the handler of the current worker process and the snapshot of the forked state, see _init_worker()
+_handler: EVMHandler = None
+_snapshot: int = None
+
+
+def _init_worker(fork: ForkedState, instant_seal: bool, transactions_per_block: int):
+    global _handler, _snapshot
+    _handler = EVMHandler(instant_seal, transactions_per_block, fork=fork)
+    _snapshot = _handler.snapshot()
+
+
+def _run_scenario(args: tuple) -> ScenarioResult:
+    """
+    Runs one scenario in the current worker, starting from the forked state.
+    """
+    scenario, tracer_factory = args
+    _handler.revert(_snapshot)
+    tracer = tracer_factory() if tracer_factory is not None else None
+    receipts, outputs, errors = [], [], []
+    for addr, function_signature, function_params, value in scenario:
+        _, receipt, computation = _handler.call_contract_function(addr, function_signature, function_params,
+                                                                  MODE_NONE, value, tracer=tracer)
+        receipts.append(receipt)
+        outputs.append(computation.output)
+        errors.append(repr(computation.error) if computation.is_error else None)
+    if tracer is not None and hasattr(tracer, "close"):
+        tracer.close()
+    return ScenarioResult(receipts, outputs, errors, tracer)
+
+
+class ParallelRunner:
+    """
+    Runs independent scenarios (e.g. fuzz cases against the same deployed contracts) in a pool of processes. The state of
+    an EVMHandler is forked once, every worker process continues the chain from there on its own copy, and every
+    scenario starts from the forked state again. Since every process has its own EVMHandler, the scenarios do not
+    share any debugging or tracing state either.
+    """
+
+    def __init__(self, evm_handler: EVMHandler, processes: int = None):
+        """
+        :param evm_handler: The handler whose current state the scenarios start from. It is not changed by the runner.
+        :param processes: The number of worker processes, the number of CPUs by default. With 1 the scenarios are run in
+        the calling process.
+        """
+        self.fork = evm_handler.fork()
+        self.instant_seal = evm_handler.instant_seal
+        self.transactions_per_block = evm_handler.transactions_per_block
+        self.processes = processes or os.cpu_count() or 1
+
+    def run(self, scenarios: [[(bytes, str, [], int)]], tracer_factory: Callable[[], Tracer] = None) \
+            -> [ScenarioResult]:
+        """
+        :param scenarios: The scenarios to run, each of them a list of calls that are sent as transactions one after
+        another. A call is given as (address, function signature, function params, value), see
+        EVMHandler.execute_batch().
+        :param tracer_factory: Creates the tracer of a scenario, e.g. Profiler or BlockCoverage. Factory and tracer are
+        sent between the processes, so both have to be picklable (a class or a module level function).
+        :return: The results of the scenarios, in the order of the scenarios.
+        """
+        args = [(scenario, tracer_factory) for scenario in scenarios]
+        init_args = (self.fork, self.instant_seal, self.transactions_per_block)
+        if self.processes == 1:
+            _init_worker(*init_args)
+            return [_run_scenario(a) for a in args]
+
+        logger.info("Running {n} scenarios in {p} processes".format(n=len(scenarios), p=self.processes))
+        # a few slices per process, so that the processes finish at about the same time
+        chunk_size = max(1, len(args) // (4 * self.processes))
+        with Pool(self.processes, _init_worker, init_args) as pool:
+            return pool.map(_run_scenario, args, chunk_size)
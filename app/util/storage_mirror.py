@@ -0,0 +1,115 @@
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+
+class StorageMirror:
+    """
+    Keeps track of the storage slots that have been seen per address, keyed by the slot as int. Every slot gets the row
+    of the storage table it is shown in, in the order in which the slots are seen, so that rows never move once a step
+    refers to them. A sorted index of the slots is built on demand for display and range lookups.
+
+    The mirror is written by the worker thread during an execution and read by the GUI thread. Instead of asking the GUI
+    for the row of every new slot, the worker registers the slot itself and the changes are collected as deltas, which
+    the GUI takes whenever it updates the storage table. The values themselves are not kept, they are part of the state.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        # address -> slot -> row
+        self._rows: Dict[bytes, Dict[int, int]] = {}
+        # address -> slots in the order of their rows
+        self._slots: Dict[bytes, List[int]] = {}
+        # address -> sorted slots, None until requested after a slot has been added
+        self._sorted: Dict[bytes, Optional[List[int]]] = {}
+        # (address, slot) -> (row, value) of every slot that has been added or set since the last take_deltas(), only
+        # the last value of a slot is kept
+        self._deltas: Dict[Tuple[bytes, int], Tuple[int, int]] = {}
+
+    def __contains__(self, addr: bytes) -> bool:
+        return addr in self._rows
+
+    def __len__(self) -> int:
+        return sum(len(slots) for slots in self._slots.values())
+
+    def row(self, addr: bytes, slot: int) -> Optional[int]:
+        """
+        :return: The row of the slot, None if it has not been seen yet.
+        """
+        rows = self._rows.get(addr)
+        return None if rows is None else rows.get(slot)
+
+    def add(self, addr: bytes, slot: int, value: int = None) -> int:
+        """
+        Registers a slot, e.g. because it is read. Registering a slot that is already known does not change anything.
+
+        :param value: The current value of the slot, which is passed on to the GUI if the slot is new.
+        :return: The row of the slot.
+        """
+        with self._lock:
+            row, new = self._add(addr, slot)
+            if new:
+                self._deltas[(addr, slot)] = (row, value)
+            return row
+
+    def set(self, addr: bytes, slot: int, value: int) -> int:
+        """
+        Registers that a slot has been written.
+
+        :return: The row of the slot.
+        """
+        with self._lock:
+            row, _ = self._add(addr, slot)
+            self._deltas[(addr, slot)] = (row, value)
+            return row
+
+    def _add(self, addr: bytes, slot: int) -> (int, bool):
+        rows = self._rows.get(addr)
+        if rows is None:
+            rows = self._rows[addr] = {}
+            self._slots[addr] = []
+        row = rows.get(slot)
+        if row is not None:
+            return row, False
+        row = rows[slot] = len(rows)
+        self._slots[addr].append(slot)
+        self._sorted[addr] = None
+        return row, True
+
+    def slots(self, addr: bytes) -> List[int]:
+        """
+        :return: The slots of the address in the order of their rows.
+        """
+        with self._lock:
+            return list(self._slots.get(addr, ()))
+
+    def sorted_slots(self, addr: bytes, start: int = 0, stop: int = None) -> List[int]:
+        """
+        :return: The slots of the address with start <= slot < stop in ascending order.
+        """
+        with self._lock:
+            slots = self._sorted.get(addr)
+            if slots is None:
+                slots = self._sorted[addr] = sorted(self._slots.get(addr, ()))
+        end = len(slots) if stop is None else bisect_left(slots, stop)
+        return slots[bisect_left(slots, start):end]
+
+    def remove(self, addr: bytes):
+        """
+        Forgets every slot of the address, e.g. because new code has been deployed to it.
+        """
+        with self._lock:
+            self._rows.pop(addr, None)
+            self._slots.pop(addr, None)
+            self._sorted.pop(addr, None)
+            self._deltas = {k: v for k, v in self._deltas.items() if k[0] != addr}
+
+    def take_deltas(self) -> List[Tuple[bytes, int, int, int]]:
+        """
+        :return: (address, slot, row, value) of every slot that has been added or set since the last call, with the last
+        value of the slot. The value is None if a slot has been added without a value.
+        """
+        with self._lock:
+            deltas = self._deltas
+            self._deltas = {}
+        return [(addr, slot, row, value) for (addr, slot), (row, value) in deltas.items()]
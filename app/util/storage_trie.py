@@ -0,0 +1,127 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import rlp
+from eth.abc import DatabaseAPI
+from eth.rlp.accounts import Account
+from eth_typing import Address, Hash32
+from sha3 import keccak_256
+from trie import HexaryTrie
+from trie.constants import BLANK_NODE_HASH
+from trie.utils.nibbles import bytes_to_nibbles, nibbles_to_bytes
+from trie.utils.nodes import NODE_TYPE_BRANCH, NODE_TYPE_EXTENSION, NODE_TYPE_LEAF, extract_key, get_node_type
+
+# a non-zero storage slot as it is found in the storage trie. key is the hash of the slot, which is what the trie is
+# keyed by, slot is None if the preimage of the key is unknown
+StorageEntry = namedtuple("StorageEntry", ["key", "slot", "value"])
+
+# number of slots starting at 0 whose keys are always known, this covers the state variables of nearly every contract
+SMALL_SLOTS = 256
+# maximum number of other slots whose keys are kept
+SLOT_KEYS_SIZE = 1 << 16
+
+
+def slot_key(slot: int) -> bytes:
+    """
+    :return: The key under which the slot is stored in the storage trie.
+    """
+    return keccak_256(slot.to_bytes(32, "big")).digest()
+
+
+class SlotKeys:
+    """
+    Preimage cache of the keys of storage tries. The trie only knows the hashes of the slots, so every slot that is
+    supposed to show up by its number when the storage is enumerated has to be added here first (e.g. because it has
+    been accessed while debugging). The keys of the first SMALL_SLOTS slots are known from the start, of the slots that
+    are added at most max_size are kept, the least recently used are evicted.
+    """
+
+    def __init__(self, small_slots: int = SMALL_SLOTS, max_size: int = SLOT_KEYS_SIZE):
+        self.max_size = max_size
+        self._lock = Lock()
+        # key -> slot
+        self._small_slots: Dict[bytes, int] = {slot_key(slot): slot for slot in range(small_slots)}
+        self._slots: Dict[bytes, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._small_slots) + len(self._slots)
+
+    def add(self, slot: int) -> bytes:
+        """
+        :return: The key of the slot.
+        """
+        key = slot_key(slot)
+        if key in self._small_slots:
+            return key
+        with self._lock:
+            self._slots[key] = slot
+            self._slots.move_to_end(key)
+            if len(self._slots) > self.max_size:
+                self._slots.popitem(last=False)
+        return key
+
+    def add_all(self, slots: Iterable[int]):
+        for slot in slots:
+            self.add(slot)
+
+    def get(self, key: bytes) -> Optional[int]:
+        """
+        :return: The slot of the key, None if it is unknown.
+        """
+        slot = self._small_slots.get(key)
+        if slot is not None:
+            return slot
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._slots.move_to_end(key)
+            return slot
+
+
+def get_storage_root(db: DatabaseAPI, state_root: Hash32, address: Address) -> Hash32:
+    """
+    :return: The root of the storage trie of the address in the state with the given root, the root of an empty trie if
+    the account does not exist.
+    """
+    encoded = HexaryTrie(db, state_root).get(keccak_256(address).digest())
+    if not encoded:
+        return BLANK_NODE_HASH
+    return rlp.decode(encoded, sedes=Account).storage_root
+
+
+def iter_trie(db: DatabaseAPI, root_hash: Hash32, start: bytes = b'') -> Iterator[Tuple[bytes, bytes]]:
+    """
+    Walks the nodes of a trie and yields the (key, value) of every leaf in ascending order of the keys, starting at the
+    first key that is not less than start. Subtrees whose keys are all less than start are skipped without loading
+    them, so continuing a walk at a key does not cost more than the depth of the trie.
+    """
+    trie = HexaryTrie(db, root_hash)
+    yield from _walk(trie, trie.root_node, (), bytes_to_nibbles(start))
+
+
+def _walk(trie: HexaryTrie, node: list, path: tuple, start: tuple) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    :param path: The nibbles of the keys leading to the node.
+    :param start: The nibbles of the key to start at, empty if every key below the node is to be yielded.
+    """
+    node_type = get_node_type(node)
+    if node_type == NODE_TYPE_LEAF:
+        path += extract_key(node)
+        if path >= start:
+            yield nibbles_to_bytes(path), node[1]
+        return
+    if node_type == NODE_TYPE_EXTENSION:
+        children = [(path + extract_key(node), node[1])]
+    elif node_type == NODE_TYPE_BRANCH:
+        # the value slot of a branch is never used, since all keys of a storage trie have the same length
+        children = [(path + (nibble,), node[nibble]) for nibble in range(16) if node[nibble]]
+    else:
+        return
+    for child_path, child in children:
+        prefix = start[:len(child_path)]
+        if child_path < prefix:
+            continue
+        # nodes of less than 32 bytes are embedded into their parent instead of being referenced by their hash
+        child_node = child if isinstance(child, list) else trie.get_node(child)
+        yield from _walk(trie, child_node, child_path, start if child_path == prefix else ())
@@ -0,0 +1,325 @@
+import sys
+from typing import Any, Callable, Dict
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QFont, QBrush, QColor
+from eth.abc import OpcodeAPI
+from eth.vm.logic.invalid import InvalidOpcode
+
+from app.util.disassembly import Disassembly
+from app.util.util import hex2, format_stack_item
+
+# colors used to highlight the rows that are read before and written after a computation, see ChangeChain
+PRE_COMPUTATION_COLOR = QColor(255, 0, 0)
+POST_COMPUTATION_COLOR = QColor(0, 255, 0)
+
+RIGHT_ALIGNED = int(Qt.AlignRight | Qt.AlignVCenter)
+
+
+class HighlightTableModel(QAbstractTableModel):
+    """
+    Base class of the table models of the debugger. The models only keep the raw data (e.g. the bytecode or the
+    memory) and format the cells in data() when the view asks for them, i.e. only for the rows that are visible.
+    Rows can be highlighted with a color, which also turns their font bold. Subclasses provide their data by
+    overriding row_count(), text() and reset_data(), by themselves the methods make up an empty model.
+    """
+    headers: [str] = []
+    # columns whose text is aligned to the right
+    right_aligned: [int] = []
+    font: QFont = None
+
+    def __init__(self, parent=None):
+        super(HighlightTableModel, self).__init__(parent)
+        self._highlights: Dict[int, QColor] = {}
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.row_count()
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            return self.text(row, column)
+        elif role == Qt.TextAlignmentRole:
+            return RIGHT_ALIGNED if column in self.right_aligned else None
+        elif role == Qt.ForegroundRole:
+            color = self._highlights.get(row)
+            return None if color is None else QBrush(color)
+        elif role == Qt.FontRole:
+            if row in self._highlights:
+                font = QFont() if self.font is None else QFont(self.font)
+                font.setBold(True)
+                return font
+            return self.font
+        return None
+
+    def row_count(self) -> int:
+        """
+        :return: The number of rows of the data.
+        """
+        return 0
+
+    def text(self, row: int, column: int) -> str:
+        """
+        :return: The text of the cell, only called for cells within row_count() and the headers.
+        """
+        return ""
+
+    def highlight(self, rows: [int], color: QColor = None):
+        """
+        Highlights the given rows with the given color, or removes the highlighting of the rows if no color is given.
+        """
+        count = self.row_count()
+        for row in rows:
+            row = int(row)
+            if not 0 <= row < count:
+                continue
+            if color is None:
+                if self._highlights.pop(row, None) is None:
+                    continue
+            else:
+                self._highlights[row] = color
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.headers) - 1))
+
+    def clear(self):
+        self.beginResetModel()
+        self._highlights = {}
+        self.reset_data()
+        self.endResetModel()
+
+    def reset_data(self):
+        """
+        Drops the data of the model, called by clear() while the model is being reset.
+        """
+        pass
+
+
+class OpcodeTableModel(HighlightTableModel):
+    """
+    Shows the disassembly of a contract, one row per instruction. The data of a PUSH instruction is shown next to its
+    mnemonic.
+    """
+    headers = ["Opcodes", "Mnemonic", "Gas Cost"]
+    right_aligned = [2]
+
+    def __init__(self, parent=None):
+        super(OpcodeTableModel, self).__init__(parent)
+        self.reset_data()
+
+    def reset_data(self):
+        self._disassembly: Disassembly = None
+        self._opcode_lookup: Dict[int, OpcodeAPI] = {}
+        # gas costs per row which have been measured during the execution, see set_gas()
+        self._gas: Dict[int, int] = {}
+
+    def set_code(self, disassembly: Disassembly, opcode_lookup: Dict[int, OpcodeAPI]):
+        """
+        :param disassembly: The disassembly of the code to show.
+        :param opcode_lookup: The opcodes of the vm that executes the code.
+        """
+        self.beginResetModel()
+        self._highlights = {}
+        self.reset_data()
+        self._disassembly = disassembly
+        self._opcode_lookup = opcode_lookup
+        self.endResetModel()
+
+    def row_of(self, pc: int) -> int:
+        """
+        :return: The row of the instruction at the given pc.
+        """
+        return 0 if self._disassembly is None else self._disassembly.row_of(pc)
+
+    def set_gas(self, pc: int, gas: int):
+        """
+        Replaces the static gas cost of the instruction at the given pc with the gas that was actually used.
+        """
+        if self._disassembly is not None:
+            row = self.row_of(pc)
+            self._gas[row] = gas
+            index = self.index(row, 2)
+            self.dataChanged.emit(index, index)
+
+    def row_count(self) -> int:
+        return 0 if self._disassembly is None else len(self._disassembly.instructions)
+
+    def text(self, row: int, column: int) -> str:
+        pc, opcode, data = self._disassembly.instructions[row]
+        if column == 0:
+            return hex2(opcode)
+        if column == 2 and row in self._gas:
+            return str(self._gas[row])
+        opcode_fn = self._opcode_lookup.get(opcode)
+        if opcode_fn is None:
+            opcode_fn = InvalidOpcode(opcode)
+        if column == 2:
+            return str(opcode_fn.gas_cost)
+        return opcode_fn.mnemonic + " 0x" + data.hex() if data else opcode_fn.mnemonic
+
+
+class StackTableModel(HighlightTableModel):
+    """
+    Shows the stack of a computation, with the top of the stack in the first row.
+    """
+    headers = ["Stack (256 Bit-Length Words)"]
+
+    def __init__(self, parent=None):
+        super(StackTableModel, self).__init__(parent)
+        self.reset_data()
+
+    def reset_data(self):
+        self._stack: [tuple] = []
+
+    def set_stack(self, stack: [tuple]):
+        """
+        Shows the given stack. Rows are inserted or removed at the top when the stack grows or shrinks and only the
+        rows whose content actually changed are updated.
+
+        :param stack: The values of the stack as (type, value) tuples, bottom of the stack first.
+        """
+        old = self._stack
+        size = len(stack)
+        if size > len(old):
+            self.beginInsertRows(QModelIndex(), 0, size - len(old) - 1)
+            self._stack = list(stack)
+            self.endInsertRows()
+        elif size < len(old):
+            self.beginRemoveRows(QModelIndex(), 0, len(old) - size - 1)
+            self._stack = list(stack)
+            self.endRemoveRows()
+        else:
+            self._stack = list(stack)
+
+        changed = [size - 1 - i for i in range(0, min(size, len(old))) if old[i] != stack[i]]
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), 0), self.index(max(changed), 0))
+
+    def row_count(self) -> int:
+        return len(self._stack)
+
+    def text(self, row: int, column: int) -> str:
+        return format_stack_item(self._stack[len(self._stack) - 1 - row])
+
+
+class MemoryTableModel(HighlightTableModel):
+    """
+    Shows the memory of a computation, one row per 32 byte word.
+    """
+    headers = ["Memory"]
+
+    def __init__(self, parent=None):
+        super(MemoryTableModel, self).__init__(parent)
+        self.font = QFont("Courier", 9 if sys.platform.__contains__("linux") else 12)
+        self.reset_data()
+
+    def reset_data(self):
+        self._memory = b''
+
+    def set_memory(self, memory: bytearray):
+        """
+        Shows the given memory. Memory only ever grows during a computation, new words are appended as rows and the
+        existing rows are only updated if their content changed.
+        """
+        old = self._memory
+        old_rows = len(old) // 32
+        rows = len(memory) // 32
+        memory = bytes(memory)
+        if rows < old_rows:
+            self.beginResetModel()
+            self._highlights = {}
+            self._memory = memory
+            self.endResetModel()
+            return
+
+        changed = memory[:len(old)] != old
+        if rows > old_rows:
+            self.beginInsertRows(QModelIndex(), old_rows, rows - 1)
+            self._memory = memory
+            self.endInsertRows()
+        else:
+            self._memory = memory
+        if changed and old_rows > 0:
+            # the view only asks for the rows that are currently visible
+            self.dataChanged.emit(self.index(0, 0), self.index(old_rows - 1, 0))
+
+    def row_count(self) -> int:
+        return len(self._memory) // 32
+
+    def text(self, row: int, column: int) -> str:
+        return "0x" + self._memory[row * 32:(row + 1) * 32].hex()
+
+
+class StorageTableModel(HighlightTableModel):
+    """
+    Shows the storage slots of an address and their values. Slots that are only known by the hash they are stored under
+    (see SlotKeys) are shown below the others. The slots can be fetched page by page as the view is scrolled down, see
+    set_fetcher().
+    """
+    headers = ["Storage Slot", "Storage Value"]
+    right_aligned = [1]
+
+    def __init__(self, parent=None):
+        super(StorageTableModel, self).__init__(parent)
+        self.reset_data()
+
+    def reset_data(self):
+        self._rows: [[str]] = []
+        self._hashed_rows: [[str]] = []
+        self._fetch: Callable[[], bool] = None
+
+    def set_fetcher(self, fetch: Callable[[], bool]):
+        """
+        :param fetch: Called whenever the view reaches the end of the table, adds the next slots to the model and
+        returns whether there are more slots to fetch.
+        """
+        self._fetch = fetch
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and self._fetch is not None
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()):
+        fetch = self._fetch
+        if parent.isValid() or fetch is None:
+            return
+        self._fetch = None
+        if fetch():
+            self._fetch = fetch
+
+    def add_hashed_slot(self, key: str, value: str):
+        """
+        Appends a slot whose preimage is unknown below all other rows.
+        """
+        row = self.row_count()
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._hashed_rows.append([key + " (hashed)", value])
+        self.endInsertRows()
+
+    def set_slot(self, row: int, slot: str, value: str):
+        """
+        Sets the slot and value shown in the given row. If the row is past the last row, rows are appended.
+        """
+        if row >= len(self._rows):
+            self.beginInsertRows(QModelIndex(), len(self._rows), row)
+            self._rows.extend([["", ""] for _ in range(len(self._rows), row + 1)])
+            self._rows[row] = [slot, value]
+            self.endInsertRows()
+        else:
+            self._rows[row] = [slot, value]
+            self.dataChanged.emit(self.index(row, 0), self.index(row, 1))
+
+    def row_count(self) -> int:
+        return len(self._rows) + len(self._hashed_rows)
+
+    def text(self, row: int, column: int) -> str:
+        if row >= len(self._rows):
+            return self._hashed_rows[row - len(self._rows)][column]
+        return self._rows[row][column]
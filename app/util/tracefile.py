@@ -0,0 +1,498 @@
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, IO, Iterator, Union
+
+from eth.abc import ComputationAPI, MessageAPI, OpcodeAPI
+from eth.vm.message import Message
+from eth.vm.opcode_values import SHA3, SSTORE
+
+from app.util.changes import ChangeChain, ChangeChainLink, HistoryStep, TableWidgetEnum, memory_delta, \
+    apply_memory_delta
+from app.util.disassembly import Disassembly, get_disassembly
+from app.util.preimages import PreimageCache
+from app.util.tracer import StepRecord, Tracer
+
+# Layout of a trace file, all integers are little endian:
+#
+#     header      MAGIC, VERSION, steps per chunk
+#     chunk 0     step records, followed by the delta block of the chunk
+#     chunk 1     ...
+#     footer      codes, call frames, storage changes, preimages of their slots and the index of the chunks
+#     trailer     offset of the footer, number of steps, MAGIC
+#
+# Every step has a fixed-width record, so the record of any step is found by its number alone. The variable-length part
+# of a step, the values it pushed onto the stack and the region of memory it changed, is stored in the delta block of its
+# chunk. Every delta block starts with the stack before the first step of the chunk, so at most one chunk of stack deltas
+# has to be replayed to restore a stack. Copies of the memory are stored at the start of a chunk once enough has been
+# written to it since the last copy, see TraceFileWriter._start_chunk().
+
+MAGIC = b"EVMTRACE"
+VERSION = 1
+# number of steps per chunk
+CHUNK_STEPS = 4096
+# a copy of the memory is stored at the start of a chunk if the memory changed since the last copy and either this many
+# chunks lie in between or at least as many bytes as the memory is large (and MIN_MEMORY_SNAPSHOT_DISTANCE) have been
+# written in between
+MEMORY_SNAPSHOT_CHUNKS = 8
+MIN_MEMORY_SNAPSHOT_DISTANCE = 64 * 1024
+
+HEADER = struct.Struct("<8sII")  # MAGIC, VERSION, CHUNK_STEPS
+TRAILER = struct.Struct("<QQ8s")  # offset of the footer, number of steps, MAGIC
+# pc, call frame, depth, opcode, flags, number of popped values, number of pushed values, gas remaining before the
+# step, gas used by the step, offset of the deltas of the step in the delta block of its chunk
+RECORD = struct.Struct("<IIHBBHHQQQ")
+# offset of the records, offset of the memory copy (0 if there is none), number of steps, number of memory changes
+CHUNK = struct.Struct("<QQII")
+# code, depth, gas, value, should_transfer_value, is_static, followed by sender, to, storage address, code address and
+# data, each of them prefixed with its length
+FRAME = struct.Struct("<IHQ32s??")
+# step, slot, previous value and value, followed by the address prefixed with its length
+STORAGE_CHANGE = struct.Struct("<Q32s32s32s")
+# hash, followed by the preimage prefixed with its length
+PREIMAGE = struct.Struct("<32s")
+MEMORY_DELTA = struct.Struct("<III")  # start, length of the data, size of the memory afterwards
+LENGTH = struct.Struct("<I")
+STACK_SIZE = struct.Struct("<H")
+
+# flags of a step record
+MEMORY_CHANGED = 1
+
+
+def _word(value: Any) -> bytes:
+    """
+    :return: A value of the py-evm stack as 32 bytes.
+    """
+    if type(value) is int:
+        return value.to_bytes(32, "big")
+    return bytes(value).rjust(32, b'\x00')
+
+
+class TraceFileWriter(Tracer):
+    """
+    Tracer that streams the executed steps into a trace file, which can be opened without executing the transaction
+    again by TraceFileReader. Only one chunk of steps is kept in memory. The file is complete once close() has been
+    called.
+    """
+
+    def __init__(self, file: Union[str, IO[bytes]]):
+        """
+        :param file: Path of the file or a file object opened for writing bytes.
+        """
+        self._owns_file = isinstance(file, str)
+        self.file = open(file, "wb") if self._owns_file else file
+        self.file.write(HEADER.pack(MAGIC, VERSION, CHUNK_STEPS))
+        self.steps = 0
+        # code -> index in self._codes
+        self._code_indices: Dict[bytes, int] = {}
+        self._codes: [bytes] = []
+        self._frames: [tuple] = []
+        # indices of the frames that are currently executed
+        self._frame_stack: [int] = []
+        self._chunks: [bytes] = []
+        self._storage_changes: [(int, bytes, int, int, int)] = []
+        # (address, slot) -> value after the last recorded change
+        self._slots: Dict[tuple, int] = {}
+        # preimages of the hashes computed during the trace, the ones needed to decode the changed slots are saved
+        self.preimages = PreimageCache()
+
+        # the chunk that is currently written
+        self._records = bytearray()
+        self._deltas = bytearray()
+        self._memory_snapshot: bytes = None
+        self._memory_changes = 0
+        # state after the last recorded step and the frame it belongs to
+        self._stack: [tuple] = []
+        self._memory = b''
+        self._frame = -1
+        # chunks since the last memory copy and bytes written to memory since then, None if the memory did not change
+        self._chunks_since_snapshot = 0
+        self._memory_written: int = None
+
+    def start_frame(self, computation: ComputationAPI, disassembly: Disassembly):
+        msg = computation.msg
+        code_index = self._code_indices.get(disassembly.code)
+        if code_index is None:
+            code_index = len(self._codes)
+            self._code_indices[disassembly.code] = code_index
+            self._codes.append(disassembly.code)
+        self._frame_stack.append(len(self._frames))
+        self._frames.append((code_index, msg.depth, msg.gas, msg.value, msg.should_transfer_value, msg.is_static,
+                             msg.sender, msg.to, msg.storage_address, msg.code_address or b'', bytes(msg.data)))
+
+    def end_frame(self, computation: ComputationAPI):
+        self._frame_stack.pop()
+
+    def step(self, computation: ComputationAPI, pc: int, opcode: int, opcode_fn: Any, gas: int):
+        if not self._records:
+            self._start_chunk()
+        frame = self._frame_stack[-1]
+        old = self._stack
+        stack = computation._stack.values
+
+        if opcode == SSTORE and self._frame == frame and len(old) >= 2:
+            # the slot and the value are the top of the stack before the step, which is the stack after the previous
+            # step of the same frame
+            address = computation.msg.storage_address
+            slot = int.from_bytes(_word(old[-1][1]), "big")
+            value = int.from_bytes(_word(old[-2][1]), "big")
+            # a failed SSTORE does not change the slot
+            if computation.state.get_storage(address, slot) == value:
+                previous = self._slots.get((address, slot))
+                if previous is None:
+                    previous = computation.state.get_storage(address, slot, from_journal=False)
+                self._slots[(address, slot)] = value
+                self._storage_changes.append((self.steps, address, slot, previous, value))
+        elif opcode == SHA3 and self._frame == frame and len(old) >= 2:
+            start = int.from_bytes(_word(old[-1][1]), "big")
+            size = int.from_bytes(_word(old[-2][1]), "big")
+            self.preimages.add(int.from_bytes(_word(stack[-1][1]), "big"),
+                               bytes(computation._memory._bytes[start:start + size]))
+
+        common = min(len(old), len(stack))
+        # instructions only touch the top of the stack, so the common part is found after a few tries
+        while old[:common] != stack[:common]:
+            common -= 1
+        offset = len(self._deltas)
+        for _, v in stack[common:]:
+            self._deltas += _word(v)
+        self._stack = list(stack)
+        self._frame = frame
+
+        flags = 0
+        memory = computation._memory._bytes
+        if len(memory) != len(self._memory) or memory != self._memory:
+            memory = bytes(memory)
+            start, data = memory_delta(self._memory, memory)
+            self._deltas += MEMORY_DELTA.pack(start, len(data), len(memory))
+            self._deltas += data
+            self._memory = memory
+            self._memory_written = (self._memory_written or 0) + len(data)
+            self._memory_changes += 1
+            flags |= MEMORY_CHANGED
+
+        self._records += RECORD.pack(pc, frame, computation.msg.depth, opcode, flags, len(old) - common,
+                                     len(stack) - common, gas, gas - computation.get_gas_remaining(), offset)
+        self.steps += 1
+        if len(self._records) == CHUNK_STEPS * RECORD.size:
+            self._write_chunk()
+
+    def close(self):
+        """
+        Writes the last chunk and the footer.
+        """
+        if self._records:
+            self._write_chunk()
+        footer = bytearray()
+        footer += LENGTH.pack(len(self._codes))
+        for code in self._codes:
+            footer += LENGTH.pack(len(code)) + code
+        footer += LENGTH.pack(len(self._frames))
+        for frame in self._frames:
+            footer += FRAME.pack(*frame[:3], frame[3].to_bytes(32, "big"), *frame[4:6])
+            for field in frame[6:]:
+                footer += LENGTH.pack(len(field)) + field
+        footer += LENGTH.pack(len(self._storage_changes))
+        for step, address, slot, previous, value in self._storage_changes:
+            footer += STORAGE_CHANGE.pack(step, slot.to_bytes(32, "big"), previous.to_bytes(32, "big"),
+                                          value.to_bytes(32, "big"))
+            footer += LENGTH.pack(len(address)) + address
+        preimages = {}
+        for _, _, slot, _, _ in self._storage_changes:
+            preimages.update(self.preimages.used_preimages(slot))
+        footer += LENGTH.pack(len(preimages))
+        for digest, preimage in preimages.items():
+            footer += PREIMAGE.pack(digest.to_bytes(32, "big"))
+            footer += LENGTH.pack(len(preimage)) + preimage
+        footer += LENGTH.pack(len(self._chunks))
+        for chunk in self._chunks:
+            footer += chunk
+
+        offset = self.file.tell()
+        self.file.write(footer)
+        self.file.write(TRAILER.pack(offset, self.steps, MAGIC))
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def _start_chunk(self):
+        """
+        Starts the delta block of a new chunk with the current stack and decides whether to store a copy of the memory.
+        """
+        self._deltas += STACK_SIZE.pack(len(self._stack))
+        for _, v in self._stack:
+            self._deltas += _word(v)
+        self._memory_snapshot = None
+        self._chunks_since_snapshot += 1
+        if self._memory_written is not None and (
+                self._chunks_since_snapshot >= MEMORY_SNAPSHOT_CHUNKS or
+                self._memory_written >= max(len(self._memory), MIN_MEMORY_SNAPSHOT_DISTANCE)):
+            self._memory_snapshot = self._memory
+            self._chunks_since_snapshot = 0
+            self._memory_written = None
+
+    def _write_chunk(self):
+        offset = self.file.tell()
+        self.file.write(self._records)
+        self.file.write(self._deltas)
+        snapshot = 0
+        if self._memory_snapshot is not None:
+            snapshot = self.file.tell()
+            self.file.write(LENGTH.pack(len(self._memory_snapshot)))
+            self.file.write(self._memory_snapshot)
+        self._chunks.append(CHUNK.pack(offset, snapshot, len(self._records) // RECORD.size, self._memory_changes))
+        self._records = bytearray()
+        self._deltas = bytearray()
+        self._memory_changes = 0
+
+
+class TraceFileReader:
+    """
+    Reads a trace file written by TraceFileWriter. The file is memory-mapped, only the footer is read when the file is
+    opened, every step is read from the mapping when it is requested. It offers the same methods as the History, so the
+    debugger can show a trace the same way as the last debugged transaction.
+    """
+
+    def __init__(self, path: str, opcodes: Dict[int, OpcodeAPI] = None):
+        """
+        :param path: Path of the trace file.
+        :param opcodes: The opcode lookup that is used to name the opcodes of the trace and that is passed along with
+        the disassemblies.
+        :raise ValueError: If the file is no (complete) trace file.
+        """
+        self.opcodes = opcodes
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("{p} is empty".format(p=path))
+        self._view = memoryview(self._mmap)
+        try:
+            self._read_footer(path)
+        except (ValueError, struct.error):
+            self.close()
+            raise
+        # step, stack and memory of the last seek()
+        self._cursor: (int, [tuple], bytes) = None
+        self._messages: Dict[int, MessageAPI] = {}
+
+    def _read_footer(self, path: str):
+        view = self._view
+        if len(view) < HEADER.size + TRAILER.size:
+            raise ValueError("{p} is no trace file".format(p=path))
+        magic, version, self.chunk_steps = HEADER.unpack_from(view, 0)
+        footer, self.steps, end = TRAILER.unpack_from(view, len(view) - TRAILER.size)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{p} is no trace file of version {v}".format(p=path, v=VERSION))
+        if end != MAGIC:
+            raise ValueError("{p} is incomplete, the trace has not been closed".format(p=path))
+
+        def read_bytes() -> bytes:
+            nonlocal pos
+            length, = LENGTH.unpack_from(view, pos)
+            pos += LENGTH.size + length
+            return bytes(view[pos - length:pos])
+
+        def read_count() -> int:
+            nonlocal pos
+            pos += LENGTH.size
+            return LENGTH.unpack_from(view, pos - LENGTH.size)[0]
+
+        pos = footer
+        self.codes: [bytes] = [read_bytes() for _ in range(read_count())]
+        self.frames: [tuple] = []
+        for _ in range(read_count()):
+            code, depth, gas, value, transfer, static = FRAME.unpack_from(view, pos)
+            pos += FRAME.size
+            self.frames.append((code, depth, gas, int.from_bytes(value, "big"), transfer, static) +
+                               tuple(read_bytes() for _ in range(5)))
+
+        # (address, slot) -> (steps that changed the slot, values after these steps, value before the first step), the
+        # slots and values are formatted like those of the History
+        self._storage: Dict[tuple, (array, [str], str)] = {}
+        self.storage: Dict[int, list] = {}
+        for _ in range(read_count()):
+            step, slot, previous, value = STORAGE_CHANGE.unpack_from(view, pos)
+            pos += STORAGE_CHANGE.size
+            address = read_bytes()
+            slot, previous, value = (hex(int.from_bytes(v, "big")) for v in (slot, previous, value))
+            steps, values, _ = self._storage.setdefault((address, slot), (array("Q"), [], previous))
+            steps.append(step)
+            values.append(value)
+            self.storage.setdefault(step, []).append((address, slot, previous, value))
+
+        # (hash, preimage) of the hashes the changed slots are derived from, see PreimageCache.used_preimages()
+        self.preimages: [(int, bytes)] = []
+        for _ in range(read_count()):
+            digest, = PREIMAGE.unpack_from(view, pos)
+            pos += PREIMAGE.size
+            self.preimages.append((int.from_bytes(digest, "big"), read_bytes()))
+
+        self._chunks: [(int, int, int, int)] = []
+        # per chunk the index of the last chunk up to it that starts with a copy of the memory, -1 if there is none
+        self._memory_snapshot_chunks = array("q")
+        for _ in range(read_count()):
+            chunk = CHUNK.unpack_from(view, pos)
+            pos += CHUNK.size
+            self._chunks.append(chunk)
+            last = self._memory_snapshot_chunks[-1] if self._memory_snapshot_chunks else -1
+            self._memory_snapshot_chunks.append(len(self._chunks) - 1 if chunk[1] else last)
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.steps
+
+    def record(self, step: int) -> StepRecord:
+        """
+        :return: The record of the given step, without stack and memory.
+        """
+        if not 0 <= step < self.steps:
+            raise IndexError("step {s} is not part of the trace".format(s=step))
+        records = self._chunks[step // self.chunk_steps][0]
+        return self._step_record(RECORD.unpack_from(self._view, records + step % self.chunk_steps * RECORD.size))
+
+    def records(self, first: int = 0, last: int = None) -> Iterator[StepRecord]:
+        """
+        :return: The records of the steps first to last (inclusive, the last step by default), without stack and
+        memory.
+        """
+        last = self.steps - 1 if last is None else min(last, self.steps - 1)
+        for c in range(first // self.chunk_steps, last // self.chunk_steps + 1 if first <= last else 0):
+            records, _, count, _ = self._chunks[c]
+            lo = max(first - c * self.chunk_steps, 0)
+            hi = min(last - c * self.chunk_steps + 1, count)
+            for r in RECORD.iter_unpack(self._view[records + lo * RECORD.size:records + hi * RECORD.size]):
+                yield self._step_record(r)
+
+    def _step_record(self, r: tuple) -> StepRecord:
+        pc, _, depth, opcode, _, _, _, gas, gas_cost, _ = r
+        opcode_fn = self.opcodes.get(opcode) if self.opcodes is not None else None
+        return StepRecord(depth, pc, opcode, opcode_fn.mnemonic if opcode_fn is not None else None, gas, gas_cost,
+                          None, None)
+
+    def get_init(self, step: int) -> (Disassembly, Dict[int, OpcodeAPI], MessageAPI):
+        """
+        :return: Disassembly, opcodes and message of the call frame that executes the given step.
+        """
+        records = self._chunks[step // self.chunk_steps][0]
+        frame = RECORD.unpack_from(self._view, records + step % self.chunk_steps * RECORD.size)[1]
+        message = self._messages.get(frame)
+        if message is None:
+            code, depth, gas, value, transfer, static, sender, to, storage_address, code_address, data = \
+                self.frames[frame]
+            message = Message(gas, to, sender, value, data, self.codes[code], depth, create_address=storage_address,
+                              code_address=code_address or None, should_transfer_value=transfer, is_static=static)
+            self._messages[frame] = message
+        return get_disassembly(message.code), self.opcodes, message
+
+    def get_stack(self, step: int) -> [tuple]:
+        """
+        :return: The stack after the given step.
+        """
+        c = step // self.chunk_steps
+        stack = self._stack_snapshot(c)
+        self._replay(stack, None, c * self.chunk_steps, step)
+        return stack
+
+    def get_memory(self, step: int) -> bytes:
+        """
+        :return: The memory after the given step.
+        """
+        s = self._memory_snapshot_chunks[step // self.chunk_steps]
+        if s < 0:
+            return self._replay(None, b'', 0, step)
+        snapshot = self._chunks[s][1]
+        length, = LENGTH.unpack_from(self._view, snapshot)
+        memory = bytes(self._view[snapshot + LENGTH.size:snapshot + LENGTH.size + length])
+        return self._replay(None, memory, s * self.chunk_steps, step)
+
+    def get_storage(self, step: int) -> Dict[tuple, str]:
+        """
+        :return: (address, slot) -> value after the given step, for every slot that is changed during the trace.
+        """
+        storage = {}
+        for key, (steps, values, previous) in self._storage.items():
+            i = bisect_right(steps, step) - 1
+            storage[key] = values[i] if i >= 0 else previous
+        return storage
+
+    def get_storage_changes(self, step: int) -> [(bytes, str, str, str)]:
+        """
+        :return: The storage changes of the given step as (address, slot, previous value, value).
+        """
+        return self.storage.get(step, [])
+
+    def seek(self, step: int) -> HistoryStep:
+        """
+        Restores everything that is known about the given step, see History.seek(). Seeking forward by less than a
+        chunk only replays the steps in between.
+
+        :return: The step and the state after its computation.
+        """
+        if not 0 <= step < self.steps:
+            raise IndexError("step {s} is not part of the trace".format(s=step))
+        if self._cursor is not None and self._cursor[0] <= step < self._cursor[0] + self.chunk_steps:
+            last, stack, memory = self._cursor
+            stack = list(stack)
+            memory = self._replay(stack, memory, last + 1, step)
+        else:
+            stack = self.get_stack(step)
+            memory = self.get_memory(step)
+        self._cursor = (step, stack, memory)
+        disassembly, opcodes, message = self.get_init(step)
+        record = self.record(step)
+        chain = ChangeChain(ChangeChainLink(TableWidgetEnum.OPCODES, [disassembly.row_of(record.pc)], []))
+        return HistoryStep(step, disassembly, opcodes, message, chain, record.gas, record.pc, record.gas_cost,
+                           list(stack), memory, self.get_storage(step))
+
+    def _stack_snapshot(self, chunk: int) -> [tuple]:
+        """
+        :return: The stack before the first step of the given chunk.
+        """
+        records, _, count, _ = self._chunks[chunk]
+        deltas = records + count * RECORD.size
+        size, = STACK_SIZE.unpack_from(self._view, deltas)
+        start = deltas + STACK_SIZE.size
+        return [(int, int.from_bytes(self._view[p:p + 32], "big")) for p in range(start, start + size * 32, 32)]
+
+    def _replay(self, stack: [tuple], memory: bytes, first: int, last: int) -> bytes:
+        """
+        Applies the changes of the steps first to last (inclusive) to the given stack and memory. Either of them may be
+        None to restore only the other one, chunks without memory changes are skipped if only the memory is restored.
+
+        :return: The memory after the last step.
+        """
+        view = self._view
+        for c in range(first // self.chunk_steps, last // self.chunk_steps + 1 if first <= last else 0):
+            records, _, count, memory_changes = self._chunks[c]
+            if stack is None and not memory_changes:
+                continue
+            deltas = records + count * RECORD.size
+            lo = max(first - c * self.chunk_steps, 0)
+            hi = min(last - c * self.chunk_steps + 1, count)
+            for r in RECORD.iter_unpack(view[records + lo * RECORD.size:records + hi * RECORD.size]):
+                flags, pops, pushes, offset = r[4], r[5], r[6], deltas + r[9]
+                if stack is not None:
+                    if pops:
+                        del stack[-pops:]
+                    for p in range(offset, offset + pushes * 32, 32):
+                        stack.append((int, int.from_bytes(view[p:p + 32], "big")))
+                if memory is not None and flags & MEMORY_CHANGED:
+                    p = offset + pushes * 32
+                    start, length, size = MEMORY_DELTA.unpack_from(view, p)
+                    p += MEMORY_DELTA.size
+                    memory = apply_memory_delta(memory, start, bytes(view[p:p + length]), size)
+        return memory
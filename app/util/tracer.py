@@ -0,0 +1,128 @@
+import json
+from collections import namedtuple
+from typing import Any, Generator, IO, Union
+
+from eth.abc import ComputationAPI
+
+from app.util.disassembly import Disassembly
+
+# one executed instruction. gas is the gas remaining before the instruction, stack (bottom first) and memory are the
+# state after it, they are None if the TraceRecorder does not record them
+StepRecord = namedtuple("StepRecord", ["depth", "pc", "opcode", "mnemonic", "gas", "gas_cost", "stack", "memory"])
+
+
+class Tracer:
+    """
+    Observes the execution of a transaction without the GUI. MyComputation calls the hooks of the tracer that is passed
+    to the EVMHandler with the tracer keyword argument (in MODE_NONE), for every call frame and every executed
+    instruction. Subclasses override the hooks they are interested in.
+    """
+
+    def start_frame(self, computation: ComputationAPI, disassembly: Disassembly):
+        """
+        Called before the code of a call frame is executed.
+        """
+        pass
+
+    def step(self, computation: ComputationAPI, pc: int, opcode: int, opcode_fn: Any, gas: int):
+        """
+        Called after every executed instruction, including the one that halted or failed the frame. The instructions
+        of a called frame are executed (and reported) during the CALL instruction, i.e. before the CALL itself.
+
+        :param pc: The position of the instruction.
+        :param opcode: The opcode of the instruction.
+        :param opcode_fn: The opcode as it is found in the opcode lookup of the computation.
+        :param gas: The gas remaining before the instruction.
+        """
+        pass
+
+    def end_frame(self, computation: ComputationAPI):
+        """
+        Called after the code of a call frame has been executed.
+        """
+        pass
+
+
+class TraceRecorder(Tracer):
+    """
+    Tracer that turns every executed instruction into a StepRecord and writes it to a sink.
+    """
+
+    def __init__(self, sink, stack: bool = True, memory: bool = False):
+        """
+        :param sink: Receives the records, see ListSink, FileSink and GeneratorSink.
+        :param stack: Whether to record the stack after each step.
+        :param memory: Whether to record the memory after each step.
+        """
+        self.sink = sink
+        self.stack = stack
+        self.memory = memory
+
+    def step(self, computation: ComputationAPI, pc: int, opcode: int, opcode_fn: Any, gas: int):
+        stack = None
+        if self.stack:
+            stack = [v if t is int else int.from_bytes(v, "big") for t, v in computation._stack.values]
+        memory = bytes(computation._memory._bytes) if self.memory else None
+        self.sink.write(StepRecord(computation.msg.depth, pc, opcode, opcode_fn.mnemonic, gas,
+                                   gas - computation.get_gas_remaining(), stack, memory))
+
+    def close(self):
+        self.sink.close()
+
+
+class ListSink:
+    """
+    Keeps the records in a list.
+    """
+
+    def __init__(self):
+        self.records: [StepRecord] = []
+
+    def write(self, record: StepRecord):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """
+    Writes the records to a file, one JSON object per line. Memory is written as hex string.
+    """
+
+    def __init__(self, file: Union[str, IO[str]]):
+        """
+        :param file: Path of the file or a file object opened for writing text.
+        """
+        self._owns_file = isinstance(file, str)
+        self.file = open(file, "w") if self._owns_file else file
+
+    def write(self, record: StepRecord):
+        d = record._asdict()
+        if record.memory is not None:
+            d["memory"] = record.memory.hex()
+        self.file.write(json.dumps(d) + "\n")
+
+    def close(self):
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class GeneratorSink:
+    """
+    Sends the records into a generator, which receives them with `record = yield`. The generator is closed together
+    with the sink.
+    """
+
+    def __init__(self, generator: Generator[None, StepRecord, None]):
+        self.generator = generator
+        # run the generator up to its first yield
+        next(self.generator)
+
+    def write(self, record: StepRecord):
+        self.generator.send(record)
+
+    def close(self):
+        self.generator.close()
@@ -1,7 +1,15 @@
 import json
+import logging
 from collections import namedtuple
+from typing import Any, Callable, Dict, Tuple, Union
+
+from eth_abi.encoding import TupleEncoder
+from eth_abi.registry import registry
 from eth_typing import Address
 from eth.vm.opcode_values import *
+from sha3 import keccak_256
+
+logger = logging.getLogger(__name__)
 
 # list of opcodes that call code from another contract
 ADDRESS_CALLING_OPCODES = [CALL, CALLCODE, STATICCALL, DELEGATECALL]
@@ -12,6 +20,12 @@ ADDRESS_READING_OPCODES = [BALANCE, EXTCODESIZE, EXTCODECOPY, EXTCODEHASH, SELFD
 # list of opcodes that write addresses onto the top of the stack
 ADDRESS_CREATING_OPCODES = [CREATE, CREATE2]
 
+# signature of the custom function that passes raw data to a contract, see MyContract
+RAW_DATA_SIGNATURE = "rawdata(any)"
+
+# an element of the py-evm stack as (type, value), e.g. (int, 1) or (bytes, b'\x01')
+StackItem = Tuple[type, Union[int, bytes]]
+
 # debug modes
 MODE_NONE = 0  # transaction is just sent and mined
 MODE_DEBUG = 1  # user is able to step through the computation steps
@@ -74,27 +88,138 @@ class MyContract(MyAddress):
         for func in self.functions:
             self.signatures.append(func.name + "(" + ",".join("{}".format(i.type) for i in func.inputs) + ")")
 
+        # compile the encoders up front, so that calling a function does not have to parse its signature again
+        for signature in self.signatures:
+            if signature != RAW_DATA_SIGNATURE:
+                try:
+                    get_function_encoder(signature)
+                except ValueError as e:
+                    # types that are not supported by the encoder will raise again once the function is called
+                    logger.info("Could not compile encoder for {s}: {e}".format(s=signature, e=e))
+
     def get_function_params(self, i: int) -> []:
         return self.functions[i].inputs
 
 
-def get_stack_content(stack: [], n: int) -> []:
+class FunctionEncoder:
+    """
+    Compiled encoder for a single function signature. Holds the 4 byte selector, the parsed parameter types, one
+    converter per parameter which turns the user input into a python value and the abi encoder for all parameters.
+    Instances are cached per signature, see get_function_encoder().
+    """
+    def __init__(self, signature: str):
+        self.signature = signature
+        self.selector = keccak_256(signature.encode("utf-8")).digest()[:4]
+        inputs = signature[signature.index("(") + 1:-1]
+        self.types = inputs.split(",") if inputs != "" else []
+        self.converters = [_get_converter(t) for t in self.types]
+        self.encoder = TupleEncoder(encoders=[registry.get_encoder(t) for t in self.types])
+
+    def encode(self, function_params: [{}]) -> bytes:
+        """
+        :param function_params: Function params as parsed by json. Each param is a dictionary which holds the user
+        input under the key "value".
+        :return: The selector followed by the abi encoded params.
+        """
+        if len(function_params) != len(self.types):
+            raise ValueError("{s} expects {n} parameters, got {m}".format(s=self.signature, n=len(self.types),
+                                                                         m=len(function_params)))
+        args = [convert(param.get("value")) for convert, param in zip(self.converters, function_params)]
+        return self.encode_values(args)
+
+    def encode_values(self, args: []) -> bytes:
+        """
+        :param args: The already converted python values of the params.
+        :return: The selector followed by the abi encoded params.
+        """
+        return self.selector + self.encoder(args)
+
+
+_function_encoders: Dict[str, FunctionEncoder] = {}
+
+
+def get_function_encoder(signature: str) -> FunctionEncoder:
+    """
+    :param signature: The signature of a function. Example: setValue(uint256)
+    :return: The cached FunctionEncoder of the signature. It is compiled if it has not been requested before.
+    """
+    encoder = _function_encoders.get(signature)
+    if encoder is None:
+        encoder = FunctionEncoder(signature)
+        _function_encoders[signature] = encoder
+    return encoder
+
+
+def _parse_bool(value: str) -> bool:
+    return False if value in ["", "0", "false", "False", "F"] else True
+
+
+def _get_converter(_type: str) -> Callable[[str], Any]:
+    """
+    :param _type: The abi type of a param.
+    :return: A function which converts the user input of a param of the given type into a value that can be encoded.
+    """
+    if _type == "address":
+        return lambda value: value
+    elif _type == "bool":
+        return _parse_bool
+    elif "byte" in _type:
+        size = ''.join(list(filter(str.isdigit, _type)))
+        bytesize = int('32' if size == '' else size)
+
+        def convert_bytes(value: str):
+            parsed = json2obj(value)
+            if type(parsed) == int:
+                parsed = parsed.to_bytes(bytesize, "little")
+            elif type(parsed) == list:
+                parsed = b''.join(i.to_bytes(bytesize, "little") for i in parsed)
+            return parsed
+
+        return convert_bytes
+    else:
+        return json2obj
+
+
+def get_stack_ints(stack: [], n: int) -> [int]:
     """
     :param stack: The stack object as it is used by py-evm. This should be an array of Tuples which consists of the type
     and value of the element. Example: [Tuple(int, 1), Tuple(bytes, b'\x00'] would be a stack with 2 elements.
     :param n: The number of elements to retrieve.
+    :return: The top n elements of the stack as ints, the top of the stack first. Bytes are read as big endian numbers,
+        just like the EVM does.
+    """
+    return [value if value_type is int else int.from_bytes(value, "big") for value_type, value in stack[:-n - 1:-1]]
+
+
+def stack_item_to_int(item: StackItem) -> int:
+    """
+    :param item: An element of the py-evm stack.
+    :return: The value as int, bytes are read as big endian number.
+    """
+    value_type, value = item
+    return value if value_type is int else int.from_bytes(value, "big")
+
+
+def format_stack_item(item: StackItem) -> str:
+    """
+    :param item: An element of the py-evm stack as (type, value) tuple.
+    :return: The value as hex string prepended with "0x". Bytes keep their leading zeroes.
+    """
+    value_type, value = item
+    if value_type is int:
+        return hex(value)
+    return "0x" + value.hex()
+
+
+def get_stack_content(stack: [], n: int) -> []:
+    """
+    :param stack: The stack object as it is used by py-evm, see get_stack_ints().
+    :param n: The number of elements to retrieve.
     :return: An array of length containing the first n elements of the stack, converted to a string and prepended
-        with "0x".
-    """
-    size = len(stack)
-    result = []
-    for i in range(0, n):
-        if stack[size - (i + 1)][0] is int:
-            val = hex(stack[size - (i + 1)][1])
-        else:
-            val = "0x" + stack[size - (i + 1)][1].hex()
-        result.append(val)
-    return result
+        with "0x". Use get_stack_ints() to calculate with the values and format_stack_item() to only format what is
+        shown.
+    """
+    return [format_stack_item(item) for item in stack[:-n - 1:-1]]
 
 
 def hex2(n):
@@ -1,11 +1,12 @@
 import logging
 
 from PyQt5.QtCore import pyqtSlot, QObject, pyqtSignal, QRunnable
-from eth.abc import CodeStreamAPI, MessageAPI
+from eth.abc import MessageAPI
 from eth_abi.exceptions import ValueOutOfBounds, EncodingTypeError
 from eth_utils import ValidationError
 
 from app.util.changes import ChangeChain
+from app.util.disassembly import Disassembly
 
 logger = logging.getLogger(__name__)
 
@@ -23,11 +24,14 @@ class WorkerSignals(QObject):
         The worker thread will emit this signal sending the current stack, memory, program counter and previously used
         gas.
     init_debug_session:
-        The worker emits a signal containing the code stream object which contains all the bytecode to be executed;
+        The worker emits a signal containing the (cached) disassembly of the bytecode to be executed;
         a dictionary to lookup opcodes and their corresponding mnemonic amongst other things;
         a MessageAPI object that contains every relevant message related data.
-    set_storage = pyqtSignal(bytes, str, str):
-        A signal that tells the main thread to set the storage at a given address and slot to a given value.
+    steps:
+        In MODE_DEBUG_AUTO the worker thread collects the pre and post computation information of several steps and
+        emits them at once as a list of step records (see STEP_PRE, STEP_POST and STEP_STORAGE in changes.py). The
+        storage changes are sent this way in MODE_DEBUG as well. New storage slots are not signaled at all, the main
+        thread takes them from the StorageMirror that is passed to the worker.
     contract_created = pyqtSignal(bytes)
         A signal that tells the main thread that a contract has been created and returns its adress.
     transaction_sent = pyqtSignal()
@@ -41,8 +45,8 @@ class WorkerSignals(QObject):
     add_chain = pyqtSignal(ChangeChain)
     pre_computation = pyqtSignal(int, int)
     post_computation = pyqtSignal(list, bytearray, int, int)
-    init_debug_session = pyqtSignal(CodeStreamAPI, dict, MessageAPI)
-    set_storage = pyqtSignal(bytes, str, str)
+    init_debug_session = pyqtSignal(Disassembly, dict, MessageAPI)
+    steps = pyqtSignal(list)
     contract_created = pyqtSignal(bytes)
     transaction_sent = pyqtSignal()
     abort = pyqtSignal()
@@ -81,8 +85,8 @@ class BaseWorker(QRunnable):
         self.kwargs['pre_computation'] = self.signals.pre_computation
         self.kwargs['post_computation'] = self.signals.post_computation
         self.kwargs['init_debug_session'] = self.signals.init_debug_session
+        self.kwargs['steps'] = self.signals.steps
         self.kwargs['add_chain'] = self.signals.add_chain
-        self.kwargs['set_storage'] = self.signals.set_storage
         self.kwargs['contract_created'] = self.signals.contract_created
         self.kwargs['transaction_sent'] = self.signals.transaction_sent
         self.kwargs['abort'] = self.signals.abort
@@ -0,0 +1,259 @@
+"""
+Benchmarks of the throughput of the EVMHandler and the latency of the debugger, using the compiled test contracts.
+
+The benchmarks are skipped unless the environment variable EVM_BENCHMARK is set, so that the default test run stays
+fast and does not depend on timing. Every benchmark repeats its operation for at least DURATION seconds. The results are
+printed and, if the environment variable EVM_BENCHMARK_JSON is set, written to that file, so that the results of
+different commits can be compared:
+
+    export EVM_BENCHMARK=1
+    EVM_BENCHMARK_JSON=before.json pytest -s tests/core/test_benchmark.py
+    EVM_BENCHMARK_JSON=after.json EVM_BENCHMARK_BASELINE=before.json pytest -s tests/core/test_benchmark.py
+
+If EVM_BENCHMARK_BASELINE is set, the benchmarks fail if a result is worse than the one of the baseline by more than
+EVM_BENCHMARK_TOLERANCE (0.25 by default, i.e. 25%).
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from unittest import TestCase, skipUnless
+
+from app.evmhandler import EVMHandler
+from app.util.changes import History, STEP_PRE, STEP_POST
+from app.util.util import MODE_NONE, MODE_DEBUG, MODE_DEBUG_AUTO
+from tests.core.test_contracts import get_contract
+
+ENABLED = bool(os.environ.get("EVM_BENCHMARK"))
+# minimal time in seconds every benchmark runs for
+DURATION = float(os.environ.get("EVM_BENCHMARK_DURATION", "0.25"))
+RESULTS_PATH = os.environ.get("EVM_BENCHMARK_JSON")
+BASELINE_PATH = os.environ.get("EVM_BENCHMARK_BASELINE")
+TOLERANCE = float(os.environ.get("EVM_BENCHMARK_TOLERANCE", "0.25"))
+
+# name -> {"value", "unit", "rounds", "higher_is_better"} of every benchmark that has been run
+results = {}
+
+
+def record(name: str, value: float, unit: str, rounds: int, higher_is_better: bool):
+    """
+    Stores the result of a benchmark and rewrites the results file, if there is one.
+    """
+    results[name] = {"value": value, "unit": unit, "rounds": rounds, "higher_is_better": higher_is_better}
+    print("{n}: {v:.1f} {u} ({r} rounds)".format(n=name, v=value, u=unit, r=rounds))
+    if RESULTS_PATH:
+        with open(RESULTS_PATH, "w") as f:
+            json.dump({"commit": _commit(), "python": platform.python_version(), "timestamp": int(time.time()),
+                       "duration": DURATION, "results": results}, f, indent=2, sort_keys=True)
+
+
+def compare(baseline: dict, current: dict, tolerance: float = TOLERANCE) -> [str]:
+    """
+    :param baseline: The results of a previous run, as written to EVM_BENCHMARK_JSON.
+    :param current: The results of this run, see results.
+    :return: A description of every result that is worse than in the baseline by more than the tolerance.
+    """
+    regressions = []
+    for name, result in current.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None or old["value"] <= 0 or result["value"] <= 0:
+            continue
+        ratio = result["value"] / old["value"]
+        if (ratio < 1 - tolerance) if result["higher_is_better"] else (ratio > 1 + tolerance):
+            regressions.append("{n}: {o:.1f} -> {v:.1f} {u}".format(n=name, o=old["value"], v=result["value"],
+                                                                     u=result["unit"]))
+    return regressions
+
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(fn, setup=None, min_rounds: int = 3) -> (float, int):
+    """
+    Calls fn until DURATION has passed and it has been called at least min_rounds times. Only fn is timed, setup is
+    called untimed before every round.
+
+    :return: The seconds fn took on average and the number of rounds.
+    """
+    rounds = 0
+    elapsed = 0.0
+    while elapsed < DURATION or rounds < min_rounds:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed += time.perf_counter() - start
+        rounds += 1
+    return elapsed / rounds, rounds
+
+
+class _Signal:
+    def __init__(self, callback=None):
+        self.callback = callback
+
+    def emit(self, *args):
+        if self.callback is not None:
+            self.callback(*args)
+
+
+class _Unlocked:
+    """
+    Stands in for the locks and the semaphore that make the worker wait for the GUI, which are never taken here.
+    """
+
+    def acquire(self, *args) -> bool:
+        return True
+
+    def release(self, *args):
+        pass
+
+
+class HeadlessDebugger:
+    """
+    Plays the part of the GUI in a debug session: every step the execution sends is recorded into a History right away
+    on the same thread, and the execution never waits for a user. This measures the cost of debugging on the side of
+    the execution and the History, without drawing anything.
+    """
+
+    def __init__(self):
+        self.history = History()
+        self._chain = None
+        unlocked = _Unlocked()
+        self.kwargs = dict(
+            init_debug_session=_Signal(self.history.add_init), init_lock=unlocked, step_lock=unlocked,
+            step_semaphore=unlocked, step_duration=0, abort=_Signal(), add_chain=_Signal(self._add_chain),
+            pre_computation=_Signal(self._pre_computation), post_computation=_Signal(self.history.add_post_computation),
+            steps=_Signal(self._steps)
+        )
+
+    def _add_chain(self, chain):
+        self._chain = chain
+
+    def _pre_computation(self, gas_remaining: int, pc: int):
+        self.history.add_pre_computation(self._chain, gas_remaining, pc)
+
+    def _steps(self, steps: [tuple]):
+        for step in steps:
+            if step[0] == STEP_PRE:
+                self.history.add_pre_computation(step[1], step[2], step[3])
+            elif step[0] == STEP_POST:
+                self.history.add_post_computation(step[1], step[2], step[3], step[4])
+            else:
+                _, addr, slot, value = step
+                self.history.add_storage(addr, hex(slot), hex(value))
+
+
+@skipUnless(ENABLED, "set EVM_BENCHMARK to run the benchmarks")
+class TestBenchmark(TestCase):
+    # (contract, function, params, value) of the calls that are benchmarked, the contracts are created beforehand
+    calls = [
+        ("Call", "increment()", [], 0),
+        ("Factory", "createContract(bytes32)", [{"type": "bytes32", "value": "65"}], 0),
+        ("DelegateFront", "setVar(uint256)", [{"type": "uint256", "value": "3"}], 0),
+        ("Event", "call()", [], 0),
+        ("Types", "setOneMapping(address,uint256)",
+         [{"type": "address", "value": "0x" + "12" * 20}, {"type": "uint256", "value": "5"}], 0),
+        ("Payable", "a()", [], 1),
+    ]
+    creations = ["Call", "Factory", "Creation", "DelegateBase", "DelegateFront", "Event", "Types", "Payable"]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if BASELINE_PATH and results:
+            with open(BASELINE_PATH) as f:
+                regressions = compare(json.load(f), results)
+            assert not regressions, "Regressions compared to {b}: {r}".format(b=BASELINE_PATH, r=regressions)
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.evm_handler = EVMHandler()
+        self.contracts = {}
+        for name in ("Call", "Factory", "DelegateBase", "DelegateFront", "Event", "Types"):
+            self.contracts[name] = self.evm_handler.create_contract(get_contract(name).bytecode.object)
+        self.contracts["Payable"] = self.evm_handler.create_contract(get_contract("Payable").bytecode.object, 1)
+        base = {"type": "address", "value": "0x" + self.contracts["DelegateBase"].hex()}
+        self.evm_handler.call_contract_function(self.contracts["DelegateFront"], "setBase(address)", [base])
+
+    def test_send_wei(self):
+        seconds, rounds = measure(lambda: self.evm_handler.send_wei(b'\x01' * 20, 1))
+        record("send_wei", 1 / seconds, "tx/s", rounds, True)
+
+    def test_create_contract(self):
+        for name in self.creations:
+            code = get_contract(name).bytecode.object
+            seconds, rounds = measure(lambda: self.evm_handler.create_contract(code, 1 if name == "Payable" else 0))
+            record("create_contract." + name, 1 / seconds, "tx/s", rounds, True)
+
+    def test_call_contract_function(self):
+        """
+        Every call starts from the same state, so that calls that change the state (e.g. increment() which recurses
+        until a counter reaches 10) do the same work every time.
+        """
+        snapshot = self.evm_handler.snapshot()
+        for name, function, params, value in self.calls:
+            address = self.contracts[name]
+            seconds, rounds = measure(
+                lambda: self.evm_handler.call_contract_function(address, function, params, MODE_NONE, value),
+                lambda: self.evm_handler.revert(snapshot))
+            record("call_contract_function." + name, 1 / seconds, "tx/s", rounds, True)
+
+    def test_debug_step_latency(self):
+        """
+        Latency of a step of a debugged transaction, from the execution until it is recorded into the History. The
+        steps of MODE_DEBUG are sent one by one, those of MODE_DEBUG_AUTO in batches.
+        """
+        snapshot = self.evm_handler.snapshot()
+        for mode, mode_name in ((MODE_DEBUG, "debug"), (MODE_DEBUG_AUTO, "debug_auto")):
+            debuggers = []
+
+            def setup():
+                self.evm_handler.revert(snapshot)
+                debuggers.append(HeadlessDebugger())
+
+            def run():
+                self.evm_handler.call_contract_function(self.contracts["Call"], "increment()", [], mode, 0,
+                                                        **debuggers[-1].kwargs)
+
+            seconds, rounds = measure(run, setup)
+            steps = len(debuggers[-1].history)
+            assert steps > 1000
+            record("debug_step_latency." + mode_name, seconds / steps * 1e6, "us/step", rounds, False)
+
+    def test_history_memory(self):
+        """
+        Peak memory allocated while a debugged transaction is recorded into the History, and the memory the History
+        keeps per step afterwards.
+        """
+        debugger = HeadlessDebugger()
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            self.evm_handler.call_contract_function(self.contracts["Call"], "increment()", [], MODE_DEBUG_AUTO, 0,
+                                                    **debugger.kwargs)
+            after, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        steps = len(debugger.history)
+        assert steps > 1000
+        record("history_memory.peak", (peak - before) / 1024, "KiB", 1, False)
+        record("history_memory.per_step", (after - before) / steps, "B/step", 1, False)
+
+
+class TestCompare(TestCase):
+
+    def test_compare(self):
+        baseline = {"results": {"a": {"value": 100, "unit": "tx/s", "higher_is_better": True},
+                                "b": {"value": 10, "unit": "us/step", "higher_is_better": False}}}
+        assert compare(baseline, {"a": {"value": 90, "unit": "tx/s", "higher_is_better": True},
+                                  "b": {"value": 11, "unit": "us/step", "higher_is_better": False}}) == []
+        assert len(compare(baseline, {"a": {"value": 50, "unit": "tx/s", "higher_is_better": True},
+                                      "b": {"value": 20, "unit": "us/step", "higher_is_better": False},
+                                      "c": {"value": 1, "unit": "tx/s", "higher_is_better": True}})) == 2
@@ -0,0 +1,89 @@
+import random
+from unittest import TestCase
+from unittest.mock import patch
+
+from app.util.changes import History, memory_delta, apply_memory_delta, ChangeChain, ChangeChainLink, \
+    TableWidgetEnum, STACK_CHECKPOINT_INTERVAL
+
+
+class TestHistory(TestCase):
+
+    def test_memory_delta(self):
+        for old, new in [(b'', b''), (b'', b'\x01' * 32), (b'\x00' * 64, b'\x00' * 31 + b'\x01' + b'\x00' * 32),
+                         (b'\x01' * 64, b'\x01' * 32), (b'\x01' * 32, b'\x02' * 64), (b'\x01\x02', b'\x01\x02')]:
+            start, data = memory_delta(old, new)
+            assert apply_memory_delta(old, start, data, len(new)) == new
+        assert memory_delta(b'\x00' * 64, b'\x00' * 31 + b'\x01' + b'\x00' * 32) == (31, b'\x01')
+
+    def test_record_and_seek(self):
+        """
+        Records random steps, some of which switch to a different call frame with a smaller memory, and checks that
+        the stack and memory after every step can be restored.
+        """
+        with patch("app.util.changes.MIN_MEMORY_CHECKPOINT_DISTANCE", 256):
+            self._record_and_seek()
+
+    def _record_and_seek(self):
+        rng = random.Random(42)
+        history = History()
+        chain = ChangeChain(ChangeChainLink(TableWidgetEnum.OPCODES, [0], []))
+        stack = []
+        memory = bytearray()
+        expected = []
+        for step in range(0, 3 * STACK_CHECKPOINT_INTERVAL):
+            history.add_pre_computation(chain, 100000 - step, step)
+            if rng.random() < 0.01:
+                stack = [(int, rng.randrange(2 ** 256)) for _ in range(rng.randrange(10))]
+                memory = bytearray(rng.randrange(4) * 32)
+            else:
+                del stack[len(stack) - rng.randrange(min(3, len(stack) + 1)):]
+                stack.extend((bytes, bytes([rng.randrange(256)])) for _ in range(rng.randrange(3)))
+                if rng.random() < 0.3:
+                    offset = rng.randrange(len(memory) + 64)
+                    memory.extend(bytes(max(0, -(-(offset + 32) // 32) * 32 - len(memory))))
+                    memory[offset:offset + 32] = rng.randrange(2 ** 256).to_bytes(32, "big")
+            history.add_post_computation(stack, memory, step + 1, 3)
+            expected.append((list(stack), bytes(memory)))
+
+        assert len(history) == len(expected)
+        assert len(history.memory_checkpoints) > 0
+        for step in rng.sample(range(0, len(expected)), 300) + [0, len(expected) - 1]:
+            assert history.get_stack(step) == expected[step][0]
+            assert history.get_memory(step) == expected[step][1]
+
+        # seeking one by one forward and backward, as well as jumping around
+        steps = list(range(0, 1500)) + list(range(len(expected) - 1, len(expected) - 1500, -1)) + \
+            rng.sample(range(0, len(expected)), 300)
+        for step in steps:
+            state = history.seek(step)
+            assert (state.stack, state.memory, state.pc) == (expected[step][0], expected[step][1], step)
+
+    def test_storage_changes(self):
+        history = History(lambda addr, slot: "0x9")
+        chain = ChangeChain(ChangeChainLink(TableWidgetEnum.OPCODES, [0], []))
+        history.add_pre_computation(chain, 100, 0)
+        history.add_storage(b'\x01', "0x01", "0xa")
+        history.add_pre_computation(chain, 90, 1)
+        history.add_pre_computation(chain, 80, 2)
+        history.add_storage(b'\x01', "0x01", "0xb")
+        assert history.get_storage_changes(0) == [(b'\x01', "0x01", "0x9", "0xa")]
+        assert history.get_storage_changes(1) == []
+        assert history.get_storage_changes(2) == [(b'\x01', "0x01", "0xa", "0xb")]
+        assert history.get_storage(1) == {(b'\x01', "0x01"): "0xa"}
+        assert history.seek(2).storage == {(b'\x01', "0x01"): "0xb"}
+
+    def test_post_computation_of_call(self):
+        """
+        The post computation of a CALL at pc 5 arrives after the step of the called frame.
+        """
+        history = History()
+        chain = ChangeChain(ChangeChainLink(TableWidgetEnum.OPCODES, [0], []))
+        history.add_pre_computation(chain, 100, 5)
+        history.add_pre_computation(chain, 50, 0)
+        history.add_post_computation([(int, 1)], bytearray(), 1, 3)
+        history.add_post_computation([(int, 2)], bytearray(32), 6, 40)
+        assert list(history.pcs) == [5, 0, 5]
+        assert history.get_stack(0) == []
+        assert history.get_stack(1) == [(int, 1)]
+        assert history.get_stack(2) == [(int, 2)]
+        assert history.get_memory(2) == bytes(32)
@@ -5,8 +5,9 @@ from unittest import TestCase
 from eth_typing import Address
 from eth_utils import decode_hex
 
-from app.evmhandler import EVMHandler
-from app.util.util import MyContract
+from app.evmhandler import EVMHandler, MASTER_ADDRESS
+from app.util.tracer import ListSink, TraceRecorder
+from app.util.util import MODE_DEBUG, MyContract, get_function_encoder
 
 logger = logging.getLogger(__name__)
 
@@ -14,9 +15,11 @@ logger = logging.getLogger(__name__)
 class DummySignal:
     def __init__(self, _type: str = ""):
         self._type = _type
+        self.emitted = []
 
     def emit(self, *args, **kwargs):
         logger.info(self, args, kwargs)
+        self.emitted.append(args)
 
 
 class TestContracts(TestCase):
@@ -37,6 +40,19 @@ class TestContracts(TestCase):
         )
         assert 10 == self.evm_handler.get_storage_at(call_contract.get_typed_address(), 1)
 
+    def test_storage_tracking_without_debugging(self):
+        """
+        Calls a function that writes storage without debugging it and checks whether the storage signal still reports
+        the written slot.
+        """
+        call_contract = get_contract("Call")
+        self.create_contract_and_set_address(call_contract, False)
+        signal = DummySignal("storage")
+        self.evm_handler.call_contract_function(
+            call_contract.get_typed_address(), "increment()", [], 0, 0, set_storage=signal
+        )
+        assert (call_contract.get_typed_address(), "0x01", "0xa") == signal.emitted[-1]
+
     def test_create(self):
         """
         Tries to create a contract which internally creates another contract. The inner contract is passed a
@@ -66,6 +82,63 @@ class TestContracts(TestCase):
             "little")
         assert test_value == actual_val
 
+    def test_call_static(self):
+        """
+        Reads a value through a static call and checks that neither the nonce, the block number, the storage of the
+        contract nor the context of the handler have been touched.
+        :return:
+        """
+        factory_contract = get_contract("Factory")
+        self.create_contract_and_set_address(factory_contract, False)
+        args: [{}] = [{"type": "bytes32", "name": "name", "value": "65"}]
+        self.evm_handler.call_contract_function(
+            factory_contract.get_typed_address(), "createContract(bytes32)", args, 0, 0,
+            set_storage=self.dummy
+        )
+        expected = self.evm_handler.call_contract_function(factory_contract.get_typed_address(),
+                                                           "getNewContractAddress()", [], 0, 0,
+                                                           set_storage=self.dummy)[2].output
+        block_number = self.evm_handler.get_block_number()
+        nonce = self.evm_handler.vm.state.get_nonce(MASTER_ADDRESS)
+        computation = self.evm_handler.call_static(factory_contract.get_typed_address(), "getNewContractAddress()", [])
+        assert computation.is_success
+        assert expected == computation.output
+        computation = self.evm_handler.call_static(factory_contract.get_typed_address(), "createContract(bytes32)",
+                                                   args)
+        assert computation.is_success
+        assert expected == self.evm_handler.call_static(factory_contract.get_typed_address(),
+                                                        "getNewContractAddress()", []).output
+        assert block_number == self.evm_handler.get_block_number()
+        assert nonce == self.evm_handler.vm.state.get_nonce(MASTER_ADDRESS)
+        # a static call made while a debug session is set up must not change the mode of the handler
+        context = self.evm_handler._set_context(MODE_DEBUG)
+        assert self.evm_handler.call_static(factory_contract.get_typed_address(), "getNewContractAddress()",
+                                            []).is_success
+        assert context is self.evm_handler.context
+        assert context is self.evm_handler.computation_class.context
+        assert MODE_DEBUG == self.evm_handler.context.debug_mode
+
+    def test_execute_raw(self):
+        """
+        Executes a call with raw data, which must neither change the storage nor leave its tracer installed in the
+        context of the handler.
+        :return:
+        """
+        call_contract = get_contract("Call")
+        self.create_contract_and_set_address(call_contract, False)
+        counter = self.evm_handler.get_storage_at(call_contract.get_typed_address(), 1)
+        context = self.evm_handler._set_context(MODE_DEBUG)
+        sink = ListSink()
+        computation = self.evm_handler.execute_raw(call_contract.get_typed_address(),
+                                                   self.evm_handler._encode_function_call("increment()", []),
+                                                   tracer=TraceRecorder(sink))
+        assert computation.is_success
+        assert sink.records
+        assert counter == self.evm_handler.get_storage_at(call_contract.get_typed_address(), 1)
+        assert context is self.evm_handler.context
+        assert context is self.evm_handler.computation_class.context
+        assert self.evm_handler.context.tracer is None
+
     def test_delegate(self):
         """
         Creates two contracts, base and front. Front delegates all calls to base. Base changes a variable in the front's
@@ -93,6 +166,19 @@ class TestContracts(TestCase):
 
     # raw test data : setVar(uint256) 3a885d790000000000000000000000000000000000000000000000000000000000000003
 
+    def test_function_encoder(self):
+        """
+        Checks that the encoders are compiled when the abi is parsed and that they produce the raw test data above.
+        :return:
+        """
+        base_contract = get_contract("DelegateBase")
+        encoder = get_function_encoder("setVar(uint256)")
+        assert encoder is get_function_encoder("setVar(uint256)")
+        assert ["uint256"] == encoder.types
+        assert "3a885d790000000000000000000000000000000000000000000000000000000000000003" == encoder.encode(
+            [{"type": "uint256", "name": "name", "value": "3"}]).hex()
+        assert "setVar(uint256)" in base_contract.signatures
+
     def test_event(self):
         """
         Creates a contract that fires an event. The logs of the receipt are read and it is asserted that they are not
@@ -131,6 +217,21 @@ class TestContracts(TestCase):
         actual_val = self.evm_handler.get_storage_at(modifier_contract.get_typed_address(), 0)
         assert 1 == actual_val
 
+    def test_execute_batch(self):
+        """
+        Calls a function that increments a variable five times in one batch spread across two blocks.
+        :return:
+        """
+        modifier_contract = get_contract("Modifier")
+        self.create_contract_and_set_address(modifier_contract, False)
+        block_number = self.evm_handler.get_block_number()
+        calls = [(modifier_contract.get_typed_address(), "doThing()", [], 1)] * 5
+        results = self.evm_handler.execute_batch(calls, blocks=2, set_storage=self.dummy)
+        assert 5 == len(results)
+        assert all(computation.is_success for _, _, computation in results)
+        assert 5 == self.evm_handler.get_storage_at(modifier_contract.get_typed_address(), 0)
+        assert block_number + 2 == self.evm_handler.get_block_number()
+
     def test_payable(self):
         """
         Creates a payable contract and tries to send wei to it.
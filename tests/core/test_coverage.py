@@ -0,0 +1,75 @@
+import io
+import json
+from unittest import TestCase
+
+from eth.vm.opcode_values import JUMPI
+
+from app.evmhandler import EVMHandler
+from app.util.coverage import BlockCoverage
+from app.util.disassembly import DISASSEMBLY_CACHE_SIZE, get_disassembly
+from app.util.tracer import TraceRecorder, ListSink
+from tests.core.test_contracts import get_contract
+
+
+class TestCoverage(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.evm_handler = EVMHandler()
+        self.contract = get_contract("Call")
+        self.contract.set_address(self.evm_handler.create_contract(self.contract.bytecode.object).hex())
+        self.address = "0x" + self.contract.get_typed_address().hex()
+
+    def test_batch(self):
+        """
+        The counters of all transactions of a batch are aggregated. increment() calls itself recursively until the
+        storage slot it increments reaches 10, so only the first transaction executes 11 call frames. Every call frame
+        starts with the first block.
+        """
+        coverage = BlockCoverage()
+        results = self.evm_handler.execute_batch([(self.contract.get_typed_address(), "increment()", [], 0)] * 3,
+                                                 tracer=coverage)
+        contract = coverage.contracts[self.address]
+        blocks = contract.blocks()
+        assert blocks[0].start == 0 and blocks[0].hits == 13
+        assert sum(b.gas for b in blocks) == sum(c.get_gas_used() for _, _, c in results)
+        assert [b.start for b in blocks] == contract.disassembly.block_starts
+        assert all(b.start <= b.end for b in blocks)
+        assert 0 < contract.coverage() < 1
+
+        other = BlockCoverage()
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=other)
+        coverage.merge(other)
+        assert coverage.contracts[self.address].blocks()[0].hits == 14
+
+    def test_evicted_disassembly(self):
+        """
+        The counters of a contract keep adding up if its disassembly has been evicted from the cache in between, which
+        hands out a new Disassembly of the same code.
+        """
+        coverage = BlockCoverage()
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=coverage)
+        contract = coverage.contracts[self.address]
+        for i in range(DISASSEMBLY_CACHE_SIZE):
+            get_disassembly(i.to_bytes(2, "big"))
+        assert get_disassembly(contract.disassembly.code) is not contract.disassembly
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=coverage)
+        assert coverage.contracts[self.address] is contract
+        assert contract.blocks()[0].hits == 22
+
+    def test_export(self):
+        coverage = BlockCoverage()
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=coverage)
+        out = io.StringIO()
+        coverage.write_json(out)
+        exported = json.loads(out.getvalue())
+        assert list(exported.keys()) == [self.address]
+        assert exported[self.address]["blocks"][0]["hits"] == 11
+        assert coverage.report().startswith(self.address)
+
+        sink = ListSink()
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=TraceRecorder(sink))
+        jumpis = len([r for r in sink.records if r.opcode == JUMPI])
+        blocks = coverage.contracts[self.address].blocks()
+        assert sum(b.taken + b.fallthrough for b in blocks) == jumpis
+        assert any(b.taken and b.fallthrough for b in blocks)
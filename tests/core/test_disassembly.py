@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from app.util.disassembly import DISASSEMBLY_CACHE_SIZE, Disassembly, get_disassembly
+
+
+class TestDisassembly(TestCase):
+
+    def test_disassembly(self):
+        """
+        The JUMPDEST in the data of the PUSH2 is no instruction, the PUSH1 at the end is truncated.
+        """
+        disassembly = Disassembly(bytes.fromhex("615b5b5b0060"))
+        assert disassembly.instructions == [(0, 0x61, b'\x5b\x5b'), (3, 0x5b, b''), (4, 0x00, b''), (5, 0x60, b''),
+                                            (6, 0x00, b'')]
+        assert disassembly.rows == [0, 0, 0, 1, 2, 3, 4]
+        assert disassembly.jumpdests == {3}
+        assert disassembly.valid_positions == {0, 3, 4, 5}
+        assert disassembly.invalid_positions == {1, 2}
+        assert disassembly.row_of(9) == 4
+
+    def test_basic_blocks(self):
+        """
+        Blocks start at JUMPDESTs and after jumps and halts, the JUMPDEST right after the JUMPI starts only one block.
+        """
+        # PUSH1 5 JUMPI | JUMPDEST PUSH1 1 | JUMPDEST STOP | (implicit STOP)
+        disassembly = Disassembly(bytes.fromhex("6005575b60015b00"))
+        assert disassembly.block_starts == [0, 3, 6, 8]
+        assert disassembly.blocks == [0, 0, 0, 1, 1, 1, 2, 2, 3]
+
+    def test_get_disassembly(self):
+        code = bytes.fromhex("60016002")
+        assert get_disassembly(code) is get_disassembly(bytes(bytearray(code)))
+        assert get_disassembly(code) is not get_disassembly(code + b'\x00')
+        first = get_disassembly(code)
+        for i in range(DISASSEMBLY_CACHE_SIZE):
+            get_disassembly(i.to_bytes(2, "big"))
+        assert first is not get_disassembly(code)
@@ -1,8 +1,14 @@
+import os
+import tempfile
+from threading import Thread
 from unittest import TestCase
 from app.evmhandler import *
+from app.util.profiler import Profiler
 from eth.constants import ZERO_ADDRESS
+from eth.exceptions import HeaderNotFound, TransactionNotFound
 from eth_typing import Address
 from eth_utils.units import units
+from tests.core.test_contracts import get_contract
 
 SAMPLE_CONTRACT_STRING = "608060405234801561001057600080fd5b506084600081905550610103806100286000396000f3fe6080604052348015600f57600080fd5b50600436106059576000357c0100000000000000000000000000000000000000000000000000000000900480630dbe671f14605e5780633fb5c1cb146066578063d811a0f7146091575b600080fd5b606460ad565b005b608f60048036036020811015607a57600080fd5b810190808035906020019092919050505060bb565b005b609760c5565b6040518082815260200191505060405180910390f35b600160005401600081905550565b8060008190555050565b6000805490509056fea265627a7a72315820dbbf7b3aca69db108502547c9d52106e90b87b1f8e80c1538e2bd9131dde542864736f6c634300050b0032"
 
@@ -70,3 +76,139 @@ class TestEVMHandler(TestCase):
         self.evm_handler._mine_block()
         second = self.evm_handler.get_block_number()
         assert second == 2
+
+    def test_instant_seal_and_transactions_per_block(self):
+        """
+        Sends transactions with instant sealing enabled and three transactions per block. Checks that blocks are only
+        mined once enough transactions have been collected and that pending transactions are already visible.
+        :return:
+        """
+        self.evm_handler = EVMHandler(instant_seal=True, transactions_per_block=3)
+        addr1 = Address(decode_hex("aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"))
+        genesis = self.evm_handler.get_block_number()
+        self.evm_handler.send_wei(addr1, 1)
+        self.evm_handler.send_wei(addr1, 2)
+        assert genesis == self.evm_handler.get_block_number()
+        assert 3 == self.evm_handler.get_balance(addr1)
+        self.evm_handler.send_wei(addr1, 3)
+        assert genesis + 1 == self.evm_handler.get_block_number()
+        self.evm_handler.send_wei(addr1, 4)
+        self.evm_handler.seal_pending_transactions()
+        assert genesis + 2 == self.evm_handler.get_block_number()
+        assert 10 == self.evm_handler.get_balance(addr1)
+
+    def test_snapshot_and_revert(self):
+        """
+        Changes balances, storage and the block number after taking a snapshot and checks that reverting to the
+        snapshot restores all of them. Reverting to the same snapshot twice must be possible.
+        :return:
+        """
+        addr1 = Address(decode_hex("aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"))
+        self.evm_handler.send_wei(addr1, 5)
+        snapshot_id = self.evm_handler.snapshot()
+        block_number = self.evm_handler.get_block_number()
+        for _ in range(0, 2):
+            self.evm_handler.send_wei(addr1, 10)
+            self.evm_handler.set_storage(addr1, 0, 1)
+            assert 15 == self.evm_handler.get_balance(addr1)
+            assert 1 == self.evm_handler.get_storage_at(addr1, 0)
+            self.evm_handler.revert(snapshot_id)
+            assert 5 == self.evm_handler.get_balance(addr1)
+            assert 0 == self.evm_handler.get_storage_at(addr1, 0)
+            assert block_number == self.evm_handler.get_block_number()
+
+    def test_revert_canonical_chain(self):
+        """
+        Mines blocks after reverting to a snapshot and checks that the blocks of the canonical chain are the new ones,
+        also after reverting to a snapshot taken on the abandoned branch. Released snapshots cannot be reverted to.
+        :return:
+        """
+        addr1 = Address(decode_hex("0101010101010101010101010101010101010101"))
+        addr2 = Address(decode_hex("0202020202020202020202020202020202020202"))
+        chain = self.evm_handler.chain
+        chaindb = chain.chaindb
+        snapshot_id = self.evm_handler.snapshot()
+        self.evm_handler.send_wei(addr1, 1)
+        self.evm_handler.send_wei(addr1, 2)
+        abandoned_id = self.evm_handler.snapshot()
+        abandoned = [chain.get_canonical_block_by_number(n) for n in (1, 2)]
+
+        self.evm_handler.revert(snapshot_id)
+        self.evm_handler.send_wei(addr2, 3)
+        block = chain.get_canonical_block_by_number(1)
+        assert addr2 == block.transactions[0].to
+        assert block.header == chaindb.get_canonical_head()
+        with self.assertRaises(HeaderNotFound):
+            chain.get_canonical_block_by_number(2)
+        with self.assertRaises(TransactionNotFound):
+            chaindb.get_transaction_index(abandoned[1].transactions[0].hash)
+        assert (1, 0) == chaindb.get_transaction_index(block.transactions[0].hash)
+
+        self.evm_handler.revert(abandoned_id)
+        assert abandoned == [chain.get_canonical_block_by_number(n) for n in (1, 2)]
+        assert abandoned[1].header == chaindb.get_canonical_head()
+        assert (2, 0) == chaindb.get_transaction_index(abandoned[1].transactions[0].hash)
+        with self.assertRaises(TransactionNotFound):
+            chaindb.get_transaction_index(block.transactions[0].hash)
+        self.evm_handler.send_wei(addr2, 4)
+        assert 3 == chaindb.get_canonical_head().block_number
+
+        self.evm_handler.release(snapshot_id)
+        with self.assertRaises(ValueError):
+            self.evm_handler.revert(snapshot_id)
+
+    def test_persistent_database(self):
+        """
+        Deploys code, sends wei and leaves a transaction pending in a persisted chain, then opens the chain again and
+        checks that everything is still there.
+        :return:
+        """
+        addr1 = Address(decode_hex("aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"))
+        code = decode_hex(SAMPLE_CONTRACT_STRING)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chain.db")
+            evm_handler = EVMHandler(transactions_per_block=2, db_path=path)
+            contract = evm_handler.set_code(code)
+            evm_handler.send_wei(addr1, 10)
+            evm_handler.send_wei(addr1, 20)
+            evm_handler.send_wei(addr1, 30)
+            block_number = evm_handler.get_block_number()
+            evm_handler.close()
+
+            evm_handler = EVMHandler(transactions_per_block=2, db_path=path)
+            assert code == evm_handler.get_code(contract)
+            assert 60 == evm_handler.get_balance(addr1)
+            assert block_number == evm_handler.get_block_number()
+            assert 1 == evm_handler.pending_transactions
+            evm_handler.send_wei(addr1, 40)
+            assert block_number + 1 == evm_handler.get_block_number()
+            assert 100 == evm_handler.get_balance(addr1)
+            evm_handler.close()
+
+    def test_parallel_handlers(self):
+        """
+        Executes transactions with different tracers on two handlers in parallel threads. Every handler has its own
+        execution context, so each tracer observes exactly the steps of its own handler.
+        :return:
+        """
+        contract = get_contract("Call")
+        handlers = [EVMHandler(instant_seal=True), EVMHandler(instant_seal=True)]
+        addresses = [h.create_contract(contract.bytecode.object) for h in handlers]
+        tracers = [Profiler(), Profiler()]
+
+        def run(i: int):
+            for _ in range(5):
+                handlers[i].call_contract_function(addresses[i], "increment()", [], tracer=tracers[i])
+
+        threads = [Thread(target=run, args=(i,)) for i in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for handler, address, tracer in zip(handlers, addresses, tracers):
+            opcodes = {e.mnemonic: e for e in tracer.by_opcode()}
+            # 10 recursive calls in the first transaction, none in the following ones
+            assert opcodes["CALL"].count == 10
+            assert opcodes["SSTORE"].count == 10
+            assert handler.get_storage_at(address, 1) == 10
+            assert handler.context.tracer is tracer
@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from eth_abi import decode_abi
+
+from app.evmhandler import EVMHandler
+from app.util.fuzzer import Fuzzer
+from app.util.util import get_function_encoder
+from tests.core.test_contracts import get_contract
+
+
+class TestFuzzer(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.evm_handler = EVMHandler()
+        self.contract = get_contract("Types")
+        self.contract.set_address(self.evm_handler.create_contract(self.contract.bytecode.object).hex())
+
+    def test_random_param(self):
+        fuzzer = Fuzzer(self.evm_handler, self.contract, seed=0)
+        types = ["uint8", "int16", "uint256", "address", "bool", "bytes3", "bytes", "string", "uint8[]", "int32[2][]"]
+        encoder = get_function_encoder("f({t})".format(t=",".join(types)))
+        for _ in range(50):
+            decoded = decode_abi(types, encoder.encode_values([fuzzer.random_param(t) for t in types])[4:])
+            assert 0 <= decoded[0] < 2 ** 8
+            assert -2 ** 15 <= decoded[1] < 2 ** 15
+            assert len(decoded[5]) == 3
+            assert all(len(a) == 2 for a in decoded[9])
+        with self.assertRaises(ValueError):
+            fuzzer.random_param("(uint256,bool)")
+
+    def test_execute(self):
+        fuzzer = Fuzzer(self.evm_handler, self.contract, seed=0)
+        encoder, _ = fuzzer.functions[0]
+        data = encoder.encode_values([fuzzer.random_param(t) for t in encoder.types])
+        _, new = fuzzer.execute(data)
+        assert new
+        assert len(fuzzer.corpus) == 1
+        _, new = fuzzer.execute(data)
+        assert not new
+        assert len(fuzzer.corpus) == 1
+        assert fuzzer.executions == 2
+
+    def test_run(self):
+        """
+        Fuzzing finds reverts and failed asserts of the contract, is reproducible with the same seed and does not change
+        the state.
+        """
+        state_root = self.evm_handler.vm.state.state_root
+        fuzzer = Fuzzer(self.evm_handler, self.contract, seed=1)
+        stats = fuzzer.run(executions=500)
+        assert stats.executions == 500
+        assert stats.corpus == len(fuzzer.corpus) > 10
+        assert stats.reverts == len(fuzzer.reverts) > 0
+        assert any("Revert" in r.error for r in fuzzer.reverts)
+        assert any("InvalidInstruction" in r.error for r in fuzzer.reverts)
+        assert self.evm_handler.vm.state.state_root == state_root
+
+        other = Fuzzer(self.evm_handler, self.contract, seed=1)
+        other.run(executions=500)
+        assert other.corpus == fuzzer.corpus
+
+        with tempfile.TemporaryDirectory() as directory:
+            fuzzer.save(directory)
+            with open(os.path.join(directory, "reverts.jsonl")) as f:
+                reverts = [json.loads(line) for line in f]
+        assert [bytes.fromhex(r["data"]) for r in reverts] == [r.data for r in fuzzer.reverts]
+
+    def test_mutate(self):
+        fuzzer = Fuzzer(self.evm_handler, self.contract, seed=0)
+        data = bytes(4 + 64)
+        for _ in range(100):
+            assert fuzzer.mutate(data)[:4] == data[:4]
@@ -0,0 +1,112 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from sha3 import keccak_256
+
+from app.evmhandler import EVMHandler
+from app.util.preimages import PreimageCache, DecodedSlot
+from app.util.tracefile import TraceFileWriter, TraceFileReader
+from app.util.util import MODE_DEBUG, MODE_DEBUG_AUTO
+from tests.core.test_contracts import get_contract
+
+# slots of the state variables of the Types contract
+UINTS_SLOT = 9
+MAP_SLOT = 11
+
+
+def word(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+def keccak(data: bytes) -> int:
+    return int.from_bytes(keccak_256(data).digest(), "big")
+
+
+class TestPreimages(TestCase):
+
+    def test_decode(self):
+        cache = PreimageCache(small_slots=0)
+        entry = keccak(word(0xaa) + word(1))
+        nested = keccak(word(0xbb) + word(entry))
+        array = keccak(word(2))
+        cache.update([(entry, word(0xaa) + word(1)), (nested, word(0xbb) + word(entry)), (array, word(2))])
+        cache.add(keccak(b'short'), b'short')
+        assert len(cache) == 3
+
+        assert cache.decode(entry) == DecodedSlot(1, word(0xaa), 0)
+        assert cache.decode(array + 3) == DecodedSlot(2, None, 3)
+        assert cache.decode(3) is None
+        assert cache.format_slot(nested) == "0x1[0xaa][0xbb]"
+        assert cache.format_slot(array) == "0x2[]+0x0"
+        assert cache.format_slot(array + 3) == "0x2[]+0x3"
+        assert cache.format_slot(7) == "0x7"
+        assert cache.used_preimages(nested) == [(nested, word(0xbb) + word(entry)), (entry, word(0xaa) + word(1))]
+
+    def test_bounded(self):
+        cache = PreimageCache(max_size=10, small_slots=0)
+        for i in range(100):
+            cache.add(keccak(word(i)), word(i))
+            # the first preimage stays since it is used all the time
+            assert cache.get(keccak(word(0))) == word(0)
+        assert len(cache) == 10
+        assert cache.get(keccak(word(98))) == word(98)
+        assert cache.get(keccak(word(50))) is None
+        assert cache.format_slot(keccak(word(50)) + 1) != "0x32[]+0x1"
+
+    def test_record_while_executing(self):
+        """
+        The preimages of mapping entries and arrays are recorded into the cache that is passed to an execution, which
+        resolves their slots when the storage is enumerated. Without a cache they are only recorded while debugging.
+        """
+        evm_handler = EVMHandler()
+        contract = get_contract("Types")
+        address = evm_handler.create_contract(contract.bytecode.object, preimages=evm_handler.preimages)
+        key = b'\x12' * 20
+        evm_handler.call_contract_function(address, "setOneMapping(address,uint256)",
+                                           [{"type": "address", "value": "0x" + key.hex()},
+                                            {"type": "uint256", "value": "5"}], preimages=evm_handler.preimages)
+        for value in ("7", "8"):
+            evm_handler.call_contract_function(address, "setOneIntegerInArray(uint256)",
+                                               [{"type": "uint256", "value": value}], preimages=evm_handler.preimages)
+        entry = keccak(key.rjust(32, b'\x00') + word(MAP_SLOT))
+        assert evm_handler.preimages.decode(entry) == DecodedSlot(MAP_SLOT, key.rjust(32, b'\x00'), 0)
+        assert evm_handler.preimages.format_slot(keccak(word(UINTS_SLOT)) + 1) == "0x9[]+0x1"
+
+        storage = {e.slot: e.value for e in evm_handler.iter_storage(address)}
+        assert storage[entry] == 5
+        assert storage[keccak(word(UINTS_SLOT))] == 7
+        assert storage[UINTS_SLOT] == 2
+
+        evm_handler = EVMHandler()
+        address = evm_handler.create_contract(contract.bytecode.object)
+        evm_handler.call_contract_function(address, "setOneMapping(address,uint256)",
+                                           [{"type": "address", "value": "0x" + key.hex()},
+                                            {"type": "uint256", "value": "5"}])
+        assert len(evm_handler.preimages) == 0
+        assert evm_handler._set_context(MODE_DEBUG).preimages is evm_handler.preimages
+        assert evm_handler._set_context(MODE_DEBUG_AUTO, preimages=None).preimages is None
+
+    def test_trace_preimages(self):
+        """
+        A trace keeps the preimages that are needed to decode the slots it changes.
+        """
+        evm_handler = EVMHandler()
+        contract = get_contract("Types")
+        address = evm_handler.create_contract(contract.bytecode.object)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "map.evmtrace")
+            writer = TraceFileWriter(path)
+            evm_handler.call_contract_function(address, "setOneMapping(address,uint256)",
+                                               [{"type": "address", "value": "0x" + "34" * 20},
+                                                {"type": "uint256", "value": "5"}], tracer=writer)
+            writer.close()
+            with TraceFileReader(path) as trace:
+                preimages = trace.preimages
+                slots = [int(slot, 16) for _, slot in trace.get_storage(0)]
+        entry = keccak(bytes(12) + b'\x34' * 20 + word(MAP_SLOT))
+        assert slots == [entry]
+        assert preimages == [(entry, bytes(12) + b'\x34' * 20 + word(MAP_SLOT))]
+        cache = PreimageCache()
+        cache.update(preimages)
+        assert cache.format_slot(entry) == "0xb[0x" + "34" * 20 + "]"
@@ -0,0 +1,52 @@
+import io
+from unittest import TestCase
+
+from app.evmhandler import EVMHandler
+from app.util.profiler import Profiler
+from tests.core.test_contracts import get_contract
+
+
+class TestProfiler(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.evm_handler = EVMHandler()
+        self.contract = get_contract("Call")
+        self.contract.set_address(self.evm_handler.create_contract(self.contract.bytecode.object).hex())
+
+    def test_profile(self):
+        """
+        Profiles a function that calls itself 10 times recursively and increments a storage slot in every call.
+        """
+        profiler = Profiler()
+        computation = self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [],
+                                                   tracer=profiler)
+        opcodes = {e.mnemonic: e for e in profiler.by_opcode()}
+        assert opcodes["SSTORE"].count == 10
+        assert opcodes["CALL"].count == 10
+        # the gas of the called frames is not counted twice
+        assert sum(e.gas for e in opcodes.values()) == computation.get_gas_used()
+        assert opcodes["CALL"].gas < opcodes["SSTORE"].gas
+        assert all(e.time >= 0 for e in opcodes.values())
+
+        address = "0x" + self.contract.get_typed_address().hex()
+        instructions = profiler.by_pc()
+        assert all(e.address == address for e in instructions)
+        assert sum(e.count for e in instructions) == sum(e.count for e in opcodes.values())
+        assert [e.gas for e in instructions] == sorted((e.gas for e in instructions), reverse=True)
+        assert "SSTORE" in profiler.report(limit=5)
+
+    def test_write_collapsed(self):
+        profiler = Profiler()
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=profiler)
+        out = io.StringIO()
+        profiler.write_collapsed(out)
+        lines = out.getvalue().splitlines()
+        stacks = [line.rsplit(" ", 1) for line in lines]
+        assert sum(int(v) for _, v in stacks) == sum(e.gas for e in profiler.by_opcode())
+        deepest = max((s for s, _ in stacks), key=lambda s: s.count(";"))
+        # 11 frames, 10 calls and the instruction
+        assert deepest.count(";") == 21
+        assert deepest.split(";")[1].startswith("CALL@")
+        with self.assertRaises(ValueError):
+            profiler.write_collapsed(out, "memory")
@@ -0,0 +1,48 @@
+from unittest import TestCase
+
+from app.evmhandler import EVMHandler
+from app.util.coverage import BlockCoverage
+from app.util.runner import ParallelRunner
+from tests.core.test_contracts import get_contract
+
+
+class TestParallelRunner(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.evm_handler = EVMHandler(instant_seal=True)
+        self.contract = get_contract("Call")
+        self.contract.set_address(self.evm_handler.create_contract(self.contract.bytecode.object).hex())
+        self.increment = (self.contract.get_typed_address(), "increment()", [], 0)
+
+    def test_fork(self):
+        fork = EVMHandler(fork=self.evm_handler.fork())
+        fork.call_contract_function(*self.increment[:3])
+        assert fork.get_storage_at(self.contract.get_typed_address(), 1) == 10
+        assert self.evm_handler.get_storage_at(self.contract.get_typed_address(), 1) == 0
+        assert fork.get_code(self.contract.get_typed_address()) == \
+            self.evm_handler.get_code(self.contract.get_typed_address())
+
+    def test_run(self):
+        """
+        Every scenario starts from the state the runner was created with, so the first call of every scenario does the
+        10 recursive calls of increment(), the following calls do not.
+        """
+        scenarios = [[self.increment] * n for n in range(1, 5)]
+        results = ParallelRunner(self.evm_handler, processes=2).run(scenarios, BlockCoverage)
+        assert [len(r.receipts) for r in results] == [1, 2, 3, 4]
+        first_gas = {r.receipts[0].gas_used for r in results}
+        assert len(first_gas) == 1
+        assert all(r.receipts[1].gas_used < r.receipts[0].gas_used for r in results[1:])
+        assert all(e is None for r in results for e in r.errors)
+
+        coverage = BlockCoverage()
+        for r in results:
+            coverage.merge(r.tracer)
+        # 11 call frames for the first call of each scenario, one for every further call
+        assert coverage.contracts["0x" + self.contract.get_typed_address().hex()].hits[0] == 4 * 11 + 6
+
+        serial = ParallelRunner(self.evm_handler, processes=1).run(scenarios)
+        assert [r.receipts for r in serial] == [r.receipts for r in results]
+        assert all(r.tracer is None for r in serial)
+        assert self.evm_handler.get_storage_at(self.contract.get_typed_address(), 1) == 0
@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+from app.evmhandler import EVMHandler
+from app.util.storage_mirror import StorageMirror
+from tests.core.test_contracts import get_contract
+
+A = b'\x01' * 20
+B = b'\x02' * 20
+
+
+class TestStorageMirror(TestCase):
+
+    def test_rows_and_deltas(self):
+        mirror = StorageMirror()
+        assert mirror.add(A, 2 ** 255) == 0
+        assert mirror.set(A, 1, 5) == 1
+        assert mirror.set(A, 1, 6) == 1
+        assert mirror.add(A, 2 ** 255, 7) == 0
+        assert mirror.set(B, 1, 1) == 0
+        assert mirror.row(A, 1) == 1
+        assert mirror.row(A, 3) is None
+        assert A in mirror and len(mirror) == 3
+        # only the last value of a slot is passed on
+        assert mirror.take_deltas() == [(A, 2 ** 255, 0, None), (A, 1, 1, 6), (B, 1, 0, 1)]
+        assert mirror.take_deltas() == []
+
+        mirror.remove(B)
+        assert B not in mirror
+        assert mirror.slots(A) == [2 ** 255, 1]
+
+    def test_sorted_slots(self):
+        mirror = StorageMirror()
+        for slot in [9, 3, 2 ** 200, 0, 5]:
+            mirror.add(A, slot)
+        assert mirror.sorted_slots(A) == [0, 3, 5, 9, 2 ** 200]
+        assert mirror.sorted_slots(A, 3, 9) == [3, 5]
+        mirror.add(A, 4)
+        assert mirror.sorted_slots(A, 1, 2 ** 100) == [3, 4, 5, 9]
+        assert mirror.sorted_slots(B) == []
+
+    def test_execution(self):
+        """
+        The slots written by a transaction are registered in the mirror without debugging.
+        """
+        evm_handler = EVMHandler()
+        contract = get_contract("Call")
+        mirror = StorageMirror()
+        address = evm_handler.create_contract(contract.bytecode.object, storage_mirror=mirror)
+        evm_handler.call_contract_function(address, "increment()", [], storage_mirror=mirror)
+        assert mirror.slots(address) == [0, 1]
+        deltas = {slot: value for _, slot, _, value in mirror.take_deltas()}
+        assert deltas == {0: int.from_bytes(address, "big"), 1: 10}
@@ -0,0 +1,66 @@
+from random import Random
+from unittest import TestCase
+
+from eth.db.atomic import AtomicDB
+from trie import HexaryTrie
+
+from app.evmhandler import EVMHandler
+from app.util.storage_trie import SlotKeys, iter_trie, slot_key
+from tests.core.test_contracts import get_contract
+
+
+class TestStorageTrie(TestCase):
+
+    def test_iter_trie(self):
+        """
+        Every leaf is found in the order of the keys, also when starting in between two keys.
+        """
+        rng = Random(0)
+        db = AtomicDB()
+        trie = HexaryTrie(db)
+        items = {}
+        for i in range(500):
+            key = bytes(rng.getrandbits(8) for _ in range(32))
+            items[key] = bytes([i % 256 or 1]) * rng.choice([1, 40])
+            trie[key] = items[key]
+        keys = sorted(items)
+        assert list(iter_trie(db, trie.root_hash)) == [(key, items[key]) for key in keys]
+        assert [k for k, _ in iter_trie(db, trie.root_hash, keys[123])] == keys[123:]
+        assert [k for k, _ in iter_trie(db, trie.root_hash, keys[123][:-1] + b'\xff')] == keys[124:]
+        assert list(iter_trie(db, trie.root_hash, b'\xff' * 32)) == []
+        assert list(iter_trie(db, HexaryTrie(db).root_hash)) == []
+
+    def test_slot_keys(self):
+        keys = SlotKeys(small_slots=2)
+        assert keys.get(slot_key(1)) == 1
+        assert keys.get(slot_key(2)) is None
+        assert keys.add(2 ** 255) == slot_key(2 ** 255)
+        assert keys.get(slot_key(2 ** 255)) == 2 ** 255
+
+    def test_iter_storage(self):
+        """
+        The storage is enumerated from the trie without tracking any SSTORE, including transactions that have not been
+        mined yet.
+        """
+        evm_handler = EVMHandler(transactions_per_block=10)
+        contract = get_contract("Call")
+        address = evm_handler.create_contract(contract.bytecode.object)
+        evm_handler.call_contract_function(address, "increment()", [])
+        evm_handler.set_storage(address, 2 ** 200, 7)
+        assert evm_handler.pending_transactions == 0
+        evm_handler.call_contract_function(address, "increment()", [])
+        assert evm_handler.pending_transactions == 1
+
+        entries = list(evm_handler.iter_storage(address))
+        assert [e.key for e in entries] == sorted(e.key for e in entries)
+        assert {e.slot: e.value for e in entries} == {0: int.from_bytes(address, "big"), 1: 10, 2 ** 200: 7}
+        assert list(evm_handler.iter_storage(b'\x01' * 20)) == []
+
+        page, start = evm_handler.get_storage_page(address, count=2)
+        assert page == entries[:2] and start == entries[2].key
+        assert evm_handler.get_storage_page(address, start, count=2) == (entries[2:], None)
+
+        # slots whose preimage is unknown are still enumerated
+        evm_handler.slot_keys = SlotKeys(small_slots=0)
+        assert [(e.key, e.slot, e.value) for e in evm_handler.iter_storage(address)] == \
+               [(e.key, None, e.value) for e in entries]
@@ -0,0 +1,78 @@
+from unittest import TestCase
+
+from PyQt5.QtCore import Qt
+
+from app.evmhandler import EVMHandler
+from app.util.disassembly import Disassembly
+from app.util.table_models import HighlightTableModel, OpcodeTableModel, StackTableModel, MemoryTableModel, \
+    StorageTableModel, PRE_COMPUTATION_COLOR
+
+
+def table(model):
+    return [[model.text(r, c) for c in range(model.columnCount())] for r in range(model.rowCount())]
+
+
+class TestTableModels(TestCase):
+
+    def test_highlight_table_model_is_empty(self):
+        model = HighlightTableModel()
+        model.highlight([0], PRE_COMPUTATION_COLOR)
+        model.clear()
+        assert model.rowCount() == 0
+
+    def test_opcode_table_model(self):
+        """
+        PUSH data is shown next to the mnemonic, measured gas costs replace the static ones.
+        """
+        model = OpcodeTableModel()
+        opcodes = EVMHandler().vm.state.computation_class.opcodes
+        model.set_code(Disassembly(bytes.fromhex("6001600201fe")), opcodes)
+        assert table(model) == [["0x60", "PUSH1 0x01", "3"], ["0x60", "PUSH1 0x02", "3"], ["0x01", "ADD", "3"],
+                                ["0xfe", "INVALID", "0"], ["0x00", "STOP", "0"]]
+        model.set_gas(4, 7)
+        assert model.text(2, 2) == "7"
+        assert model.row_of(3) == 1
+
+    def test_stack_table_model(self):
+        model = StackTableModel()
+        model.set_stack([(int, 1), (bytes, b'\x02')])
+        assert table(model) == [["0x02"], ["0x1"]]
+        model.set_stack([(int, 3)])
+        assert table(model) == [["0x3"]]
+        model.highlight([0], PRE_COMPUTATION_COLOR)
+        assert model.data(model.index(0, 0), Qt.ForegroundRole).color() == PRE_COMPUTATION_COLOR
+        model.highlight([0])
+        assert model.data(model.index(0, 0), Qt.ForegroundRole) is None
+
+    def test_memory_and_storage_table_model(self):
+        model = MemoryTableModel()
+        model.set_memory(bytearray(32))
+        model.set_memory(bytearray(b'\x01' * 64))
+        assert table(model) == [["0x" + "01" * 32]] * 2
+        model.clear()
+        assert model.rowCount() == 0
+
+        model = StorageTableModel()
+        model.set_slot(1, "0x01", "0xa")
+        model.set_slot(0, "0x00", "0xb")
+        assert table(model) == [["0x00", "0xb"], ["0x01", "0xa"]]
+
+    def test_storage_table_model_fetches_pages(self):
+        model = StorageTableModel()
+        pages = [[(0, "0x0", "0x1")], [(1, "0x1", "0x2"), (2, "0x5", "0x3")]]
+
+        def fetch():
+            for row, slot, value in pages.pop(0):
+                model.set_slot(row, slot, value)
+            return len(pages) > 0
+
+        model.set_fetcher(fetch)
+        model.add_hashed_slot("0xab", "0x4")
+        assert model.canFetchMore()
+        model.fetchMore()
+        model.fetchMore()
+        assert not model.canFetchMore()
+        # the slots that are only known by their hash stay below the others
+        assert table(model) == [["0x0", "0x1"], ["0x1", "0x2"], ["0x5", "0x3"], ["0xab (hashed)", "0x4"]]
+        model.clear()
+        assert model.rowCount() == 0 and not model.canFetchMore()
@@ -0,0 +1,94 @@
+import os
+import random
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from eth.vm.opcode_values import SSTORE
+
+from app.evmhandler import EVMHandler
+from app.util.tracefile import TraceFileWriter, TraceFileReader
+from app.util.tracer import TraceRecorder, ListSink
+from tests.core.test_contracts import get_contract
+
+
+class TestTraceFile(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.evm_handler = EVMHandler()
+        self.contract = get_contract("Call")
+        self.contract.set_address(self.evm_handler.create_contract(self.contract.bytecode.object).hex())
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "increment.evmtrace")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        super().tearDown()
+
+    def _trace(self) -> ListSink:
+        """
+        Traces a function that calls itself 10 times recursively into the trace file and into a ListSink.
+        """
+        expected = ListSink()
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [],
+                                     tracer=TraceRecorder(expected, memory=True))
+        writer = TraceFileWriter(self.path)
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=writer)
+        writer.close()
+        return expected
+
+    def test_read_trace(self):
+        expected = self._trace().records
+        opcodes = self.evm_handler.vm.state.computation_class.opcodes
+        with TraceFileReader(self.path, opcodes) as trace:
+            assert len(trace) == len(expected)
+            assert list(trace.records()) == [r._replace(stack=None, memory=None) for r in expected]
+            assert trace.record(len(trace) - 1) == expected[-1]._replace(stack=None, memory=None)
+            for step in [0, 1, len(trace) // 2, len(trace) - 1]:
+                assert [v for _, v in trace.get_stack(step)] == expected[step].stack
+                assert trace.get_memory(step) == expected[step].memory
+
+            sstores = [i for i, r in enumerate(expected) if r.opcode == SSTORE]
+            assert len(sstores) == 10
+            address = self.contract.get_typed_address()
+            for i, step in enumerate(sstores):
+                assert trace.get_storage_changes(step) == [(address, "0x1", hex(i), hex(i + 1))]
+            assert trace.get_storage(sstores[4]) == {(address, "0x1"): "0x5"}
+
+            state = trace.seek(0)
+            assert state.message.to == address and state.message.depth == 0
+            assert state.disassembly.code == self.evm_handler.get_code(address)
+            assert state.opcodes is opcodes
+            deepest = max(range(len(expected)), key=lambda s: expected[s].depth)
+            assert trace.seek(deepest).message.depth == 10
+            assert trace.seek(deepest).message is trace.seek(deepest + 1).message
+
+    def test_seek(self):
+        """
+        Steps are restored across chunk boundaries and memory copies, one by one as well as in random order.
+        """
+        with patch("app.util.tracefile.CHUNK_STEPS", 64), patch("app.util.tracefile.MEMORY_SNAPSHOT_CHUNKS", 2):
+            expected = self._trace().records
+        rng = random.Random(42)
+        with TraceFileReader(self.path) as trace:
+            assert trace.chunk_steps == 64
+            steps = list(range(0, len(trace))) + list(range(len(trace) - 1, -1, -1)) + \
+                rng.sample(range(0, len(trace)), 100)
+            for step in steps:
+                state = trace.seek(step)
+                assert [v for _, v in state.stack] == expected[step].stack
+                assert state.memory == expected[step].memory
+                assert (state.pc, state.gas_remaining) == (expected[step].pc, expected[step].gas)
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"no trace file" * 10)
+        with self.assertRaises(ValueError):
+            TraceFileReader(self.path)
+
+        writer = TraceFileWriter(self.path)
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=writer)
+        writer.file.close()
+        with self.assertRaises(ValueError):
+            TraceFileReader(self.path)
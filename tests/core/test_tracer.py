@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from eth.vm.opcode_values import SSTORE
+
+from app.evmhandler import EVMHandler
+from app.util.tracer import TraceRecorder, ListSink, FileSink, GeneratorSink
+from tests.core.test_contracts import get_contract
+
+
+class TestTracer(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.evm_handler = EVMHandler()
+        self.contract = get_contract("Call")
+        self.contract.set_address(self.evm_handler.create_contract(self.contract.bytecode.object).hex())
+
+    def test_list_sink(self):
+        """
+        Traces a function that calls itself 10 times recursively and increments a storage slot in every call.
+        """
+        sink = ListSink()
+        self.evm_handler.call_contract_function(self.contract.get_typed_address(), "increment()", [],
+                                                tracer=TraceRecorder(sink))
+        records = sink.records
+        assert 10 == self.evm_handler.get_storage_at(self.contract.get_typed_address(), 1)
+        assert 10 == len([r for r in records if r.opcode == SSTORE])
+        assert max(r.depth for r in records) == 10
+        assert records[0].pc == 0 and records[0].mnemonic == "PUSH1" and records[0].stack == [0x80]
+        assert records[-1].depth == 0
+        assert all(r.gas - r.gas_cost >= 0 and r.memory is None for r in records)
+
+    def test_file_and_generator_sink(self):
+        """
+        The same call is traced into a file and into a generator, both have to see the records of the ListSink.
+        """
+        expected = ListSink()
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [],
+                                     tracer=TraceRecorder(expected, memory=True))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.jsonl")
+            tracer = TraceRecorder(FileSink(path), memory=True)
+            self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=tracer)
+            tracer.close()
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+        assert [line["pc"] for line in lines] == [r.pc for r in expected.records]
+        assert lines[-1]["memory"] == expected.records[-1].memory.hex()
+
+        received = []
+
+        def consumer():
+            while True:
+                record = yield
+                received.append(record)
+
+        tracer = TraceRecorder(GeneratorSink(consumer()))
+        self.evm_handler.call_static(self.contract.get_typed_address(), "increment()", [], tracer=tracer)
+        tracer.close()
+        assert [r.stack for r in received] == [r.stack for r in expected.records]
+
+    def test_without_qt(self):
+        """
+        Tracing must work without PyQt5.
+        """
+        script = "\n".join([
+            "import sys",
+            "sys.modules['PyQt5'] = None",
+            "from app.evmhandler import EVMHandler",
+            "from app.util.tracer import TraceRecorder, ListSink",
+            "from tests.core.test_contracts import get_contract",
+            "handler = EVMHandler()",
+            "sink = ListSink()",
+            "handler.create_contract(get_contract('Call').bytecode.object, tracer=TraceRecorder(sink))",
+            "assert len(sink.records) > 0",
+        ])
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+        subprocess.run([sys.executable, "-c", script], cwd=root, check=True)
@@ -0,0 +1,25 @@
+from unittest import TestCase
+
+from app.util.util import get_stack_ints, format_stack_item, get_stack_content, stack_item_to_int
+
+
+class TestStackContent(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        # bottom of the stack first, like the stack of py-evm
+        self.stack = [(int, 5), (bytes, b'\x00\x01'), (int, 255), (bytes, b'\xff' * 32)]
+
+    def test_get_stack_ints(self):
+        assert get_stack_ints(self.stack, 1) == [2 ** 256 - 1]
+        assert get_stack_ints(self.stack, 4) == [2 ** 256 - 1, 255, 1, 5]
+        assert get_stack_ints([], 0) == []
+
+    def test_stack_item_to_int(self):
+        assert stack_item_to_int((int, 255)) == 255
+        assert stack_item_to_int((bytes, b'\x01\x00')) == 256
+
+    def test_format_stack_item(self):
+        assert format_stack_item((int, 255)) == "0xff"
+        assert format_stack_item((bytes, b'\x00\x01')) == "0x0001"
+        assert get_stack_content(self.stack, 3) == ["0x" + "ff" * 32, "0xff", "0x0001"]